@@ -1,9 +1,11 @@
+import signal
 import sys
+import threading
 import time
 import traceback
 from contextlib import contextmanager
 
-from src.lib import run
+from src.lib import aio, run
 from src.lib.config import AutoM4bArgs, cfg
 from src.lib.inbox_state import InboxState
 from src.lib.term import nl, print_error, print_red, was_prev_line_empty
@@ -28,6 +30,12 @@ def handle_err(e: Exception):
     time.sleep(cfg.SLEEP_TIME)
 
 
+def handle_sigterm(signum: int, _frame):
+    # raise instead of dying, so that leases are released and the stage journal is left consistent
+    aio.kill_all()
+    raise SystemExit(128 + signum)
+
+
 @contextmanager
 def use_error_handler():
     try:
@@ -38,6 +46,8 @@ def use_error_handler():
 
 @copy_kwargs_omit_first_arg(AutoM4bArgs.__init__)
 def app(**kwargs):
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, handle_sigterm)
     with use_error_handler():
         args = AutoM4bArgs(**kwargs)
         infinite_loop = args.max_loops == -1
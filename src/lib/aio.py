@@ -0,0 +1,193 @@
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import threading
+from collections.abc import Callable, Coroutine
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Literal, TYPE_CHECKING, TypeVar
+
+from src.lib.misc import get_or_create_event_loop
+
+if TYPE_CHECKING:
+    from src.lib.watchdog import ProcLimits, Watchdog
+
+T = TypeVar("T")
+
+ProcKind = Literal["probe", "encode"]
+
+_LOOP: asyncio.AbstractEventLoop | None = None
+_LOOP_LOCK = threading.Lock()
+_SEMAPHORES: dict[ProcKind, asyncio.Semaphore] = {}
+_PIDS: set[int] = set()
+
+
+def _limits() -> dict[ProcKind, int]:
+    from src.lib.config import cfg
+
+    return {
+        # probes are short and mostly wait on disk, so we can run a lot of them at once
+        "probe": max(cfg.CPU_CORES * 2, 4),
+        # encoders are CPU bound, m4b-tool already uses CPU_CORES jobs on its own
+        "encode": max(cfg.CPU_CORES // 2, 1),
+    }
+
+
+def _run_loop(ready: threading.Event):
+    global _LOOP
+    _LOOP = get_or_create_event_loop()
+    for kind, limit in _limits().items():
+        _SEMAPHORES[kind] = asyncio.Semaphore(limit)
+    ready.set()
+    _LOOP.run_forever()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Returns the shared event loop that all external tools run on, starting it (in a daemon
+    thread) on first use. Sync code in any thread can submit work to it with run_sync."""
+    with _LOOP_LOCK:
+        if _LOOP is None or _LOOP.is_closed():
+            ready = threading.Event()
+            threading.Thread(
+                target=_run_loop, args=(ready,), name="aio", daemon=True
+            ).start()
+            ready.wait()
+    return _LOOP  # type: ignore
+
+
+def submit(coro: Coroutine[Any, Any, T]) -> "Future[T]":
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+def run_sync(coro: Coroutine[Any, Any, T]) -> T:
+    """Runs a coroutine on the shared loop and blocks the calling thread until it's done"""
+    return submit(coro).result()
+
+
+async def _watch(
+    proc: asyncio.subprocess.Process, output: asyncio.Future, watchdog: "Watchdog"
+) -> str | None:
+    """Waits for output, checking on proc every watchdog.interval. Returns why proc had to be
+    stopped, or None if it finished on its own."""
+    while True:
+        done, _pending = await asyncio.wait({output}, timeout=watchdog.interval)
+        if done:
+            return None
+        if reason := await asyncio.to_thread(watchdog.check, proc.pid):
+            await asyncio.to_thread(watchdog.stop, proc.pid)
+            await proc.wait()
+            return reason
+
+
+async def run_async(
+    cmd: list[Any],
+    *,
+    kind: ProcKind | None = None,
+    timeout: float | None = None,
+    watchdog: "Watchdog | None" = None,
+    limits: "ProcLimits | None" = None,
+) -> subprocess.CompletedProcess[bytes]:
+    """Runs an external command without blocking the loop, waiting for a free slot first if kind
+    is given. Returns a CompletedProcess just like subprocess.run(..., capture_output=True).
+    If a watchdog is given, the command (and anything it started) is killed once the watchdog
+    gives up on it, and ProcessStalled (or ProcessCancelled) is raised."""
+    from src.lib.watchdog import ProcessCancelled, ProcessStalled
+
+    cmd = [str(c) for c in (limits.wrap(cmd) if limits else cmd)]
+
+    async def _run():
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        _PIDS.add(proc.pid)
+        output = asyncio.ensure_future(proc.communicate())
+        try:
+            if watchdog:
+                reason = await asyncio.wait_for(_watch(proc, output, watchdog), timeout)
+                if reason:
+                    stopped = ProcessCancelled if watchdog.cancelled else ProcessStalled
+                    raise stopped(cmd, reason)
+            stdout, stderr = await asyncio.wait_for(output, timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            raise subprocess.TimeoutExpired(cmd, timeout or 0)
+        finally:
+            _PIDS.discard(proc.pid)
+        return subprocess.CompletedProcess(cmd, proc.returncode or 0, stdout, stderr)
+
+    if kind is None:
+        return await _run()
+    async with _SEMAPHORES[kind]:
+        return await _run()
+
+
+def kill_all():
+    """Stops every external tool that's still running, e.g. when auto-m4b is asked to shut down,
+    so nothing keeps writing to the working folders after we've exited"""
+    for pid in list(_PIDS):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+
+def run(
+    cmd: list[Any],
+    *,
+    kind: ProcKind | None = None,
+    timeout: float | None = None,
+    watchdog: "Watchdog | None" = None,
+    limits: "ProcLimits | None" = None,
+) -> subprocess.CompletedProcess[bytes]:
+    return run_sync(
+        run_async(cmd, kind=kind, timeout=timeout, watchdog=watchdog, limits=limits)
+    )
+
+
+async def probe_async(file: Path, cmd: str = "ffprobe", **options) -> dict[str, Any]:
+    """Async equivalent of ffmpeg.probe, and raises the same ffmpeg.Error on failure"""
+    import ffmpeg
+    from ffmpeg._utils import convert_kwargs_to_cmd_line_args
+
+    args = [cmd, "-show_format", "-show_streams", "-of", "json"]
+    args += convert_kwargs_to_cmd_line_args(options)
+    args += [str(file)]
+    proc = await run_async(args, kind="probe")
+    if proc.returncode != 0:
+        raise ffmpeg.Error(cmd, proc.stdout, proc.stderr)
+    return json.loads(proc.stdout.decode("utf-8"))
+
+
+def probe(file: Path, cmd: str = "ffprobe", **options) -> dict[str, Any]:
+    return run_sync(probe_async(file, cmd, **options))
+
+
+def probe_all(files: list[Path]) -> list[dict[str, Any] | BaseException]:
+    """Probes all files concurrently (up to the probe limit), in the same order as files.
+    Failed probes are returned as their exception rather than raised."""
+
+    async def _probe_all():
+        return await asyncio.gather(
+            *(probe_async(f) for f in files), return_exceptions=True
+        )
+
+    return run_sync(_probe_all())
+
+
+async def poll_until_async(done: Callable[[], bool], interval: float) -> int:
+    count = 0
+    while not await asyncio.to_thread(done):
+        count += 1
+        await asyncio.sleep(interval)
+    return count
+
+
+def poll_until(done: Callable[[], bool], interval: float) -> int:
+    """Calls done() every interval seconds until it returns True, and returns how many times it
+    had to wait. done() runs in a worker thread, so it's fine for it to hit the filesystem."""
+    return run_sync(poll_until_async(done, interval))
@@ -1,34 +1,31 @@
+from collections.abc import Callable
 from functools import cached_property
 from math import floor
 from pathlib import Path
-from typing import cast, Literal, overload
+from typing import Any, cast, Literal, overload
 
 import cachetools
 import cachetools.func
 from pydantic import BaseModel
 
 from src.lib.config import cfg
-from src.lib.ffmpeg_utils import (
-    DurationFmt,
-    get_bitrate_py,
-    get_duration,
-    get_samplerate_py,
-)
-from src.lib.formatters import human_bitrate
+from src.lib.ffmpeg_utils import BookStats, DurationFmt, get_duration
+from src.lib.formatters import format_duration, human_size
 from src.lib.fs_utils import (
+    BookLayout,
     count_audio_files_in_dir,
     cp_file_to_dir,
-    find_book_audio_files,
     find_cover_art_file,
     find_first_audio_file,
-    find_next_audio_file,
+    get_book_layout,
     get_size,
     hash_path_audio_files,
     last_updated_at,
 )
 from src.lib.id3_utils import extract_cover_art, extract_metadata
 from src.lib.misc import get_dir_name_from_path
-from src.lib.parsers import count_distinct_romans, extract_path_info
+from src.lib.parsers import extract_path_info, FilenameFeatures
+from src.lib.staging import Staging
 from src.lib.typing import AudiobookFmt, BookStructure, DirName, SizeFmt
 
 
@@ -65,7 +62,15 @@ class Audiobook(BaseModel):
     title_is_partno: bool = False
     track_num: tuple[int, int] = (1, 1)
     m4b_num_parts: int = 1
+    scores: dict[str, dict[str, int]] = {}
     _active_dir: DirName | None = None
+    # resolved once, and forgotten by reset_paths()
+    _key: str | None = None
+    _paths: dict[str, Path] = {}
+    _outputs: dict[Path, Path] = {}
+    _item: Any = None
+    _layout_hash: str | None = None
+    _stats: BookStats | None = None
 
     def __init__(self, path: Path):
 
@@ -107,13 +112,40 @@ class Audiobook(BaseModel):
     def inbox_dir(self):
         return self.path
 
+    def reset_paths(self):
+        """Forgets the book's resolved folders and the output files found in them, so they're worked
+        out again on next use. Called whenever the active dir changes, and needed after anything that
+        moves the book's working folders, e.g. staging it in RAM."""
+        self._paths = {}
+        self._outputs = {}
+        self._item = None
+        self._layout_hash = None
+
+    def _resolved(self, name: str, resolve: Callable[[], Path]) -> Path:
+        if (path := self._paths.get(name)) is None:
+            path = self._paths[name] = resolve()
+        return path
+
+    def _find_output(self, d: Path) -> Path | None:
+        """The first m4b in d, remembered once it's been found (until reset_paths)"""
+        if (f := self._outputs.get(d)) is None:
+            try:
+                f = self._outputs[d] = find_first_audio_file(d, ".m4b")
+            except FileNotFoundError:
+                return None
+        return f
+
     @property
     def backup_dir(self) -> Path:
-        return cfg.backup_dir.resolve() / self.key
+        return self._resolved("backup", lambda: cfg.backup_dir.resolve() / self.key)
 
     @property
     def build_dir(self) -> Path:
-        return (cfg.build_dir.resolve() / self.key).with_suffix("") if cfg.PLEX_FORMAT else (cfg.build_dir.resolve() / self.basename).with_suffix("")
+        def resolve():
+            build_root = Staging().root(self.key, "build").resolve()
+            return (build_root / self.key).with_suffix("") if cfg.PLEX_FORMAT else (build_root / self.basename).with_suffix("")
+
+        return self._resolved("build", resolve)
 
     @property
     def build_tmp_dir(self) -> Path:
@@ -121,17 +153,22 @@ class Audiobook(BaseModel):
 
     @property
     def converted_dir(self) -> Path:
-        if cfg.PLEX_FORMAT:
-            return (cfg.converted_dir.resolve() / self.key).with_suffix("")
-        return (cfg.converted_dir.resolve() / self.basename).with_suffix("")
+        def resolve():
+            if cfg.PLEX_FORMAT:
+                return (cfg.converted_dir.resolve() / self.key).with_suffix("")
+            return (cfg.converted_dir.resolve() / self.basename).with_suffix("")
+
+        return self._resolved("converted", resolve)
 
     @property
     def archive_dir(self) -> Path:
-        return cfg.archive_dir.resolve() / self.key
+        return self._resolved("archive", lambda: cfg.archive_dir.resolve() / self.key)
 
     @property
     def merge_dir(self) -> Path:
-        return cfg.merge_dir.resolve() / self.basename
+        return self._resolved(
+            "merge", lambda: Staging().root(self.key, "merge").resolve() / self.basename
+        )
 
     @property
     def build_file(self) -> Path:
@@ -139,10 +176,7 @@ class Audiobook(BaseModel):
             return self.build_dir
         if cfg.PLEX_FORMAT:
                 return self.build_dir / f"{self.title}.m4b"
-        try:
-            return find_first_audio_file(self.build_dir, ".m4b")
-        except FileNotFoundError:
-            return self.build_dir / f"{self.basename}.m4b"
+        return self._find_output(self.build_dir) or self.build_dir / f"{self.basename}.m4b"
 
     @property
     def converted_file(self) -> Path:
@@ -150,21 +184,37 @@ class Audiobook(BaseModel):
             return self.converted_dir
         if cfg.PLEX_FORMAT:
                 return self.converted_dir / f"{self.title}.m4b"
-        try:
-            return find_first_audio_file(self.converted_dir, ".m4b")
-        except FileNotFoundError:
-            return self.converted_dir / f"{self.basename}.m4b"
+        return (
+            self._find_output(self.converted_dir)
+            or self.converted_dir / f"{self.basename}.m4b"
+        )
+
+    @property
+    def layout(self) -> BookLayout:
+        if (item := self._inbox_item) and item.path == self.inbox_dir:
+            return item.layout
+        # not tracked by the inbox, so hash the folder once and keep it until reset_paths
+        if not self._layout_hash:
+            self._layout_hash = hash_path_audio_files(self.inbox_dir)
+        return get_book_layout(self.inbox_dir, self._layout_hash)
 
     @cached_property
     def sample_audio1(self):
-        return find_first_audio_file(self.path)
+        if not (sample := self.layout.sample_audio1):
+            raise FileNotFoundError(f"No audio files found in {self.path}")
+        return sample
 
     @cached_property
     def sample_audio2(self):
-        return find_next_audio_file(self.sample_audio1)
+        return self.layout.sample_audio2
 
     def rescan_structure(self):
-        for attr in ["sample_audio1", "sample_audio2", "structure"]:
+        for attr in [
+            "sample_audio1",
+            "sample_audio2",
+            "structure",
+            "filename_features",
+        ]:
             try:
                 delattr(self, attr)
             except AttributeError:
@@ -181,7 +231,11 @@ class Audiobook(BaseModel):
 
     @cached_property
     def structure(self) -> BookStructure:
-        return find_book_audio_files(self)[0]
+        return self.layout.structure
+
+    @cached_property
+    def filename_features(self) -> FilenameFeatures:
+        return FilenameFeatures.scan(self.inbox_dir)
 
     def is_a(
         self,
@@ -233,11 +287,13 @@ class Audiobook(BaseModel):
         return self._inbox_item.num_books_in_series if self._inbox_item else -1
 
     def num_files(self, for_dir: DirName):
+        if for_dir == "inbox":
+            return self.layout.num_files
         return count_audio_files_in_dir(getattr(self, for_dir + "_dir"))
 
     @property
     def num_roman_numerals(self):
-        return count_distinct_romans(self.inbox_dir)
+        return self.filename_features.num_distinct_romans
 
     @overload
     def size(self, for_dir: DirName, fmt: Literal["bytes"]) -> int: ...
@@ -255,19 +311,36 @@ class Audiobook(BaseModel):
     def duration(self, for_dir: DirName, fmt: Literal["human"]) -> str: ...
 
     def duration(self, for_dir: DirName, fmt: DurationFmt = "seconds"):
+        if for_dir == "inbox":
+            return format_duration(self.stats.duration, fmt)
         return get_duration(getattr(self, for_dir + "_dir"), fmt=fmt)
 
+    @property
+    def stats(self) -> BookStats:
+        """The book's source audio figures, probed on first use (while the book is being prepared)
+        and kept with the book, so nothing has to probe the inbox again once it's converted"""
+        if self._stats is None:
+            layout = self.layout
+            self._stats = BookStats.probe(
+                layout.files, layout.sample_audio1, self.size("inbox")
+            )
+        return self._stats
+
+    @stats.setter
+    def stats(self, stats: BookStats):
+        self._stats = stats
+
     @property
     def bitrate_actual(self):
-        return get_bitrate_py(self.sample_audio1)[1]
+        return self.stats.bitrate[1]
 
     @property
     def bitrate_target(self):
-        return get_bitrate_py(self.sample_audio1)[0]
+        return self.stats.bitrate[0]
 
     @property
     def samplerate(self):
-        return get_samplerate_py(self.sample_audio1)
+        return self.stats.samplerate
 
     @property
     def log_filename(self):
@@ -293,6 +366,7 @@ class Audiobook(BaseModel):
 
     def set_active_dir(self, new_dir: DirName):
         self._active_dir = new_dir
+        self.reset_paths()
 
     @property
     def active_dir(self) -> Path:
@@ -304,7 +378,7 @@ class Audiobook(BaseModel):
 
     @property
     def bitrate_friendly(self):
-        return human_bitrate(self.sample_audio1)
+        return self.stats.bitrate_friendly
 
     @property
     def samplerate_friendly(self):  # round to nearest .1 kHz
@@ -342,13 +416,17 @@ class Audiobook(BaseModel):
 
     @property
     def key(self):
-        return str(self.path.relative_to(cfg.inbox_dir))
+        if self._key is None:
+            self._key = str(self.path.relative_to(cfg.inbox_dir))
+        return self._key
 
     @property
     def _inbox_item(self):
         from src.lib.inbox_state import InboxState
 
-        return InboxState().get(self.key)
+        if self._item is None:
+            self._item = InboxState().get(self.key)
+        return self._item
 
     @property
     def merge_desc_file(self):
@@ -369,7 +447,10 @@ class Audiobook(BaseModel):
             (f for f in [self.converted_file, self.build_file] if f.exists()),
             None,
         )
-        converted_duration = get_duration(m4b_file, "human") if m4b_file else "N/A"
+        # the m4b is the same audio as the inbox files, so there's no need to probe it
+        converted_duration = (
+            format_duration(self.stats.duration, "human") if m4b_file else "N/A"
+        )
         converted_size = get_size(m4b_file, "human") if m4b_file else "N/A"
         orig_basename = (
             f"{'File' if self.path.is_file() else 'Folder'} name: {self.basename}"
@@ -387,7 +468,7 @@ Size: {converted_size}
 (Original)
 {orig_basename}
 Format: {self.orig_file_type or 'N/A'}
-Size: {self.size("inbox", "human")}
+Size: {human_size(self.stats.size)}
 """
         out_path = out_path or self.merge_desc_file
         # write the description to the file, overwriting if it already exists
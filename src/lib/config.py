@@ -464,6 +464,110 @@ class Config:
 
     PLEX_FORMAT = _PLEX_FORMAT
 
+    @env_property(typ=bool, default=False)
+    def _SPECULATIVE_ENCODE(self):
+        """Start encoding a book's files as soon as each one finishes copying into the inbox, instead of waiting for the whole book. Requires ffmpeg."""
+        ...
+
+    SPECULATIVE_ENCODE = _SPECULATIVE_ENCODE
+
+    @env_property(typ=bool, default=False)
+    def _PIPELINE(self):
+        """Prepare the next book (checks, backup, copy to working folder) while the current one is converting."""
+        ...
+
+    PIPELINE = _PIPELINE
+
+    @env_property(typ=float, default=300)
+    def _LEASE_TTL(self):
+        """Seconds before a book claimed by an instance that stopped responding can be claimed by another. Default is 5m."""
+        ...
+
+    LEASE_TTL = _LEASE_TTL
+
+    @env_property(typ=float, default=900)
+    def _CONVERT_STALL_TIMEOUT(self):
+        """Seconds m4b-tool or ffmpeg can go without using any CPU or writing any output before it's stopped and the book is failed. Default is 15m. With Docker, m4b-tool's CPU use can't be seen, so only its output counts."""
+        ...
+
+    CONVERT_STALL_TIMEOUT = _CONVERT_STALL_TIMEOUT
+
+    @env_property(typ=float, default=1.0)
+    def _CONVERT_TIMEOUT_RATIO(self):
+        """Longest a conversion may take, as a multiple of the book's duration (e.g. 1.0 is a 10h conversion for a 10h book). Set to 0 to disable."""
+        ...
+
+    CONVERT_TIMEOUT_RATIO = _CONVERT_TIMEOUT_RATIO
+
+    @env_property(typ=int, default=0)
+    def _CONVERT_MAX_MEMORY_MB(self):
+        """Limits the memory m4b-tool and ffmpeg may use, in MB. Default is 0 (no limit). Not applied to m4b-tool when it runs in Docker."""
+        ...
+
+    CONVERT_MAX_MEMORY_MB = _CONVERT_MAX_MEMORY_MB
+
+    @env_property(typ=int, default=0)
+    def _CONVERT_NICE(self):
+        """Niceness (0-19) to run m4b-tool and ffmpeg at, higher values leave more CPU for other services. Not applied to m4b-tool when it runs in Docker."""
+        ...
+
+    CONVERT_NICE = _CONVERT_NICE
+
+    @env_property(
+        typ=str,
+        default="",
+        on_get=lambda v: (
+            str(v).lower() if str(v).lower() in ("idle", "best-effort", "realtime") else ""
+        ),
+    )
+    def _CONVERT_IONICE(self):
+        """I/O scheduling class to run m4b-tool and ffmpeg with: idle, best-effort or realtime. Requires ionice. Not applied to m4b-tool when it runs in Docker."""
+        ...
+
+    CONVERT_IONICE = _CONVERT_IONICE
+
+    @env_property(typ=int, default=256)
+    def _MIN_FREE_SPACE_MB(self):
+        """Free space (in MB) to leave on each disk auto-m4b writes to. Books that would need more are held back until there's room."""
+        ...
+
+    MIN_FREE_SPACE_MB = _MIN_FREE_SPACE_MB
+
+    @env_property(typ=int, default=0)
+    def _RAM_STAGING_MB(self):
+        """RAM (in MB) that may be used to stage and build small books in RAM_STAGING_FOLDER instead of the working folder. Default is 0 (disabled)."""
+        ...
+
+    RAM_STAGING_MB = _RAM_STAGING_MB
+
+    @env_property(typ=int, default=256)
+    def _RAM_STAGING_MAX_BOOK_MB(self):
+        """Books larger than this (in MB) are always staged on disk."""
+        ...
+
+    RAM_STAGING_MAX_BOOK_MB = _RAM_STAGING_MAX_BOOK_MB
+
+    @env_property(typ=bool, default=False)
+    def _BUILD_NEXT_TO_CONVERTED(self):
+        """If the working folder is on a different disk than the converted folder, build books in a hidden .auto-m4b-build folder in the converted folder, so finished books are moved with a rename instead of a copy."""
+        ...
+
+    BUILD_NEXT_TO_CONVERTED = _BUILD_NEXT_TO_CONVERTED
+
+    @env_property(typ=bool, default=True)
+    def _IO_HINTS(self):
+        """Tell the kernel which files to read ahead (the next book) and which to drop from the page cache (books that are done), so auto-m4b doesn't crowd out other services."""
+        ...
+
+    IO_HINTS = _IO_HINTS
+
+    @env_property(typ=int, default=512)
+    def _READAHEAD_MB(self):
+        """Most of the next book (in MB) to read ahead while the current one converts."""
+        ...
+
+    READAHEAD_MB = _READAHEAD_MB
+
     @property
     def MAX_LOOPS(self):
         return self.args.max_loops if self.args.max_loops else -1
@@ -566,6 +670,22 @@ class Config:
         d.mkdir(parents=True, exist_ok=True)
         return d
 
+    @cached_property
+    def ram_staging_dir(self):
+        """tmpfs folder that small books are staged and built in, so they never touch the disk until
+        they're moved to the converted folder. Defaults to /dev/shm/auto-m4b if /dev/shm exists."""
+        default = Path("/dev/shm/auto-m4b") if Path("/dev/shm").is_dir() else None
+        return self.load_path_env("RAM_STAGING_FOLDER", default, allow_empty=True)
+
+    @cached_property
+    def lease_dir(self):
+        """Folder shared by all auto-m4b instances watching the same inbox, where they claim books so
+        each book is only converted once. Not set by default, which means only one instance is running."""
+        d = self.load_path_env("LEASE_FOLDER", None, allow_empty=True)
+        if d:
+            d.mkdir(parents=True, exist_ok=True)
+        return d
+
     @cached_property
     def build_dir(self):
         return self.working_dir / "build"
@@ -597,11 +717,17 @@ class Config:
 
     def clean(self):
         from src.lib.fs_utils import clean_dir
+        from src.lib.journal import resumable_dirs
+        from src.lib.staging import Staging
 
-        # Pre-clean working folders
-        clean_dir(self.merge_dir)
-        clean_dir(self.build_dir)
+        # Pre-clean working folders, but keep any books that were interrupted so they can resume
+        keep = resumable_dirs()
+        clean_dir(self.merge_dir, keep=keep)
+        clean_dir(self.build_dir, keep=keep)
         clean_dir(self.trash_dir)
+        for d in Staging().extra_roots():
+            if d.exists():
+                clean_dir(d, keep=keep)
 
     def check_dirs(self):
 
@@ -0,0 +1,140 @@
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import NamedTuple, TYPE_CHECKING
+
+from src.lib.config import cfg
+from src.lib.formatters import human_size
+from src.lib.fs_utils import get_size
+from src.lib.misc import singleton
+from src.lib.staging import Staging
+
+if TYPE_CHECKING:
+    from src.lib.audiobook import Audiobook
+    from src.lib.inbox_item import InboxItem
+
+# m4b-tool keeps its encoded pieces in the build folder next to the finished file
+BUILD_OVERHEAD = 2
+
+
+class Footprint(NamedTuple):
+    """Bytes a book will take up in each of the folders it passes through"""
+
+    backup: int = 0
+    merge: int = 0
+    build: int = 0
+    converted: int = 0
+
+    def by_dir(self, key: str = "") -> dict[Path, int]:
+        staging = Staging()
+        return {
+            cfg.backup_dir: self.backup,
+            staging.root(key, "merge"): self.merge,
+            staging.root(key, "build"): self.build,
+            cfg.converted_dir: self.converted,
+        }
+
+    def less(self, used: "Footprint") -> "Footprint":
+        """The part of the footprint that still has to be written, given what's already on disk"""
+        return Footprint(*(max(n - u, 0) for n, u in zip(self, used)))
+
+
+def estimate_footprint(size: int, ratio: float = 1.0) -> Footprint:
+    """Estimates a book's footprint from the size of its audio files, and the size of the
+    converted book relative to them (ratio)"""
+    output = int(size * ratio)
+    return Footprint(
+        backup=size if cfg.BACKUP else 0,
+        merge=size,
+        build=output * BUILD_OVERHEAD,
+        converted=output,
+    )
+
+
+def estimate_book_footprint(book: "Audiobook") -> Footprint:
+    size = book.size("inbox", "bytes")
+    if book.orig_file_type in ("m4a", "m4b") or not book.bitrate_actual:
+        return estimate_footprint(size)
+    # lossless sources shrink a lot, lossy ones are re-encoded at about the same bitrate
+    return estimate_footprint(size, min(book.bitrate_target / book.bitrate_actual, 1.0))
+
+
+def on_disk(book: "Audiobook") -> Footprint:
+    """What the book already has in its working folders, e.g. if it was staged in an earlier pass
+    or is being resumed. It's already been taken out of the disk's free space, so it shouldn't be
+    counted again."""
+    merge, build = (get_size(d) if d.exists() else 0 for d in (book.merge_dir, book.build_dir))
+    return Footprint(merge=merge, build=build)
+
+
+def existing_parent(path: Path) -> Path:
+    while not path.exists() and path != path.parent:
+        path = path.parent
+    return path
+
+
+@singleton
+class DiskSpace:
+    """Admits books for conversion only if every folder they'll be written to has room for them.
+    Books that were admitted but haven't finished yet hold a reservation for their footprint, so
+    that books being prepared while another converts can't overcommit the disk. Folders on the
+    same filesystem share its free space."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reserved: dict[str, Footprint] = {}
+
+    def blockers(self, footprint: Footprint, key: str | None = None) -> list[str]:
+        """Returns a message for each filesystem that doesn't have room for footprint
+        (on top of everything already reserved by other books)"""
+        needed: dict[int, tuple[int, list[Path]]] = {}
+        others = [(k, fp) for k, fp in self._reserved.items() if k != key]
+        for k, fp in [(key or "", footprint), *others]:
+            for d, n in fp.by_dir(k).items():
+                if not n:
+                    continue
+                dev = os.stat(existing_parent(d)).st_dev
+                total, dirs = needed.get(dev, (0, []))
+                needed[dev] = (total + n, dirs if d in dirs else [*dirs, d])
+
+        min_free = int(cfg.MIN_FREE_SPACE_MB) * 1024 * 1024
+        msgs = []
+        for total, dirs in needed.values():
+            free = shutil.disk_usage(existing_parent(dirs[0])).free - min_free
+            if total > free:
+                where = ", ".join(str(d) for d in dirs)
+                msgs.append(
+                    f"{human_size(total)} is needed in {where}, but only {human_size(max(free, 0))} is available"
+                )
+        return msgs
+
+    def fits(self, footprint: Footprint) -> bool:
+        with self._lock:
+            return not self.blockers(footprint)
+
+    def reserve(self, key: str, footprint: Footprint) -> list[str]:
+        """Reserves room for the book if there's enough, otherwise returns what's blocking it"""
+        with self._lock:
+            if blocked := self.blockers(footprint, key):
+                return blocked
+            self._reserved[key] = footprint
+            return []
+
+    def release(self, key: str):
+        with self._lock:
+            self._reserved.pop(key, None)
+
+    def release_all(self):
+        with self._lock:
+            self._reserved = {}
+
+    def fits_first(self, items: list["InboxItem"]) -> list["InboxItem"]:
+        """Reorders items so that books that fit right now go ahead of ones that don't,
+        otherwise keeping their order"""
+
+        def fits(item: "InboxItem") -> bool:
+            footprint = estimate_footprint(item.size)
+            return self.fits(footprint.less(on_disk(item.to_audiobook())))
+
+        return sorted(items, key=lambda item: not fits(item))
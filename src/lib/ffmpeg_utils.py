@@ -1,6 +1,7 @@
 import subprocess
+from collections.abc import Sequence
 from pathlib import Path
-from typing import Any, Literal, overload
+from typing import Any, Literal, NamedTuple, overload
 
 import cachetools.func
 import ffmpeg
@@ -9,8 +10,9 @@ from src.lib.misc import fix_ffprobe
 
 fix_ffprobe()
 
+from src.lib import aio
 from src.lib.config import AUDIO_EXTS
-from src.lib.formatters import format_duration, get_nearest_standard_bitrate
+from src.lib.formatters import format_bitrate, format_duration, get_nearest_standard_bitrate
 from src.lib.fs_utils import only_audio_files
 from src.lib.term import print_error
 from src.lib.typing import DurationFmt, MEMO_TTL
@@ -23,13 +25,73 @@ def get_file_duration(file_path: Path) -> float:
 
 def get_file_duration_py(file_path: Path) -> float:
     try:
-        return float(ffmpeg.probe(str(file_path))["format"]["duration"])
+        return float(aio.probe(file_path)["format"]["duration"])
     except ffmpeg.Error as e:
-        from src.lib.logger import write_err_file
-
-        write_err_file(file_path, e, "ffprobe", e.stderr.decode())
-        print_error(f"Error getting duration for {file_path}")
-        return 0
+        return _duration_probe_failed(file_path, e)
+
+
+def _duration_probe_failed(file_path: Path, e: ffmpeg.Error) -> float:
+    from src.lib.logger import write_err_file
+
+    write_err_file(file_path, e, "ffprobe", e.stderr.decode())
+    print_error(f"Error getting duration for {file_path}")
+    return 0
+
+
+def get_files_duration(files: list[Path]) -> float:
+    """Total duration of all files, probed concurrently"""
+    duration = 0
+    for file, result in zip(files, aio.probe_all(files)):
+        if isinstance(result, ffmpeg.Error):
+            duration += _duration_probe_failed(file, result)
+        elif isinstance(result, BaseException):
+            raise result
+        else:
+            duration += float(result["format"]["duration"])
+    return duration
+
+
+class BookStats(NamedTuple):
+    """A book's source audio figures, probed once while the book is being prepared, so that the
+    log, the description and the banners don't have to probe the inbox again after converting"""
+
+    num_files: int
+    size: int
+    durations: tuple[float, ...]
+    bitrates: tuple[int, ...]
+    bitrate: tuple[int, int]  # (nearest standard, actual) of the book's first file
+    samplerate: int
+
+    @property
+    def duration(self) -> float:
+        return sum(self.durations)
+
+    @property
+    def bitrate_friendly(self) -> str:
+        return format_bitrate(*self.bitrate)
+
+    @classmethod
+    def probe(cls, files: Sequence[Path], sample: Path | None, size: int) -> "BookStats":
+        """Probes every file concurrently for its duration and bitrate"""
+        durations: list[float] = []
+        bitrates: list[int] = []
+        for file, result in zip(files, aio.probe_all(list(files))):
+            if isinstance(result, ffmpeg.Error):
+                durations.append(_duration_probe_failed(file, result))
+                bitrates.append(0)
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                durations.append(float(result["format"]["duration"]))
+                bitrates.append(int(result["streams"][0].get("bit_rate") or 0))
+        return cls(
+            num_files=len(files),
+            size=size,
+            durations=tuple(durations),
+            bitrates=tuple(bitrates),
+            bitrate=get_bitrate_py(sample) if sample else (0, 0),
+            samplerate=get_samplerate_py(sample) if sample else 0,
+        )
 
 
 @overload
@@ -55,9 +117,7 @@ def get_duration(path: Path, fmt: DurationFmt = "human") -> str | float:
         if not files:
             raise ValueError(f"No audio files found in {path}")
 
-        duration = 0
-        for file in files:
-            duration += get_file_duration_py(file)
+        duration = get_files_duration(files)
 
     return format_duration(duration, fmt)
 
@@ -91,7 +151,7 @@ def get_bitrate_py(file: Path) -> tuple[int, int]:
         tuple[int, int]: (in kbps) The nearest standard bitrate, and the actual bitrate rounded to the nearest int.
     """
     try:
-        probe_result = ffmpeg.probe(str(file))
+        probe_result = aio.probe(file)
         actual_bitrate = int(probe_result["streams"][0]["bit_rate"])
         return get_nearest_standard_bitrate(actual_bitrate), actual_bitrate
     except ffmpeg.Error as e:
@@ -111,7 +171,7 @@ def get_bitrate_py(file: Path) -> tuple[int, int]:
 @cachetools.func.ttl_cache(maxsize=128, ttl=MEMO_TTL)
 def get_samplerate_py(file: Path) -> int:
     try:
-        probe_result = ffmpeg.probe(str(file))
+        probe_result = aio.probe(file)
         sample_rate = probe_result["streams"][0]["sample_rate"]
         return int(sample_rate)
     except ffmpeg.Error as e:
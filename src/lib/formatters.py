@@ -82,10 +82,14 @@ def get_nearest_standard_bitrate(bitrate: int) -> int:
 
 
 def human_bitrate(file: Path) -> str:
-    from src.lib.ffmpeg_utils import get_bitrate_py, is_variable_bitrate
+    from src.lib.ffmpeg_utils import get_bitrate_py
 
-    std, actual = get_bitrate_py(file)
-    if is_variable_bitrate(file):
+    return format_bitrate(*get_bitrate_py(file))
+
+
+def format_bitrate(std: int, actual: int) -> str:
+    if abs(actual - std) > 0.5:
+        # variable bitrate
         return f"~{round(actual / 1000)} kb/s"
     return f"{round(std / 1000)} kb/s"
 
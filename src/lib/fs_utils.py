@@ -2,13 +2,18 @@ import fnmatch
 import os
 import re
 import shutil
+import stat
+import threading
 import time
 from collections.abc import Generator, Iterable
 from pathlib import Path
 from typing import Any, cast, Literal, NamedTuple, overload, TYPE_CHECKING
 
+import cachetools
+
 from src.lib.config import AUDIO_EXTS, cfg
 from src.lib.formatters import ensure_dot, friendly_date, human_size
+from src.lib.io_hints import drop_after_copy
 from src.lib.misc import isorted, sh, try_get_stat_mtime
 from src.lib.term import (
     print_error,
@@ -20,6 +25,7 @@ from src.lib.typing import (
     BookHashesDict,
     BookStructure,
     copy_kwargs_omit_first_arg,
+    DropCache,
     InboxDirMap,
     Operation,
     OVERWRITE_MODES,
@@ -297,6 +303,7 @@ def _mv_or_cp_dir_contents(
     silent_files: list[str] = [],
     only_file_exts: list[str] = [],
     keep_src_dir: bool = False,
+    drop_cache: DropCache = None,
 ):
     """Moves or copies the contents of a source directory into a destination directory. For example:
 
@@ -311,6 +318,9 @@ def _mv_or_cp_dir_contents(
 
     If moving, and the source directory is empty after moving files, it will be removed.
 
+    If drop_cache is set, the source and/or destination files are dropped from the page cache as
+    they're done, so that big copies don't push hotter data out of it.
+
     Default overwrite mode is 'skip', which will raise an error if the destination directory already exists, because we shouldn't ever be automatically overwriting an entire directory.
     """
     from src.lib.config import cfg
@@ -391,6 +401,7 @@ def _mv_or_cp_dir_contents(
                 overwrite_mode=overwrite_mode,
                 ignore_files=ignore_files,
                 only_file_exts=only_file_exts,
+                drop_cache=drop_cache,
             )
         dst_file = dst_dir / src_file.name
         if ok_to_mv_or_cp(src_file, dst_file):
@@ -400,6 +411,8 @@ def _mv_or_cp_dir_contents(
                 shutil.move(src_file, dst_file)
             if not dst_file.is_file():
                 files_not_verbed.append(src_file)
+            else:
+                drop_after_copy(src_file, dst_file, drop_cache)
 
     # files_not_in_right = set(find_files(src_dir, ignore_files)) - set(
     #     find_files(dst_dir, ignore_files)
@@ -445,6 +458,7 @@ def _mv_or_copy_dir(
     *,
     overwrite_mode: OverwriteMode = "skip",
     silent_files: list[str] = [],
+    drop_cache: DropCache = None,
 ):
     """Moves or copies the source directory *into* the destination directory. For example:
 
@@ -473,6 +487,7 @@ def _mv_or_copy_dir(
         dst_dir,
         overwrite_mode=overwrite_mode,
         silent_files=silent_files,
+        drop_cache=drop_cache,
     )
 
 
@@ -514,6 +529,7 @@ def mv_file_to_dir(
     *,
     new_filename: str | None = None,
     overwrite_mode: OverwriteMode | None = None,
+    drop_cache: DropCache = None,
 ) -> None:
     check_src_dst(source_file, "file", dst_dir, "dir", overwrite_mode)
 
@@ -534,6 +550,7 @@ def mv_file_to_dir(
 
     # Move the file
     shutil.move(source_file, dst_file)
+    drop_after_copy(source_file, dst_file, drop_cache)
 
 
 def cp_file_to_dir(
@@ -541,6 +558,7 @@ def cp_file_to_dir(
     dst_dir: Path,
     new_filename: str | None = None,
     overwrite_mode: OverwriteMode | None = None,
+    drop_cache: DropCache = None,
 ) -> None:
     # Check source and destination
     check_src_dst(source_file, "file", dst_dir, "dir", overwrite_mode)
@@ -561,6 +579,8 @@ def cp_file_to_dir(
     if new_filename:
         shutil.move(dst_dir / source_file.name, dst_file)
 
+    drop_after_copy(source_file, dst_file, drop_cache)
+
 
 def dir_is_empty_ignoring_hidden_files(d: Path) -> bool:
     if not d.is_dir():
@@ -605,15 +625,12 @@ def flatten_files_in_dir(
 
 def flattening_files_in_dir_affects_order(path: Path) -> bool:
     """Compares the order of files in a directory, both before and after flattening, by checking if the file names are in the same order."""
+    from src.lib.parsers import FilenameFeatures
 
-    files_flat = [
-        f.name for f in filter_ignored(flatten_files_in_dir(path, preview=True))
-    ]
-    files_flat_sorted = isorted(list(set(files_flat)))
-    if len(files_flat) != len(files_flat_sorted):
-        return True
+    if not path.is_dir():
+        raise NotADirectoryError(f"Error: {path} is not a directory")
 
-    return only_audio_files(files_flat_sorted) != only_audio_files(files_flat)
+    return FilenameFeatures.scan(path).flattening_affects_order
 
 
 def name_matches(name: Any, match_filter: str | None = None) -> bool:
@@ -699,10 +716,9 @@ def find_book_dirs_in_inbox(
     if not cfg.CONVERT_SERIES:
         return [] if only_series_parents else book_dirs
 
-    books_info = [(d, *find_book_audio_files(d)) for d in book_dirs]
     # look in each book dir to see if it is maybe a multi-book series
-    for path, structure, _ in books_info.copy():
-        if structure == "multi_book_series":
+    for path in book_dirs.copy():
+        if get_book_layout(path, known_book_hash(path)).structure == "multi_book_series":
             if only_series_parents:
                 continue
             parent_idx = book_dirs.index(path)
@@ -750,73 +766,121 @@ def find_books_in_inbox():
     return isorted(find_book_dirs_in_inbox() + find_standalone_books_in_inbox())
 
 
-def find_book_audio_files(
-    book: "Audiobook | Path",
+class BookLayout(NamedTuple):
+    """How a book's audio files are laid out in its folder, from one walk of the folder. Shared by
+    everything that needs the book's structure, and cached by the book's hash (see get_book_layout)
+    so it's only worked out again once the book's audio files change."""
+
+    path: Path
+    structure: BookStructure
+    file_map: InboxDirMap
+    files: tuple[Path, ...]
+    sample_audio1: Path | None
+    sample_audio2: Path | None
+    size: int
+
+    @property
+    def num_files(self) -> int:
+        return len(self.files)
+
+    @classmethod
+    def scan(cls, path: Path) -> "BookLayout":
+        if path.is_file():
+            return cls(
+                path=path,
+                structure="standalone",
+                file_map=((path,),),
+                files=(path,),
+                sample_audio1=path,
+                sample_audio2=find_next_audio_file(path),
+                size=path.stat().st_size,
+            )
+
+        files: list[Path] = []
+        size = 0
+        for f in isorted(path.rglob("*")):
+            if f.name.startswith(".") or f.suffix not in cfg.AUDIO_EXTS:
+                continue
+            try:
+                st = f.stat()
+            except OSError:
+                continue
+            if stat.S_ISREG(st.st_mode):
+                files.append(f)
+                size += st.st_size
+
+        sample_audio1 = min(files, default=None)
+        sample_audio2 = sample_audio1 and next(
+            (
+                f
+                for f in files
+                if f.is_relative_to(sample_audio1.parent) and f.name != sample_audio1.name
+            ),
+            None,
+        )
+        structure, file_map = classify_book_layout(path, files)
+        return cls(
+            path=path,
+            structure=structure,
+            file_map=file_map,
+            files=tuple(files),
+            sample_audio1=sample_audio1,
+            sample_audio2=sample_audio2,
+            size=size,
+        )
+
+
+def classify_book_layout(
+    path: Path, all_audio_files: list[Path]
 ) -> tuple[BookStructure, InboxDirMap]:
-    """Given a book directory, returns a tuple of the book's directory structure type, and a map of the book's audio files."""
-    from src.lib.config import cfg
+    """Works out a book's structure type and a map of its audio files, given all of the audio files
+    in the book's folder (sorted, as find_files_in_dir returns them)"""
     from src.lib.parsers import (
         is_maybe_multi_book_or_series,
         is_maybe_multi_disc,
         is_maybe_multi_part,
     )
 
-    path = book if isinstance(book, Path) else book.inbox_dir
-
-    if path.is_file():
-        return ("standalone", [(path,)])
-
-    all_audio_files = find_files_in_dir(
-        path, resolve=True, only_file_exts=cfg.AUDIO_EXTS
-    )
-    root_audio_files = [f for f in all_audio_files if f.parent == path]
-
     if not all_audio_files:
-        return ("empty", [])
+        return ("empty", ())
 
     if len(all_audio_files) == 1:
-        return ("single", [(all_audio_files[0],)])
+        return ("single", ((all_audio_files[0],),))
+
+    # group the files by the directory they're in, in one pass (in the order the dirs are found)
+    files_by_dir: dict[Path, list[Path]] = {}
+    for f in all_audio_files:
+        files_by_dir.setdefault(f.parent, []).append(f)
 
-    root_audio_files_tuples: InboxDirMap = [(f,) for f in root_audio_files]
+    root_audio_files = files_by_dir.pop(path, [])
+    root_audio_files_tuples = tuple((f,) for f in root_audio_files)
 
     if len(root_audio_files) == len(all_audio_files):
         return ("flat", root_audio_files_tuples)
 
-    # generate a dictionary of nested audio files keyed by the directory they're in
-    nested_audio_files_dict = {
-        d: [f for f in all_audio_files if f.parent == d]
-        for d in [f.parent for f in all_audio_files]
-        if d != path and d.is_dir()
-    }
-
+    nested_audio_files_dict = {d: tuple(files) for d, files in files_by_dir.items()}
     nested_audio_dirs = nested_audio_files_dict.keys()
 
     if not root_audio_files and len(nested_audio_files_dict) == 1:
-        structure_type = "flat_nested"
+        structure_type: BookStructure = "flat_nested"
 
         # setup with readarr for plex this file format is expected. do not flatten
-        if(cfg.PLEX_FORMAT):
+        if cfg.PLEX_FORMAT:
             structure_type = "readarr_standard"
 
         first_nested_dir = next(iter(nested_audio_dirs))
         return (
             structure_type,
-            [
-                (
-                    first_nested_dir,
-                    nested_audio_files_dict[first_nested_dir],
-                )
-            ],
+            ((first_nested_dir, nested_audio_files_dict[first_nested_dir]),),
         )
 
+    nested_dirs_tuples = tuple(nested_audio_files_dict.items())
+
     # if audio files exist in more than one level, return the structure as "multi_mixed"
     number_of_different_levels = len(
         set([len(f.relative_to(path).parts) for f in all_audio_files])
     )
     if number_of_different_levels > 1:
-        nested_dirs_tuples: InboxDirMap = [
-            (d, nested_audio_files_dict[d]) for d in nested_audio_files_dict
-        ]
         return (
             "multi_mixed",
             cast(InboxDirMap, root_audio_files_tuples + nested_dirs_tuples),
@@ -840,13 +904,8 @@ def find_book_audio_files(
                     is_maybe_multi_book_or_series(b) for b in nested_basenames
                 )
 
-    file_map = [
-        *[(f,) for f in root_audio_files],
-        *[
-            (d, find_files_in_dir(d, resolve=True, only_file_exts=cfg.AUDIO_EXTS))
-            for d in nested_audio_dirs
-        ],
-    ]
+    # all files are on the same level, so each dir's files are everything under it
+    file_map = cast(InboxDirMap, root_audio_files_tuples + nested_dirs_tuples)
 
     struc: BookStructure
     if book_series:
@@ -866,6 +925,42 @@ def find_book_audio_files(
     )
 
 
+_BOOK_LAYOUTS: "cachetools.LRUCache[tuple[Path, str], BookLayout]" = cachetools.LRUCache(
+    maxsize=256
+)
+_BOOK_LAYOUTS_LOCK = threading.Lock()
+
+
+def known_book_hash(path: Path) -> str:
+    """The book's hash as the inbox last saw it, only hashed afresh if the inbox isn't tracking it
+    yet"""
+    from src.lib.inbox_state import InboxState
+
+    return InboxState().known_hash(path) or hash_path_audio_files(path)
+
+
+def get_book_layout(path: Path, book_hash: str) -> BookLayout:
+    """Returns the book's layout, cached by the book's hash so that its folder is only walked again
+    once its audio files have changed. Callers pass the hash they already know, e.g. an InboxItem's,
+    rather than hashing the folder on every call."""
+    key = (path, book_hash)
+    with _BOOK_LAYOUTS_LOCK:
+        if layout := _BOOK_LAYOUTS.get(key):
+            return layout
+    layout = BookLayout.scan(path)
+    with _BOOK_LAYOUTS_LOCK:
+        _BOOK_LAYOUTS[key] = layout
+    return layout
+
+
+def find_book_audio_files(
+    book: "Audiobook | Path",
+) -> tuple[BookStructure, InboxDirMap]:
+    """Given a book directory, returns a tuple of the book's directory structure type, and a map of the book's audio files."""
+    layout = get_book_layout(book, known_book_hash(book)) if isinstance(book, Path) else book.layout
+    return (layout.structure, layout.file_map)
+
+
 def find_too_small_files(a: Path, b: Path) -> list[Path]:
     return [
         a
@@ -877,8 +972,22 @@ def find_too_small_files(a: Path, b: Path) -> list[Path]:
     ]
 
 
-def clean_dir(dir_path: Path) -> None:
+def clean_dir(dir_path: Path, keep: list[Path] = []) -> None:
+    """Empties dir_path, except for any paths in keep (and the folders that contain them)"""
     dir_path = dir_path.resolve()
+    keep = [k.resolve() for k in keep if k.resolve().is_relative_to(dir_path)]
+
+    if keep and dir_path.is_dir():
+        for child in dir_path.iterdir():
+            if child in keep:
+                continue
+            elif any(k.is_relative_to(child) for k in keep):
+                clean_dir(child, keep=keep)
+            elif child.is_dir() and not child.is_symlink():
+                rm_dir(child, ignore_errors=True, even_if_not_empty=True)
+            else:
+                child.unlink(missing_ok=True)
+        return
 
     rm_dir(dir_path, ignore_errors=True, even_if_not_empty=True)
 
@@ -898,9 +1007,9 @@ def clean_dir(dir_path: Path) -> None:
         )
 
 
-def clean_dirs(dirs: list[Path]) -> None:
+def clean_dirs(dirs: list[Path], keep: list[Path] = []) -> None:
     for d in dirs:
-        clean_dir(d)
+        clean_dir(d, keep=keep)
 
 
 def rm_dirs(
@@ -1002,8 +1111,6 @@ def find_recently_modified_files_and_dirs(
     since: float = 0,
     only_file_exts: list[str] = [],
 ) -> list[tuple[Path, float, float]]:
-    import threading
-
     from src.lib.config import cfg
 
     if within_seconds == 0:
@@ -1018,17 +1125,13 @@ def find_recently_modified_files_and_dirs(
         )
     )
 
-    # Create a lock
-    lock = threading.Lock()
-
     for path, last_modified in found_items:
-        with lock:
-            # check p against cfg.IGNORE_FILES - a list of glob patterns to ignore
-            if path.is_file() and only_file_exts and not path.suffix in only_file_exts:
-                continue
-            age = (since or current_time) - last_modified
-            if age < within_seconds or within_seconds == -1:
-                recent_items.append((path, age, last_modified))
+        # check p against cfg.IGNORE_FILES - a list of glob patterns to ignore
+        if path.is_file() and only_file_exts and not path.suffix in only_file_exts:
+            continue
+        age = (since or current_time) - last_modified
+        if age < within_seconds or within_seconds == -1:
+            recent_items.append((path, age, last_modified))
 
     return recent_items
 
@@ -1134,6 +1237,49 @@ def hash_path_audio_files(path: Path, *, debug: bool = False) -> str:
     return hash_path(path, only_file_exts=AUDIO_EXTS, debug=debug)
 
 
+# bytes read from the start, middle and end of each audio file when fingerprinting its content
+CONTENT_SAMPLE_SIZE = 64 * 1024
+
+_CONTENT_SAMPLES: "cachetools.LRUCache[tuple[Path, int, int], str]" = cachetools.LRUCache(
+    maxsize=4096
+)
+_CONTENT_SAMPLES_LOCK = threading.Lock()
+
+
+def sample_file_content(f: Path) -> str:
+    """Hashes f's size and a sample of its start, middle and end. Remembered until f's size or
+    mtime changes, so each file is only read once."""
+    import hashlib
+
+    st = f.stat()
+    key = (f, st.st_size, st.st_mtime_ns)
+    with _CONTENT_SAMPLES_LOCK:
+        if digest := _CONTENT_SAMPLES.get(key):
+            return digest
+    middle = max(st.st_size // 2 - CONTENT_SAMPLE_SIZE // 2, 0)
+    end = max(st.st_size - CONTENT_SAMPLE_SIZE, 0)
+    h = hashlib.blake2b(str(st.st_size).encode(), digest_size=16)
+    with open(f, "rb") as fh:
+        for offset in sorted({0, middle, end}):
+            fh.seek(offset)
+            h.update(fh.read(CONTENT_SAMPLE_SIZE))
+    digest = h.hexdigest()
+    with _CONTENT_SAMPLES_LOCK:
+        _CONTENT_SAMPLES[key] = digest
+    return digest
+
+
+def fingerprint_audio_files(files: Iterable[Path]) -> str:
+    """Makes a hash of the files' contents (see sample_file_content), ignoring their names and
+    folders, so that the same book fingerprints the same wherever it was put and however its files
+    were named. Unlike hash_path_audio_files, two books whose files merely have the same names and
+    sizes don't match."""
+    import hashlib
+
+    samples = sorted(sample_file_content(f) for f in files)
+    return hashlib.md5(":".join(samples).encode()).hexdigest()
+
+
 def hash_entire_inbox():
     from src.lib.config import cfg
 
@@ -12,6 +12,7 @@ class Hasher:
     def __init__(self, path: Path, max_hashes: int = 10):
         self.path = path
         self.max_hashes = max_hashes
+        self._lock = threading.RLock()
         self._hashes = []
         self._last_run_start = None
         self._last_run_end = None
@@ -29,7 +30,7 @@ class Hasher:
         return last_updated_audio_files_at(self.path)
 
     def scan(self):
-        with threading.Lock():
+        with self._lock:
             new_hash = self.next_hash
             if new_hash != self.curr_hash:
                 self._hashes.insert(0, (new_hash, time.time()))
@@ -96,7 +97,8 @@ class Hasher:
         }
 
     def flush(self):
-        self._hashes = [(self.next_hash, self.last_updated)]
+        with self._lock:
+            self._hashes = [(self.next_hash, self.last_updated)]
 
     def __hash__(self):
         return hash(self.path)
@@ -8,12 +8,14 @@ from typing import Any, cast, Literal, NamedTuple, overload, TYPE_CHECKING
 
 import bidict
 import ffmpeg
+import numpy as np
 from columnar import columnar
 from mutagen.mp3 import HeaderNotFoundError
-from rapidfuzz import fuzz
+from rapidfuzz import fuzz, process
 from rapidfuzz.distance import LCSseq, Levenshtein
 from tinta import Tinta
 
+from src.lib import aio
 from src.lib.cleaners import clean_string, strip_author_narrator, strip_leading_articles
 from src.lib.fs_utils import find_first_audio_file
 from src.lib.misc import compare_trim, fix_ffprobe, get_numbers_in_string
@@ -47,6 +49,8 @@ from src.lib.typing import AdditionalTags, BadFileError, ScoredProp, TagSource
 MissingApplicationError = ValueError
 
 if TYPE_CHECKING:
+    from mutagen.mp4 import MP4, MP4Cover
+
     from src.lib.audiobook import Audiobook
 
 
@@ -64,11 +68,7 @@ def write_id3_tags_exiftool(file: Path, exiftool_args: list[str]) -> None:
         )
 
     # write tag to file, using eval so that quotes are not escaped
-    subprocess.run(
-        ["exiftool", "-overwrite_original"] + exiftool_args + api_opts + [str(file)],
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL,
-    )
+    aio.run(["exiftool", "-overwrite_original"] + exiftool_args + api_opts + [file])
 
 
 TagSet = NamedTuple(
@@ -117,12 +117,26 @@ def _tags_from_book_or_dict(book_or_dict: "Audiobook | dict[str, Any]") -> TagSe
     return TagSet(title, artist, album, albumartist, composer, date, track_num, comment)
 
 
+def _cover_atom(cover: Path) -> "MP4Cover":
+    from mutagen.mp4 import MP4Cover
+
+    if cover.suffix in [".jpg", ".jpeg"]:
+        fmt = MP4Cover.FORMAT_JPEG
+    elif cover.suffix == ".png":
+        fmt = MP4Cover.FORMAT_PNG
+    else:
+        raise IOError(
+            f"Error: Could not set cover art, '{cover}' is not a valid .jpg or .png file"
+        )
+    return MP4Cover(cover.read_bytes(), fmt)
+
+
 def write_m4b_tags(
     file: Path, book: "Audiobook | dict[str, Any]", cover: Path | None = None
 ):
     """Uses mutagen to write id3 tags to an m4b file"""
     try:
-        from mutagen.mp4 import MP4, MP4Cover
+        from mutagen.mp4 import MP4
     except ImportError:
         raise MissingApplicationError(
             "Error: mutagen is not available, please install it with\n\n $ pip install mutagen\n\n...then try again"
@@ -149,19 +163,7 @@ def write_m4b_tags(
 
         # if cover exists, determine if it is jpg or png and set it
         if cover and cover.is_file():
-            with open(cover, "rb") as img_in:
-                image_data = img_in.read()
-
-            if cover.suffix in [".jpg", ".jpeg"]:
-                mime_type = MP4Cover.FORMAT_JPEG
-            elif cover.suffix == ".png":
-                mime_type = MP4Cover.FORMAT_PNG
-            else:
-                raise IOError(
-                    f"Error: Could not set cover art, '{cover}' is not a valid .jpg or .png file"
-                )
-                return
-            f["covr"] = [MP4Cover(image_data, mime_type)]
+            f["covr"] = [_cover_atom(cover)]
 
         f.save()
 
@@ -243,14 +245,83 @@ def write_mp3_tags(
         )
 
 
+class TagUpdate(NamedTuple):
+    what: str
+    atom: str
+    current: str | None
+    expected: str
+    value: Any
+
+
+def diff_m4b_tags(
+    f: "MP4", book: "Audiobook", cover: Path | None = None
+) -> list[TagUpdate]:
+    """Compares the tags of an already opened m4b to the book's metadata, and returns the atoms
+    that don't match, along with what they should be set to"""
+    tags = f.tags or {}
+
+    def current(atom: str) -> str:
+        return str(v[0]) if (v := tags.get(atom)) else ""
+
+    date = _tags_from_book_or_dict(book).date
+    # (what, atom, expected, needs updating)
+    checks = [
+        ("Title", "\xa9nam", book.title, bool(book.title)),
+        ("Artist (author)", "\xa9ART", book.author, bool(book.author)),
+        ("Album (title)", "\xa9alb", book.title, bool(book.title)),
+        ("Sort album (title)", "soal", book.title, bool(book.title)),
+        ("Album artist (author)", "aART", book.author, bool(book.author)),
+        ("Composer (narrator)", "\xa9wrt", book.narrator, bool(book.narrator)),
+    ]
+    updates = [
+        TagUpdate(what, atom, current(atom), expected, [expected])
+        for what, atom, expected, check in checks
+        if check and current(atom) != expected
+    ]
+
+    if book.date and get_year_from_date(current("\xa9day")) != get_year_from_date(
+        book.date
+    ):
+        updates.append(TagUpdate("Date", "\xa9day", current("\xa9day"), book.date, [date]))
+
+    if book.comment and not compare_trim(current("\xa9cmt"), book.comment):
+        updates.append(
+            TagUpdate(
+                "Comment", "\xa9cmt", current("\xa9cmt"), book.comment, [book.comment]
+            )
+        )
+
+    if cover and cover.exists() and not tags.get("covr"):
+        updates.append(
+            TagUpdate("Cover art", "covr", None, cover.name, [_cover_atom(cover)])
+        )
+
+    return updates
+
+
+def update_m4b_tags(
+    file: Path, book: "Audiobook", cover: Path | None = None
+) -> list[TagUpdate]:
+    """Opens file once, and rewrites only the atoms that don't match the book's metadata.
+    Returns the atoms that were updated."""
+    from mutagen.mp4 import MP4
+
+    f = MP4(file)
+    if updates := diff_m4b_tags(f, book, cover):
+        if f.tags is None:
+            f.add_tags()
+        for update in updates:
+            f[update.atom] = update.value
+        f.save()
+    return updates
+
+
 def verify_and_update_id3_tags(
     book: "Audiobook", in_dir: Literal["build", "converted"]
 ) -> None:
     # takes the inbound book, then checks the converted file and verifies that the id3 tags match the extracted metadata
     # if they do not match, it will print a notice and update the id3 tags
 
-    from src.lib.audiobook import Audiobook
-
     m4b_to_check = book.converted_file if in_dir == "converted" else book.build_file
 
     if not m4b_to_check.is_file():
@@ -262,17 +333,6 @@ def verify_and_update_id3_tags(
 
     smart_print("\nVerifying id3 tags...", end="")
 
-    book_to_check = Audiobook(m4b_to_check).extract_metadata(quiet=True)
-
-    title_needs_updating = False
-    author_needs_updating = False
-    narrator_needs_updating = False
-    date_needs_updating = False
-    comment_needs_updating = False
-    cover_needs_updating = False
-
-    updates = []
-
     def _print_needs_updating(
         what: str, left_value: str | None, right_value: str
     ) -> None:
@@ -284,90 +344,10 @@ def verify_and_update_id3_tags(
         s.dark_grey("»").mint(right_value)
         smart_print(s.to_str())
 
-    if book.title and book_to_check.id3_title != book.title:
-        title_needs_updating = True
-        updates.append(
-            lambda: _print_needs_updating("Title", book_to_check.id3_title, book.title)
-        )
-
-    if book.author and book_to_check.id3_artist != book.author:
-        author_needs_updating = True
-        updates.append(
-            lambda: _print_needs_updating(
-                "Artist (author)", book_to_check.id3_artist, book.author
-            )
-        )
-
-    if book.title and book_to_check.id3_album != book.title:
-        title_needs_updating = True
-        updates.append(
-            lambda: _print_needs_updating(
-                "Album (title)", book_to_check.id3_album, book.title
-            )
-        )
-
-    if book.title and book_to_check.id3_sortalbum != book.title:
-        title_needs_updating = True
-        updates.append(
-            lambda: _print_needs_updating(
-                "Sort album (title)", book_to_check.id3_sortalbum, book.title
-            )
-        )
-
-    if book.author and book_to_check.id3_albumartist != book.author:
-        author_needs_updating = True
-        updates.append(
-            lambda: _print_needs_updating(
-                "Album artist (author)", book_to_check.id3_albumartist, book.author
-            )
-        )
-
-    if book.narrator and book_to_check.id3_composer != book.narrator:
-        narrator_needs_updating = True
-        updates.append(
-            lambda: _print_needs_updating(
-                "Composer (narrator)", book_to_check.id3_composer, book.narrator
-            )
-        )
-
-    if book.date and get_year_from_date(book_to_check.id3_date) != get_year_from_date(
-        book.date
-    ):
-        date_needs_updating = True
-        updates.append(
-            lambda: _print_needs_updating("Date", book_to_check.id3_date, book.date)
-        )
-
-    if book.comment and compare_trim(book_to_check.id3_comment, book.comment):
-        comment_needs_updating = True
-        updates.append(
-            lambda: _print_needs_updating(
-                "Comment", book_to_check.id3_comment, book.comment
-            )
-        )
-
-    if (
-        (cover := book.cover_art_file)
-        and cover.exists()
-        and not book_to_check.has_id3_cover
-    ):
-        cover_needs_updating = True
-        updates.append(lambda: _print_needs_updating("Cover art", None, cover.name))
-
-    needs_update = any(
-        (
-            title_needs_updating,
-            author_needs_updating,
-            narrator_needs_updating,
-            date_needs_updating,
-            comment_needs_updating,
-            cover_needs_updating,
-        )
-    )
-    if needs_update:
+    if updates := update_m4b_tags(m4b_to_check, book, book.cover_art_file):
         nl()
-        write_id3_tags_mutagen(m4b_to_check, book, book.cover_art_file)
-        [update() for update in updates]
+        for update in updates:
+            _print_needs_updating(update.what, update.current, update.expected)
         smart_print(Tinta("\nDone").mint("✓").to_str())
 
     else:
@@ -387,7 +367,7 @@ def ffprobe_file(file: Path, *, options: dict[str, Any] = {}, throw: bool = Fals
             f"Error: Cannot extract id3 tag, '{file}' does not exist"
         )
     try:
-        probe_result = ffmpeg.probe(str(file), cmd="ffprobe", **options)
+        probe_result = aio.probe(file, cmd="ffprobe", **options)
     except ffmpeg.Error as e:
         from src.lib.logger import write_err_file
 
@@ -567,6 +547,10 @@ def extract_id3_tags(
 
 
 class BaseScoreCard:
+    """Scores for each tag source that might hold a prop. Subclasses declare one int score per
+    source, named <source>_is_<prop> or <source>_contains_<prop>. These are gathered into a
+    (source, score) table once, when the subclass is defined, so scoring a book never has to
+    search the card's attributes."""
 
     def __init__(self, scorer: "MetadataScore") -> None:
 
@@ -574,27 +558,33 @@ class BaseScoreCard:
 
     props: list[TagSource] = []
 
+    _prop: str = ""
+    # sorted by score name, so that ties go to the same source as they always have
+    _table: tuple[tuple[TagSource, str], ...] = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._prop = cls.__name__.split("ScoreCard")[0].lower()
+        rep = re.compile(rf"_(is|contains)_{cls._prop}$")
+        cls._table = tuple(
+            (cast(TagSource, rep.sub("", attr)), attr)
+            for attr, default in sorted(vars(cls).items())
+            if not attr.startswith("_") and rep.search(attr) and isinstance(default, int)
+        )
+
     def reset(self):
-        for attr in dir(self):
-            if not attr.startswith("_") and isinstance(getattr(self, attr), int):
-                setattr(self, attr, 0)
+        for _source, attr in self._table:
+            setattr(self, attr, 0)
 
     @property
     def _choices(self):
-        available = list(set([p.split("_")[-1] for p in self.props]))
+        available = set([p.split("_")[-1] for p in self.props])
         return {
-            k: getattr(self._scorer._p, k)
-            for k in [
-                _k
-                for _k in dir(self._scorer._p)
-                if not _k.startswith("_") and any((p in _k for p in available))
-            ]
+            k: v
+            for k, v in sorted(vars(self._scorer._p).items())
+            if not k.startswith("_") and any((p in k for p in available))
         }
 
-    @property
-    def _prop(self):
-        return self.__class__.__name__.split("ScoreCard")[0].lower()
-
     @property
     def _value(self):
         return self._scorer._tag_matcher(self._prop, self._is_likely[0], "")
@@ -602,13 +592,8 @@ class BaseScoreCard:
     @property
     def _is_likely(self) -> tuple[TagSource, int, str | None]:
         # put all the scores in a list and return the highest score and its var name
-        rep = re.compile(rf"_(is|contains)_{self._prop}$")
         scores = [
-            (cast(TagSource, re.sub(rep, "", p)), getattr(self, p), p)
-            for p in dir(self)
-            if not p.startswith("_")
-            and p.endswith(self._prop)
-            and isinstance(getattr(self, p), int)
+            (source, getattr(self, attr), attr) for source, attr in self._table
         ]
         if not scores or all(score[1] <= 0 for score in scores):
             return "unknown", 0, None
@@ -743,6 +728,80 @@ def similarity_score(s1: str, s2: str) -> int:
     return int((percent / 100 if percent > 50 else percent / 50 - 1) * 10)
 
 
+# below this many strings, cdist's thread pool costs more than it saves
+PARALLEL_SIMILARITY_MIN = 64
+
+# below this many pairs, three cpdist calls cost more than scoring the pairs one at a time
+BATCH_SIMILARITY_MIN = 24
+
+
+def _similarity_from_scores(tsr: np.ndarray, lcs: np.ndarray, lev: np.ndarray) -> np.ndarray:
+    percent = (tsr + lcs * 100 + lev * 100) / 3
+    # astype(int) truncates toward zero, same as int() does in similarity_score
+    return (np.where(percent > 50, percent / 100, percent / 50 - 1) * 10).astype(int)
+
+
+def similarity_matrix(
+    queries: list[str], choices: list[str], workers: int = 1
+) -> np.ndarray:
+    """Scores every query against every choice in one rapidfuzz cdist call per algorithm, and
+    returns an int matrix of shape (len(queries), len(choices)) where each cell is exactly what
+    similarity_score(query, choice) would return"""
+    return _similarity_from_scores(
+        *(
+            process.cdist(queries, choices, scorer=scorer, dtype=np.float64, workers=workers)
+            for scorer in (
+                fuzz.token_sort_ratio,
+                LCSseq.normalized_similarity,
+                Levenshtein.normalized_similarity,
+            )
+        )
+    )
+
+
+def similarity_pairs(queries: list[str], choices: list[str], workers: int = 1) -> np.ndarray:
+    """Like similarity_matrix, but only scores each query against the choice at the same index,
+    in one rapidfuzz cpdist call per algorithm"""
+    return _similarity_from_scores(
+        *(
+            process.cpdist(queries, choices, scorer=scorer, dtype=np.float64, workers=workers)
+            for scorer in (
+                fuzz.token_sort_ratio,
+                LCSseq.normalized_similarity,
+                Levenshtein.normalized_similarity,
+            )
+        )
+    )
+
+
+class SimilarityScores:
+    """Scores the pairs of strings a book's scorecards compare up front, in one batch if there are
+    enough of them to make it worthwhile, so that scoring the book is a lookup. Pairs without a
+    query are skipped, since nothing compares them; pairs that weren't given up front fall back to
+    similarity_score."""
+
+    def __init__(self, pairs: list[tuple[str | None, str | None]]):
+        keys = list(dict.fromkeys((q, c) for q, c in pairs if q and c is not None))
+        if len(keys) >= BATCH_SIMILARITY_MIN:
+            queries, choices = [q for q, _ in keys], [c for _, c in keys]
+            workers = -1 if len(keys) >= PARALLEL_SIMILARITY_MIN else 1
+            scores = similarity_pairs(queries, choices, workers=workers).tolist()
+        else:
+            scores = [similarity_score(q, c) for q, c in keys]
+        self._scores: dict[tuple[str, str], int] = dict(zip(keys, scores))  # type: ignore
+
+    def __len__(self):
+        return len(self._scores)
+
+    def __contains__(self, pair: tuple[str, str]):
+        return pair in self._scores
+
+    def __call__(self, s1: str, s2: str) -> int:
+        if (score := self._scores.get((s1, s2))) is None:
+            return similarity_score(s1, s2)
+        return score
+
+
 def custom_sort(key: str, next_key: str) -> int:
     underscored = key.startswith("_")
     next_underscored = next_key.startswith("_")
@@ -835,6 +894,11 @@ class MetadataProps:
         self.author_in_comment = parse_author(self.comment, "comment", fallback="")
         self.narrator_in_comment = parse_narrator(self.comment, "comment", fallback="")
 
+        self._ar1_parsed_author = parse_author(self.artist1, "generic")
+        self._ar1_parsed_narrator = parse_narrator(self.artist1, "generic")
+        self._aar1_parsed_author = parse_author(self.albumartist1, "generic")
+        self._aar1_parsed_narrator = parse_narrator(self.albumartist1, "generic")
+
         self._t_is_partno, self._t_partno_score, self._t_is_only_part_no = (
             get_title_partno_score(
                 self.title1, self.title2, self.album1, self.sortalbum1
@@ -843,6 +907,36 @@ class MetadataProps:
         if self._t_is_partno:
             self.title_c = strip_part_number(self.title_c)
 
+        # every pair of strings compared below (or by MetadataScore), scored in one go
+        fs_name = self.fs_name_lower
+        t1, t2, tc = self.title1.lower(), self.title2.lower(), self.title_c.lower()
+        al1, al2 = self.album1.lower(), self.album2.lower()
+        sal1, sal2 = self.sortalbum1.lower(), self.sortalbum2.lower()
+        ar1, aar1 = self.artist1.lower(), self.albumartist1.lower()
+        self._similarity = SimilarityScores(
+            [
+                (t1, fs_name),
+                (t1, t2),
+                (tc, fs_name),
+                (al1, fs_name),
+                (al1, al2),
+                (sal1, fs_name),
+                (sal1, sal2),
+                (al1, t1 or None),
+                (sal1, t1 or None),
+                (al1, sal1 or None),
+                (ar1, fs_name),
+                (aar1, fs_name),
+                (ar1, aar1 or None),
+                (self._ar1_parsed_author, self._ar1_parsed_narrator),
+                (self._aar1_parsed_author, self._aar1_parsed_narrator),
+                (self.author_in_comment, self.artist1 or None),
+                (self.author_in_comment, self.albumartist1 or None),
+                (self.narrator_in_comment, self.artist1 or None),
+                (self.narrator_in_comment, self.albumartist1 or None),
+            ]
+        )
+
         # Title
         self._t1_numbers = ""
         self._t2_numbers = ""
@@ -860,11 +954,11 @@ class MetadataProps:
             self._t1_startswith_num = startswith_num_pattern.match(self.title1)
             self._t1_is_numeric = self._t1_numbers == self.title1
             self._t1_is_in_fs_name = self.title1.lower() in self.fs_name_lower
-            self._t1_similarity_to_fs_name = similarity_score(
+            self._t1_similarity_to_fs_name = self._similarity(
                 self.title1.lower(), self.fs_name_lower
             )
             self._t1_eq_t2 = self.title1 == self.title2
-            self._t1_similarity_to_t2 = similarity_score(
+            self._t1_similarity_to_t2 = self._similarity(
                 self.title1.lower(), self.title2.lower()
             )
 
@@ -882,7 +976,7 @@ class MetadataProps:
         if self.title_c:
             self._tc_is_numeric = get_numbers_in_string(self.title_c) == self.title_c
             self._tc_is_in_fs_name = self.title_c.lower() in self.fs_name_lower
-            self._tc_similarity_to_fs_name = similarity_score(
+            self._tc_similarity_to_fs_name = self._similarity(
                 self.title_c.lower(), self.fs_name_lower
             )
 
@@ -897,10 +991,10 @@ class MetadataProps:
         self._al1_is_missing = not self.album1
         if self.album1:
             self._al1_eq_al2 = self.album1 == self.album2
-            self._al1_similarity_to_fs_name = similarity_score(
+            self._al1_similarity_to_fs_name = self._similarity(
                 self.album1.lower(), self.fs_name_lower
             )
-            self._al1_similarity_to_al2 = similarity_score(
+            self._al1_similarity_to_al2 = self._similarity(
                 self.album1.lower(), self.album2.lower()
             )
             self._al1_is_in_fs_name = self.album1.lower() in self.fs_name_lower
@@ -930,10 +1024,10 @@ class MetadataProps:
         self._sal1_is_missing = not self.sortalbum1
         if self.sortalbum1:
             self._sal1_eq_sal2 = self.sortalbum1 == self.sortalbum2
-            self._sal1_similarity_to_fs_name = similarity_score(
+            self._sal1_similarity_to_fs_name = self._similarity(
                 self.sortalbum1.lower(), self.fs_name_lower
             )
-            self._sal1_similarity_to_sal2 = similarity_score(
+            self._sal1_similarity_to_sal2 = self._similarity(
                 self.sortalbum1.lower(), self.sortalbum2.lower()
             )
             self._sal1_is_in_fs_name = self.sortalbum1.lower() in self.fs_name_lower
@@ -960,19 +1054,19 @@ class MetadataProps:
         self._sal_similarity_to_t = 0
         self._sal_similarity_to_al = 0
         if all((self.title1, self.album1)):
-            self._al_similarity_to_t = similarity_score(
+            self._al_similarity_to_t = self._similarity(
                 self.album1.lower(), self.title1.lower()
             )
             self._al_similarity_to_t = self._al_similarity_to_t
 
         if all((self.title1, self.sortalbum1)):
-            self._sal_similarity_to_t = similarity_score(
+            self._sal_similarity_to_t = self._similarity(
                 self.sortalbum1.lower(), self.title1.lower()
             )
             self._sal_similarity_to_t = self._sal_similarity_to_t
 
         if all((self.album1, self.sortalbum1)):
-            self._al_similarity_to_sal = similarity_score(
+            self._al_similarity_to_sal = self._similarity(
                 self.album1.lower(), self.sortalbum1.lower()
             )
             self._al_similarity_to_sal = self._al_similarity_to_sal
@@ -987,7 +1081,7 @@ class MetadataProps:
         if self.artist1:
             self._ar1_eq_ar2 = self.artist1 == self.artist2
             self._ar1_is_in_fs_name = self.artist1.lower() in self.fs_name_lower
-            self._ar1_similarity_to_fs_name = similarity_score(
+            self._ar1_similarity_to_fs_name = self._similarity(
                 self.artist1.lower(), self.fs_name_lower
             )
             self._ar1_is_graphic_audio = has_graphic_audio(self.artist1)
@@ -1008,7 +1102,7 @@ class MetadataProps:
         if self.albumartist1:
             self._aar1_eq_aar2 = self.albumartist1 == self.albumartist2
             self._aar1_is_in_fs_name = self.albumartist1.lower() in self.fs_name_lower
-            self._aar1_similarity_to_fs_name = similarity_score(
+            self._aar1_similarity_to_fs_name = self._similarity(
                 self.albumartist1.lower(), self.fs_name_lower
             )
             self._aar1_is_graphic_audio = has_graphic_audio(self.albumartist1)
@@ -1022,22 +1116,18 @@ class MetadataProps:
         self._ar_similarity_to_aar = 0
         self._aar_similarity_to_ar = 0
         if all((self.artist1, self.albumartist1)):
-            self._ar_similarity_to_aar = similarity_score(
+            self._ar_similarity_to_aar = self._similarity(
                 self.artist1.lower(), self.albumartist1.lower()
             )
             self._ar_similarity_to_aar = self._ar_similarity_to_aar
 
-        self._ar1_parsed_author = parse_author(self.artist1, "generic")
-        self._ar1_parsed_narrator = parse_narrator(self.artist1, "generic")
         self._ar1_parsed_author_similarity_to_narrator = (
-            similarity_score(self._ar1_parsed_author, self._ar1_parsed_narrator)
+            self._similarity(self._ar1_parsed_author, self._ar1_parsed_narrator)
             if self._ar1_parsed_author
             else 0
         )
-        self._aar1_parsed_author = parse_author(self.albumartist1, "generic")
-        self._aar1_parsed_narrator = parse_narrator(self.albumartist1, "generic")
         self._aar1_parsed_author_similarity_to_narrator = (
-            similarity_score(self._aar1_parsed_author, self._aar1_parsed_narrator)
+            self._similarity(self._aar1_parsed_author, self._aar1_parsed_narrator)
             if self._aar1_parsed_author
             else 0
         )
@@ -1077,7 +1167,30 @@ class MetadataProps:
                     self.narrator_in_comment == self.albumartist1
                 )
 
-        str(self)
+        # the value each tag source resolves to, looked up by the score cards' winning source
+        self._sources: dict[str, str] = {
+            "title": self.title1,
+            "album": self.album1,
+            "sortalbum": self.sortalbum1,
+            "artist": self.artist1,
+            "albumartist": self.albumartist1,
+            "common_title": self.title_c,
+            "common_album": self.album_c,
+            "common_sortalbum": self.sortalbum_c,
+            "common_artist": self.artist_c,
+            "common_albumartist": self.albumartist_c,
+            "date": self.date,
+            "year": self.year,
+            "comment": self.comment,
+            "composer": self.composer,
+            "fs": self.fs_year,
+        }
+
+    def source(self, tag: TagSource, prop: str) -> str:
+        """The value of prop according to tag"""
+        if tag == "comment" and prop in ("author", "narrator"):
+            return getattr(self, f"{prop}_in_comment")
+        return self._sources[tag]
 
     def table(self):
         data = [
@@ -1140,6 +1253,13 @@ class MetadataScore:
     def __repr__(self):
         return self.__str__()
 
+    def breakdown(self) -> dict[str, dict[str, int]]:
+        """Every card's scores, by prop and then by score name"""
+        return {
+            card._prop: {attr: getattr(card, attr) for _source, attr in card._table}
+            for card in (self.author, self.narrator, self.title, self.date)
+        }
+
     def get(
         self,
         key: ScoredProp,
@@ -1148,27 +1268,15 @@ class MetadataScore:
         fallback: str = "",
     ) -> str:
 
-        getattr(self, f"calc_{key}_scores")()
+        # scores are only calculated once, determine_* returns what it found the first time
+        getattr(self, f"determine_{key}")()
         if from_tag is None:
-            from_tag, _score, _prop = getattr(self, key).is_likely
+            from_tag, _score, _prop = getattr(self, key)._is_likely
 
         if from_tag == "unknown":
             return fallback
 
-        val: str = ""
-        if from_tag == "comment":
-            val = getattr(self._p, f"{key}_in_comment")
-        elif common_str_pattern.match(from_tag):
-            val = getattr(self._p, common_str_pattern.sub("", from_tag) + "_c")
-        elif from_tag == "fs":
-            if key == "date":
-                val = self._p.fs_year
-        else:
-            try:
-                val = getattr(self._p, f"{from_tag}1")
-            except AttributeError:
-                val = getattr(self._p, from_tag)
-
+        val = self._p.source(from_tag, key)
         val = clean_string(val if val else fallback)
         match key:
             case "author":
@@ -1181,21 +1289,9 @@ class MetadataScore:
         if tag == "unknown":
             return fallback
 
-        if common_str_pattern.match(tag):
-            return getattr(self._p, common_str_pattern.sub("", tag) + "_c")
-
-        if tag == "comment":
-            return getattr(self._p, f"{prop}_in_comment")
-
-        if tag == "fs":
-            try:
-                val = getattr(self._p, f"fs_{tag}")
-            except AttributeError:
-                ...
-        try:
-            val = getattr(self._p, f"{tag}1")
-        except AttributeError:
-            val = getattr(self._p, tag)
+        val = self._p.source(cast(TagSource, tag), prop)
+        if common_str_pattern.match(tag) or tag == "comment":
+            return val
 
         if prop == "title":
             self.determine_author()
@@ -1386,7 +1482,7 @@ class MetadataScore:
             artist_is_author += self._p._ar1_parsed_author_similarity_to_narrator
 
             if self._p.author_in_comment:
-                artist_is_author += similarity_score(
+                artist_is_author += self._p._similarity(
                     self._p.author_in_comment, self._p.artist1
                 )
             if self._p.narrator_in_comment:
@@ -1414,7 +1510,7 @@ class MetadataScore:
             albumartist_is_author += self._p._aar1_parsed_author_similarity_to_narrator
 
             if self._p.author_in_comment:
-                albumartist_is_author += similarity_score(
+                albumartist_is_author += self._p._similarity(
                     self._p.author_in_comment, self._p.albumartist1
                 )
 
@@ -1502,7 +1598,7 @@ class MetadataScore:
                 artist_is_narrator -= self._p._ar1_parsed_author_similarity_to_narrator
 
                 if self._p.narrator_in_comment:
-                    artist_is_narrator += similarity_score(
+                    artist_is_narrator += self._p._similarity(
                         self._p.narrator_in_comment, self._p.artist1
                     )
                 if self._p.author_in_comment:
@@ -1538,7 +1634,7 @@ class MetadataScore:
                 )
 
                 if self._p.narrator_in_comment:
-                    albumartist_is_narrator += similarity_score(
+                    albumartist_is_narrator += self._p._similarity(
                         self._p.narrator_in_comment, self._p.albumartist1
                     )
 
@@ -1632,8 +1728,6 @@ def extract_metadata(book: "Audiobook", quiet: bool = False) -> "Audiobook":
             highlight_color=PATH_COLOR,
         )
 
-    li = print_list_item if not quiet else lambda *_: None
-
     # read id3 tags of audio file
     sample_audio1_tags = extract_id3_tags(book.sample_audio1)
     sample_audio2_tags = extract_id3_tags(
@@ -1659,11 +1753,7 @@ def extract_metadata(book: "Audiobook", quiet: bool = False) -> "Audiobook":
     book.narrator = id3_score.determine_narrator(book.fs_narrator)
     book.albumartist = id3_score.determine_albumartist()
 
-    li(f"Title: {book.title}")
-    li(f"Author: {book.author}")
     if book.narrator:
-        li(f"Narrator: {book.narrator}")
-
         # TODO: Author/Narrator and "Book name by Author" in folder name
 
         # If comment does not have narrator, but narrator is not empty,
@@ -1675,20 +1765,30 @@ def extract_metadata(book: "Audiobook", quiet: bool = False) -> "Audiobook":
         book.composer = book.narrator
 
     book.date = id3_score.determine_date(book.fs_year)
-    if book.date:
-        li(f"Date: {book.date}")
     # extract 4 digits from date
     book.year = get_year_from_date(book.date)
+    book.scores = id3_score.breakdown()
 
-    # convert bitrate and sample rate to friendly to kbit/s, rounding to nearest tenths, e.g. 44.1 kHz
-    li(f"Quality: {book.bitrate_friendly} @ {book.samplerate_friendly}")
-    li(f"Duration: {book.duration('inbox', 'human')}")
-    if not book.has_id3_cover:
-        li(f"No cover art")
+    if not quiet:
+        print_book_metadata(book)
 
     return book
 
 
+def print_book_metadata(book: "Audiobook") -> None:
+    print_list_item(f"Title: {book.title}")
+    print_list_item(f"Author: {book.author}")
+    if book.narrator:
+        print_list_item(f"Narrator: {book.narrator}")
+    if book.date:
+        print_list_item(f"Date: {book.date}")
+    # convert bitrate and sample rate to friendly to kbit/s, rounding to nearest tenths, e.g. 44.1 kHz
+    print_list_item(f"Quality: {book.bitrate_friendly} @ {book.samplerate_friendly}")
+    print_list_item(f"Duration: {book.duration('inbox', 'human')}")
+    if not book.has_id3_cover:
+        print_list_item(f"No cover art")
+
+
 def map_kid3_keys(in_dict: dict[str, Any]):
     """Renames keys from kid3 format to our format:
 
@@ -1,4 +1,7 @@
+import threading
 import time
+from collections import deque
+from collections.abc import Callable
 from functools import cached_property
 from pathlib import Path
 from typing import Literal
@@ -8,11 +11,14 @@ import cachetools
 from src.lib.audiobook import Audiobook
 from src.lib.formatters import human_elapsed_time, human_size
 from src.lib.fs_utils import (
+    BookLayout,
     find_base_dirs_with_audio_files,
     get_audio_size,
+    get_book_layout,
     hash_path_audio_files,
     last_updated_audio_files_at,
     name_matches,
+    was_recently_modified,
 )
 from src.lib.parsers import is_maybe_multi_book_or_series
 from src.lib.typing import DirName
@@ -62,15 +68,19 @@ class InboxItem:
 
         path = get_path(book)
 
+        self._lock = threading.RLock()
         self.is_dir = path.is_dir()
         self.is_file = path.is_file()
 
         self._prev_hash = None
         self._last_updated: float | None = None
+        self._on_change: Callable[["InboxItem", str | None], None] | None = None
         self._curr_hash = hash_path_audio_files(path)
         self._hash_changed: float = time.time()
         self.key = str(path.relative_to(cfg.inbox_dir))
-        self.size = get_audio_size(path) if path.exists() else 0
+        self._size: int | None = None
+        self._size_samples: deque[tuple[float, int]] = deque(maxlen=5)
+        self._dispatched_hash: str | None = None
         self.status: InboxItemStatus = "new"
         self.failed_reason: str = ""
 
@@ -109,11 +119,36 @@ class InboxItem:
             self._hash_changed = time.time()
             return ""
         new_hash = hash_path_audio_files(self.path)
-        if new_hash != self._curr_hash:
-            self._prev_hash = self._curr_hash
-            self._curr_hash = new_hash
-            self._hash_changed = time.time()
-        return self._curr_hash
+        with self._lock:
+            old_hash = self._curr_hash
+            if new_hash != old_hash:
+                self._prev_hash = old_hash
+                self._curr_hash = new_hash
+                self._hash_changed = time.time()
+                self._size = None
+        # notify outside of the lock, the observer (InboxState) takes its own lock
+        if new_hash != old_hash:
+            self._notify(old_hash)
+        return new_hash
+
+    @property
+    def layout(self) -> BookLayout:
+        """The item's audio file layout, shared with any Audiobook made from it and only worked out
+        again when the item's hash changes"""
+        return get_book_layout(self.path, self.curr_hash)
+
+    @property
+    def size(self) -> int:
+        """Total size of the item's audio files, computed on first use and again only after the hash changes"""
+        with self._lock:
+            if self._size is None:
+                self._size = get_audio_size(self.path) if self.path.exists() else 0
+            return self._size
+
+    @property
+    def curr_hash(self) -> str:
+        """The hash as of the last time it was checked, without walking the item's folder again"""
+        return self._curr_hash or self.hash
 
     @property
     def prev_hash(self):
@@ -135,20 +170,81 @@ class InboxItem:
     def hash_age(self):
         return time.time() - self.hash_changed
 
+    def poll(self):
+        """Samples the item's audio size, so we can tell whether it is still being copied into the inbox"""
+        if self.is_gone:
+            return
+        self.hash
+        with self._lock:
+            self._size_samples.append((time.time(), self.size))
+
+    @property
+    def growth_rate(self) -> float:
+        """Bytes per second this item grew by across its recent polls"""
+        with self._lock:
+            if len(self._size_samples) < 2:
+                return 0
+            (t0, s0), (t1, s1) = self._size_samples[0], self._size_samples[-1]
+        return max(s1 - s0, 0) / (t1 - t0) if t1 > t0 else 0
+
+    @property
+    def is_size_stable(self):
+        with self._lock:
+            samples = list(self._size_samples)
+        return len(samples) < 2 or samples[-1][1] == samples[-2][1]
+
+    @property
+    def is_settled(self):
+        """True if the item's size didn't change between its last two polls, and none of its files were modified within WAIT_TIME"""
+        if self.is_gone:
+            return False
+        return self.is_size_stable and not was_recently_modified(self.path)
+
+    @property
+    def settles_in(self) -> float | None:
+        """Estimated seconds until this item settles, or None if it is still growing"""
+        from src.lib.config import cfg
+
+        if not self.is_size_stable and self.growth_rate:
+            return None
+        return max(cfg.WAIT_TIME - (time.time() - self.last_updated), 0)
+
+    @property
+    def is_ready(self):
+        """True if the item has settled and hasn't been dispatched for processing since it last changed"""
+        return self.is_settled and self._dispatched_hash != self._curr_hash
+
+    def set_dispatched(self):
+        with self._lock:
+            self._dispatched_hash = self._curr_hash
+
+    def clear_dispatched(self):
+        """Makes the item ready again, e.g. if it couldn't be processed yet and should be retried"""
+        with self._lock:
+            self._dispatched_hash = None
+
     def _set(
         self,
         status: InboxItemStatus,
         reason: str | None = None,
         last_updated: float | None = None,
     ):
-        if self.is_gone:
-            return
-        self.status = status
-        if reason:
-            self.failed_reason = reason
-        if last_updated:
-            self._last_updated = last_updated
-        self.hash
+        with self._lock:
+            is_gone = self.is_gone
+            if not is_gone:
+                self.status = status
+                if reason:
+                    self.failed_reason = reason
+                if last_updated:
+                    self._last_updated = last_updated
+        if is_gone or status == "gone":
+            self._notify(self._curr_hash)
+        if not is_gone:
+            self.hash
+
+    def _notify(self, old_hash: str | None):
+        if self._on_change:
+            self._on_change(self, old_hash)
 
     def set_failed(self, reason: str, last_updated: float | None = None):
         from src.lib.inbox_state import _sync_failed_to_env
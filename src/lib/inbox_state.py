@@ -6,6 +6,7 @@ from functools import wraps
 from pathlib import Path
 from typing import Any, cast, TypeVar
 
+from src.lib import aio
 from src.lib.audiobook import Audiobook
 from src.lib.formatters import friendly_short_date
 from src.lib.fs_utils import (
@@ -67,6 +68,9 @@ class InboxState(Hasher):
 
         super().__init__(cfg.inbox_dir)
         self._items: dict[str, InboxItem] = {}
+        # secondary indexes, map an item's hash or path to its key in self._items
+        self._keys_by_hash: dict[str, str] = {}
+        self._keys_by_path: dict[str, str] = {}
         self.ready = False
         self.loop_counter = 0
         self.banner_printed = False
@@ -82,11 +86,12 @@ class InboxState(Hasher):
     ):
         item = get_item(key_path_or_book)
 
-        self._items[item.key] = item
-        if last_updated:
-            self._items[item.key]._last_updated = last_updated
-        if status:
-            self._items[item.key].status = status
+        with self._lock:
+            self._track(item.key, item)
+            if last_updated:
+                self._items[item.key]._last_updated = last_updated
+            if status:
+                self._items[item.key].status = status
 
     @requires_scan
     def get(
@@ -95,22 +100,67 @@ class InboxState(Hasher):
         if not key_path_hash_or_book:
             return None
         key = get_key(key_path_hash_or_book)
-        simple = self._items.get(key, None)
-        if simple:
-            return simple
-        return next(
-            (
-                item
-                for item in self._items.values()
-                if key in [item.key, item.hash, item.path]
-            ),
-            None,
-        )
+        with self._lock:
+            if simple := self._items.get(key, None):
+                return simple
+            if indexed_key := (
+                self._keys_by_path.get(key) or self._keys_by_hash.get(key)
+            ):
+                return self._items.get(indexed_key, None)
+            return None
+
+    def known_hash(self, path: Path) -> str | None:
+        """The hash of the item at path as of the last time it was checked, or None if it isn't
+        tracked. Never scans the inbox or hashes anything, so it's safe to call during a scan."""
+        with self._lock:
+            key = self._keys_by_path.get(str(path))
+            item = self._items.get(key) if key else None
+        return item.curr_hash if item else None
 
     def rm(self, key_path_book_or_hash: str | Path | Audiobook):
-        key = get_key(key_path_book_or_hash)
-        if key or (item := self.get(str(key_path_book_or_hash))) and (key := item.key):
-            return self._items.pop(key, None)
+        with self._lock:
+            key = get_key(key_path_book_or_hash)
+            if key in self._items:
+                return self._untrack(key)
+            if item := self.get(key_path_book_or_hash):
+                return self._untrack(self._keys_by_path.get(item.key, item.key))
+
+    def _track(self, key: str, item: InboxItem):
+        """Adds an item to the state and its secondary indexes. Must be called with the lock held."""
+        if (existing := self._items.get(key)) and existing is not item:
+            self._untrack(key)
+        self._items[key] = item
+        self._keys_by_path[item.key] = key
+        self._keys_by_path[str(item.path)] = key
+        item._on_change = self._reindex
+        self._reindex(item, None)
+
+    def _untrack(self, key: str) -> InboxItem | None:
+        """Removes an item from the state and its secondary indexes. Must be called with the lock held."""
+        item = self._items.pop(key, None)
+        if not item:
+            return None
+        item._on_change = None
+        for k in [item.key, str(item.path)]:
+            if self._keys_by_path.get(k) == key:
+                self._keys_by_path.pop(k, None)
+        if item._curr_hash and self._keys_by_hash.get(item._curr_hash) == key:
+            self._keys_by_hash.pop(item._curr_hash, None)
+        return item
+
+    def _reindex(self, item: InboxItem, old_hash: str | None):
+        """Called by an item when its hash or status changes, keeps the hash index current
+        so that lookups by hash never need to re-hash anything on disk."""
+        with self._lock:
+            key = self._keys_by_path.get(item.key)
+            if not key or self._items.get(key) is not item:
+                return
+            if old_hash and self._keys_by_hash.get(old_hash) == key:
+                self._keys_by_hash.pop(old_hash, None)
+            if item._curr_hash and item.status != "gone":
+                self._keys_by_hash[item._curr_hash] = key
+            elif item._curr_hash and self._keys_by_hash.get(item._curr_hash) == key:
+                self._keys_by_hash.pop(item._curr_hash, None)
 
     def scan(
         self,
@@ -118,6 +168,21 @@ class InboxState(Hasher):
         recheck_failed: bool = False,
         skip_failed_sync: bool = False,
         set_ready: bool = False,
+    ):
+        with self._lock:
+            self._scan(
+                *paths,
+                recheck_failed=recheck_failed,
+                skip_failed_sync=skip_failed_sync,
+                set_ready=set_ready,
+            )
+
+    def _scan(
+        self,
+        *paths: str | Path,
+        recheck_failed: bool = False,
+        skip_failed_sync: bool = False,
+        set_ready: bool = False,
     ):
         from src.lib.config import cfg
 
@@ -141,7 +206,12 @@ class InboxState(Hasher):
         else:
             _paths = find_books_in_inbox()
 
-        new_items = {p.name: InboxItem(p) for p in _paths}
+        # only build items for paths we aren't already tracking, so that the cost of a scan
+        # scales with the number of changes in the inbox rather than its size
+        found_keys = {p.name: p for p in _paths}
+        new_items = {
+            k: InboxItem(p) for k, p in found_keys.items() if k not in self._items
+        }
 
         # smart_print(f"scan calls: {SCAN_CALLS}", SCAN_CALLS)
         # try:
@@ -151,10 +221,10 @@ class InboxState(Hasher):
         # except:
         #     pass
 
-        gone_keys = set(self._items.keys()) - set(new_items.keys())
-        for k, v in new_items.items():
-            if k not in self._items:
-                self._items[k] = v
+        gone_keys = set(self._items.keys()) - set(found_keys.keys())
+        for k in found_keys:
+            if v := new_items.get(k):
+                self._track(k, v)
             elif recheck_failed and (item := self._items[k]):
                 if item.status == "failed" and (
                     item.did_change or item.hash_age < cfg.SLEEP_TIME
@@ -176,8 +246,19 @@ class InboxState(Hasher):
         self.stale = False
 
     def flush(self):
-        super().flush()
-        self._items = {}
+        with self._lock:
+            super().flush()
+            for item in getattr(self, "_items", {}).values():
+                item._on_change = None
+            self._items = {}
+            self._keys_by_hash = {}
+            self._keys_by_path = {}
+
+    def _snapshot(self) -> list[tuple[str, InboxItem]]:
+        """Returns a point-in-time copy of the tracked items, so that callers can iterate
+        without holding the lock while other threads add, remove or update items."""
+        with self._lock:
+            return list(self._items.items())
 
     @property
     def match_filter(self):
@@ -215,9 +296,10 @@ class InboxState(Hasher):
         return self
 
     def clear_failed(self):
-        for item in self.failed_books.values():
-            item.set_ok()
-        _sync_failed_to_env()
+        with self._lock:
+            for item in self.failed_books.values():
+                item.set_ok()
+            _sync_failed_to_env()
 
     def reset_loop_counter(self, start_at: int = 0):
         self.loop_counter = start_at
@@ -248,7 +330,7 @@ class InboxState(Hasher):
 
     @property
     def items(self):
-        return self._items
+        return dict(self._snapshot())
 
     @property
     def num_audio_files_deep(self):
@@ -262,7 +344,7 @@ class InboxState(Hasher):
     def standalone_books(self):
         return {
             k: v
-            for k, v in self._items.items()
+            for k, v in self._snapshot()
             if v.is_file and v.status in ("ok", "new", "needs_retry")
         }
 
@@ -281,7 +363,7 @@ class InboxState(Hasher):
     def series_items_for_key(self, key: str):
         return [
             v
-            for _k, v in self._items.items()
+            for _k, v in self._snapshot()
             if v.series_key == key
             or Path(v.key).parts[0] == key
             and v.is_maybe_series_book
@@ -297,7 +379,7 @@ class InboxState(Hasher):
 
     @property
     def filtered_books(self):
-        return {k: v for k, v in self._items.items() if v.is_filtered}
+        return {k: v for k, v in self._snapshot() if v.is_filtered}
 
     @property
     def num_filtered(self):
@@ -308,7 +390,7 @@ class InboxState(Hasher):
         return filter_series_parents(
             {
                 k: v
-                for k, v in self._items.items()
+                for k, v in self._snapshot()
                 if not v.is_filtered and not v.status in ["gone"]
             }
         )
@@ -322,7 +404,7 @@ class InboxState(Hasher):
         return filter_series_parents(
             {
                 k: v
-                for k, v in self._items.items()
+                for k, v in self._snapshot()
                 if v.status in ["ok", "new", "needs_retry"]
             }
         )
@@ -339,13 +421,32 @@ class InboxState(Hasher):
     def num_matched_ok(self):
         return len(self.matched_ok_books)
 
+    @property
+    def ready_books(self):
+        """Matched books that have settled and are waiting to be processed"""
+        return {k: v for k, v in self.matched_ok_books.items() if v.is_ready}
+
+    @property
+    def settling_books(self):
+        """Matched books that are still being copied into the inbox"""
+        return {k: v for k, v in self.matched_ok_books.items() if not v.is_settled}
+
+    def poll_books(self):
+        from src.lib.speculative import SpeculativeEncoder
+
+        speculate = SpeculativeEncoder.is_enabled()
+        for item in self.matched_ok_books.values():
+            item.poll()
+            if speculate and not item.is_settled:
+                SpeculativeEncoder().speculate(item)
+
     @property
     def has_failed_books(self):
-        return any(v.status in ["failed", "needs_retry"] for v in self._items.values())
+        return any(v.status in ["failed", "needs_retry"] for _k, v in self._snapshot())
 
     @property
     def failed_books(self):
-        return {k: v for k, v in self._items.items() if v.status == "failed"}
+        return {k: v for k, v in self._snapshot() if v.status == "failed"}
 
     @property
     def num_failed(self):
@@ -354,7 +455,7 @@ class InboxState(Hasher):
     @property
     def all_books_failed(self):
         haystack = (
-            self._items.values()
+            [v for _k, v in self._snapshot()]
             if not self.match_filter
             else self.matched_books.values()
         )
@@ -362,13 +463,15 @@ class InboxState(Hasher):
 
     @requires_scan
     def start(self):
-        if len(self._hashes):
-            self._last_run_start = self._hashes[0]
+        with self._lock:
+            if len(self._hashes):
+                self._last_run_start = self._hashes[0]
 
     @scanner
     def done(self):
-        if len(self._hashes):
-            self._last_run_end = self._hashes[0]
+        with self._lock:
+            if len(self._hashes):
+                self._last_run_end = self._hashes[0]
         self.banner_printed = False
         # print_debug("Set banner_printed to False")
 
@@ -399,8 +502,14 @@ class InboxState(Hasher):
             self.prev_hash if self.hash_age < cfg.SLEEP_TIME else self.curr_hash
         )
         _banner_printed = False
-        # rec_mod = self.dir_was_recently_modified
-        while self.dir_was_recently_modified:
+
+        def done_waiting():
+            nonlocal waited_count, _banner_printed
+            # only wait on the inbox while nothing in it is ready - books that have settled
+            # are processed right away, even if other books are still being copied in
+            self.poll_books()
+            if not self.dir_was_recently_modified or self.ready_books:
+                return True
             print_debug(
                 f"{en.DEBUG_WAITING_FOR_INBOX} {waited_count + 1} ({before_modified_hash} → {self.curr_hash})"
             )
@@ -416,10 +525,14 @@ class InboxState(Hasher):
                 _banner_printed = True
 
             waited_count += 1
-            time.sleep(0.5)
+            return False
+
+        aio.poll_until(done_waiting, interval=0.5)
 
         needs_scan = (
-            self.changed_since_last_run_ended or self.changed_since_last_run_started
+            self.changed_since_last_run_ended
+            or self.changed_since_last_run_started
+            or bool(self.ready_books)
         )
 
         # print_debug(
@@ -475,14 +588,14 @@ class InboxState(Hasher):
 
     def to_dict(self, refresh_hashes=False):
         return {
-            path: item.to_dict(refresh_hashes) for path, item in self._items.items()
+            path: item.to_dict(refresh_hashes) for path, item in self._snapshot()
         }
 
     @property
     def fixed_books(self):
         return {
             k: v
-            for k, v in self._items.items()
+            for k, v in self._snapshot()
             if v.status == "needs_retry" and v.failed_reason
         }
 
@@ -492,49 +605,53 @@ class InboxState(Hasher):
         reason: str,
         last_updated: float | None = None,
     ):
-        if not self.get(key_path_or_book):
-            self.set(key_path_or_book)
-
-        if item := self.get(key_path_or_book):
-            item.set_failed(reason)
-            if last_updated is not None:
-                item._last_updated = last_updated
-            _sync_failed_to_env()
-        else:
-            print_debug(f"Item {key_path_or_book} not found in inbox")
+        with self._lock:
+            if not self.get(key_path_or_book):
+                self.set(key_path_or_book)
+
+            if item := self.get(key_path_or_book):
+                item.set_failed(reason)
+                if last_updated is not None:
+                    item._last_updated = last_updated
+                _sync_failed_to_env()
+            else:
+                print_debug(f"Item {key_path_or_book} not found in inbox")
 
     def set_needs_retry(self, key_path_or_book: str | Path | Audiobook):
-        if not self.get(key_path_or_book):
-            self.set(key_path_or_book)
+        with self._lock:
+            if not self.get(key_path_or_book):
+                self.set(key_path_or_book)
 
-        if item := self.get(key_path_or_book):
-            item.set_needs_retry()
-            _sync_failed_to_env()
-        else:
-            print_debug(f"Item {key_path_or_book} not found in inbox")
+            if item := self.get(key_path_or_book):
+                item.set_needs_retry()
+                _sync_failed_to_env()
+            else:
+                print_debug(f"Item {key_path_or_book} not found in inbox")
 
     def set_ok(self, key_path_or_book: str | Path | Audiobook):
-        if not self.get(key_path_or_book):
-            self.set(key_path_or_book)
+        with self._lock:
+            if not self.get(key_path_or_book):
+                self.set(key_path_or_book)
 
-        if item := self.get(key_path_or_book):
-            item.set_ok()
-            _sync_failed_to_env()
-        else:
-            print_debug(f"Item {key_path_or_book} not found in inbox")
+            if item := self.get(key_path_or_book):
+                item.set_ok()
+                _sync_failed_to_env()
+            else:
+                print_debug(f"Item {key_path_or_book} not found in inbox")
 
     def set_gone(self, key_path_or_book: str | Path | Audiobook):
-        if not self.get(key_path_or_book):
-            self.set(key_path_or_book)
+        with self._lock:
+            if not self.get(key_path_or_book):
+                self.set(key_path_or_book)
 
-        if item := self.get(key_path_or_book):
-            item.set_gone()
-            _sync_failed_to_env()
-        else:
-            print_debug(f"Item {key_path_or_book} not found in inbox")
+            if item := self.get(key_path_or_book):
+                item.set_gone()
+                _sync_failed_to_env()
+            else:
+                print_debug(f"Item {key_path_or_book} not found in inbox")
 
     def __iter__(self):
-        return iter(self._items.values())
+        return iter([v for _k, v in self._snapshot()])
 
     def __len__(self):
         return len(self._items)
@@ -550,9 +667,11 @@ class InboxState(Hasher):
 
 
 def _sync_failed_to_env():
-    os.environ["FAILED_BOOKS"] = json.dumps(
-        {k: v.last_updated for k, v in InboxState().failed_books.items()}
-    )
+    inbox = InboxState()
+    with inbox._lock:
+        os.environ["FAILED_BOOKS"] = json.dumps(
+            {k: v.last_updated for k, v in inbox.failed_books.items()}
+        )
 
 
 def _sync_failed_from_env():
@@ -0,0 +1,109 @@
+import os
+import threading
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Literal
+
+from src.lib.typing import DropCache
+
+HAS_FADVISE = hasattr(os, "posix_fadvise")
+HAS_SYNC_FILE_RANGE = hasattr(os, "sync_file_range")
+
+_lock = threading.Lock()
+_stats = {
+    "willneed_files": 0,
+    "willneed_bytes": 0,
+    "dontneed_files": 0,
+    "dontneed_bytes": 0,
+    "writeback_files": 0,
+    "writeback_bytes": 0,
+}
+
+
+def is_enabled():
+    from src.lib.config import cfg
+
+    return HAS_FADVISE and bool(cfg.IO_HINTS)
+
+
+def _files(paths: Iterable[Path]) -> Iterable[Path]:
+    for p in paths:
+        if p.is_dir():
+            yield from sorted(f for f in p.rglob("*") if f.is_file())
+        elif p.is_file():
+            yield p
+
+
+def _advise(f: Path, advice: int, writeback: bool = False) -> int:
+    """Gives the kernel a hint about the whole file, returning its size, or 0 if it couldn't. With
+    writeback, first asks the kernel to start writing the file's dirty pages out, but doesn't wait
+    for it."""
+    try:
+        fd = os.open(f, os.O_RDONLY)
+    except OSError:
+        return 0
+    try:
+        if writeback and HAS_SYNC_FILE_RANGE:
+            os.sync_file_range(fd, 0, 0, os.SYNC_FILE_RANGE_WRITE)
+        os.posix_fadvise(fd, 0, 0, advice)
+        return os.fstat(fd).st_size
+    except OSError:
+        return 0
+    finally:
+        os.close(fd)
+
+
+def _count(kind: Literal["willneed", "dontneed", "writeback"], files: int, size: int):
+    with _lock:
+        _stats[f"{kind}_files"] += files
+        _stats[f"{kind}_bytes"] += size
+
+
+def will_need(paths: Iterable[Path], limit: int | None = None):
+    """Asks the kernel to start reading the files into the page cache in the background, e.g. for
+    the next book while the current one converts. Stops once limit bytes have been hinted."""
+    if not is_enabled():
+        return
+    files = hinted = 0
+    for f in _files(paths):
+        if limit is not None and hinted >= limit:
+            break
+        if size := _advise(f, os.POSIX_FADV_WILLNEED):
+            files += 1
+            hinted += size
+    _count("willneed", files, hinted)
+
+
+def dont_need(paths: Iterable[Path], written: bool = False):
+    """Tells the kernel we're done with the files, so they don't push hotter data out of the page
+    cache. The kernel can't drop the dirty pages of files that were just written, so for those we
+    only start writeback and don't wait for it, so copies aren't slowed down by a flush. They're
+    counted as written back rather than dropped, since most of their pages are still cached."""
+    if not is_enabled():
+        return
+    files = hinted = 0
+    for f in _files(paths):
+        if size := _advise(f, os.POSIX_FADV_DONTNEED, writeback=written):
+            files += 1
+            hinted += size
+    _count("writeback" if written else "dontneed", files, hinted)
+
+
+def drop_after_copy(src: Path, dst: Path, drop_cache: DropCache):
+    if not drop_cache:
+        return
+    if drop_cache in ("src", "both"):
+        dont_need([src])
+    if drop_cache in ("dst", "both"):
+        dont_need([dst], written=True)
+
+
+def stats() -> dict[str, int]:
+    with _lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _lock:
+        for k in _stats:
+            _stats[k] = 0
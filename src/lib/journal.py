@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, TYPE_CHECKING
+
+from src.lib.config import cfg
+from src.lib.fs_utils import hash_path_audio_files
+from src.lib.leases import get_leases
+from src.lib.typing import JournalStage
+
+if TYPE_CHECKING:
+    from src.lib.audiobook import Audiobook
+
+
+def journal_dir() -> Path:
+    return cfg.working_dir / "journal"
+
+
+def journal_file(key: str) -> Path:
+    return journal_dir() / f"{hashlib.md5(key.encode()).hexdigest()}.json"
+
+
+def write_durably(path: Path, content: str):
+    """Writes content to path so that after a crash, path has either the old or the new content"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    dir_fd = os.open(path.parent, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+class BookJournal:
+    """Records which of a book's stages have completed, along with the hash of the book's inbox
+    files when it started. If auto-m4b is restarted mid-book, stages recorded against the same hash
+    are skipped, and Config.clean leaves the book's merge and build folders alone so they can be
+    picked up where they were left."""
+
+    def __init__(self, key: str, data: dict[str, Any]):
+        self.key = key
+        self._data = data
+
+    def __repr__(self):
+        return f"BookJournal({self.key} -- {self._data.get('hash')} -- {list(self.stages)})"
+
+    @classmethod
+    def read(cls, key: str) -> "BookJournal | None":
+        try:
+            return cls(key, json.loads(journal_file(key).read_text()))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    @classmethod
+    def open(cls, book: "Audiobook") -> "BookJournal":
+        """Opens the book's journal, starting a new one if the book changed since it was written"""
+        inbox_hash = hash_path_audio_files(book.inbox_dir)
+        journal = cls.read(book.key)
+        if journal and journal.hash == inbox_hash:
+            return journal
+        journal = cls(
+            book.key,
+            {
+                "key": book.key,
+                "hash": inbox_hash,
+                "inbox_dir": str(book.inbox_dir),
+                "work_dirs": [str(book.merge_dir), str(book.build_dir)],
+                "stages": {},
+            },
+        )
+        journal.flush()
+        return journal
+
+    @property
+    def hash(self) -> str:
+        return self._data.get("hash", "")
+
+    @property
+    def stages(self) -> dict[str, Any]:
+        return self._data.setdefault("stages", {})
+
+    @property
+    def work_dirs(self) -> list[Path]:
+        return [Path(d) for d in self._data.get("work_dirs", [])]
+
+    @property
+    def is_resumable(self):
+        inbox_dir = Path(self._data.get("inbox_dir", ""))
+        return inbox_dir.exists() and hash_path_audio_files(inbox_dir) == self.hash
+
+    def done(self, stage: JournalStage) -> bool:
+        return stage in self.stages
+
+    def get(self, stage: JournalStage, k: str, default: Any = None) -> Any:
+        return self.stages.get(stage, {}).get(k, default)
+
+    def mark(self, stage: JournalStage, **data: Any):
+        self.stages[stage] = {"at": time.time(), **data}
+        self.flush()
+
+    def flush(self):
+        write_durably(journal_file(self.key), json.dumps(self._data, indent=2))
+
+    def discard(self):
+        journal_file(self.key).unlink(missing_ok=True)
+
+
+def resumable_dirs() -> list[Path]:
+    """Work dirs of books that can be resumed, or that another instance sharing the working folder
+    holds a lease on and is still working on. Removes the journals of any others."""
+    busy = get_leases().held_by_others()
+    keep = []
+    for f in journal_dir().glob("*.json") if journal_dir().exists() else []:
+        try:
+            data = json.loads(f.read_text())
+        except json.JSONDecodeError:
+            f.unlink(missing_ok=True)
+            continue
+        journal = BookJournal(data.get("key", ""), data)
+        if journal.key in busy or journal.is_resumable:
+            keep.extend(journal.work_dirs)
+        else:
+            f.unlink(missing_ok=True)
+    return keep
+
+
+def mark_stage(book: "Audiobook", stage: JournalStage, **data: Any):
+    """Records that the book finished a stage, if it has a journal"""
+    if journal := BookJournal.read(book.key):
+        journal.mark(stage, **data)
+
+
+def discard_journal(book: "Audiobook"):
+    journal_file(book.key).unlink(missing_ok=True)
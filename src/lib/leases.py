@@ -0,0 +1,219 @@
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any
+
+from src.lib.term import print_debug
+
+# a lease that's missing when we renew it may just be mid-steal by another instance, which puts it
+# back if it turns out not to have expired, so look again a few times before giving it up
+RENEW_RETRIES = 5
+RENEW_RETRY_DELAY = 0.1
+
+
+def make_owner_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def lease_filename(key: str) -> str:
+    # keys are paths relative to the inbox, which may contain slashes and be very long
+    return f"{hashlib.md5(key.encode()).hexdigest()}.lease"
+
+
+class Lease:
+    """A claim on a book, held until it's released or its owner stops heartbeating and it expires"""
+
+    def __init__(self, manager: "LeaseManager", key: str, path: Path | None):
+        self.manager = manager
+        self.key = key
+        self.path = path
+        self.lost = False
+
+    def __repr__(self):
+        return f"Lease({self.key} -- {self.manager.owner}{' -- lost' if self.lost else ''})"
+
+    def release(self):
+        self.manager.release(self)
+
+
+class LeaseManager:
+    """Lets several auto-m4b instances share one inbox, e.g. on an NFS mount, without converting the
+    same book twice. Each book is claimed by hard-linking a lease file into the shared lease folder.
+    link() is atomic even on NFS, so only one instance can create the link. Held leases are
+    renewed by a heartbeat thread. If an instance dies, its leases expire after ttl seconds, and
+    another instance can steal them by renaming the stale lease away.
+
+    If folder is None, leasing is disabled and every claim succeeds."""
+
+    def __init__(self, folder: Path | None, ttl: float, owner: str | None = None):
+        self.folder = folder
+        self.ttl = ttl
+        self.owner = owner or make_owner_id()
+        self._lock = threading.RLock()
+        self._held: dict[str, Lease] = {}
+        self._heartbeat: threading.Thread | None = None
+        self._stop = threading.Event()
+        if folder:
+            folder.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.folder is not None
+
+    def _path(self, key: str) -> Path:
+        return self.folder / lease_filename(key)  # type: ignore
+
+    def _content(self, key: str) -> dict[str, Any]:
+        now = time.time()
+        return {"key": key, "owner": self.owner, "heartbeat": now, "expires": now + self.ttl}
+
+    def _write_tmp(self, key: str) -> Path:
+        tmp = self.folder / f".{lease_filename(key)}.{self.owner.replace(':', '_')}.tmp"  # type: ignore
+        tmp.write_text(json.dumps(self._content(key)))
+        return tmp
+
+    @staticmethod
+    def read(path: Path) -> dict[str, Any] | None:
+        try:
+            return json.loads(path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _try_link(self, key: str) -> bool:
+        tmp = self._write_tmp(key)
+        try:
+            os.link(tmp, self._path(key))
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    def _try_steal(self, key: str) -> bool:
+        """Moves an expired lease out of the way. Returns True if the lease is now free to claim."""
+        path = self._path(key)
+        current = self.read(path)
+        if current is None:
+            # gone already (released), or still being written - try again next time if so
+            return not path.exists()
+        if current.get("expires", 0) > time.time():
+            return False
+        stale = path.with_name(f".{path.name}.{self.owner.replace(':', '_')}.stale")
+        try:
+            os.rename(path, stale)
+        except FileNotFoundError:
+            # someone else stole it first
+            return False
+        # make sure we moved the expired lease we read, and not a fresh one that replaced it
+        if self.read(stale) != current:
+            try:
+                os.link(stale, path)
+            except FileExistsError:
+                pass
+            stale.unlink(missing_ok=True)
+            return False
+        stale.unlink(missing_ok=True)
+        print_debug(f"Reclaimed expired lease on {key} from {current.get('owner')}")
+        return True
+
+    def claim(self, key: str) -> Lease | None:
+        """Claims a book for this instance, or returns None if another instance holds it"""
+        with self._lock:
+            if lease := self._held.get(key):
+                return lease
+            if not self.enabled:
+                lease = Lease(self, key, None)
+            elif self._try_link(key) or (self._try_steal(key) and self._try_link(key)):
+                lease = Lease(self, key, self._path(key))
+                self._ensure_heartbeat()
+            else:
+                return None
+            self._held[key] = lease
+            return lease
+
+    def owner_of(self, key: str) -> str | None:
+        if not self.enabled:
+            return None
+        return (self.read(self._path(key)) or {}).get("owner")
+
+    def held_by_others(self) -> set[str]:
+        """Keys of the books other instances hold a lease on that hasn't expired"""
+        if not self.enabled:
+            return set()
+        now = time.time()
+        held = set()
+        for f in self.folder.glob("*.lease"):  # type: ignore
+            lease = self.read(f) or {}
+            if lease.get("owner") not in (None, self.owner) and lease.get("expires", 0) > now:
+                held.add(lease["key"])
+        return held
+
+    def _still_ours(self, key: str) -> bool:
+        for _ in range(RENEW_RETRIES):
+            if (owner := self.owner_of(key)) is not None:
+                return owner == self.owner
+            time.sleep(RENEW_RETRY_DELAY)
+        return False
+
+    def release(self, lease: Lease):
+        with self._lock:
+            if self._held.get(lease.key) is not lease:
+                return
+            self._held.pop(lease.key, None)
+            if lease.path and not lease.lost and self.owner_of(lease.key) == self.owner:
+                lease.path.unlink(missing_ok=True)
+
+    def release_all(self):
+        with self._lock:
+            for lease in list(self._held.values()):
+                self.release(lease)
+
+    def renew(self):
+        """Pushes back the expiry of every lease we hold, and marks any that were taken over as lost"""
+        with self._lock:
+            for key, lease in list(self._held.items()):
+                if not lease.path:
+                    continue
+                if not self._still_ours(key):
+                    lease.lost = True
+                    self._held.pop(key, None)
+                    continue
+                tmp = self._write_tmp(key)
+                os.replace(tmp, lease.path)
+
+    def _ensure_heartbeat(self):
+        if self._heartbeat and self._heartbeat.is_alive():
+            return
+        self._heartbeat = threading.Thread(
+            target=self._beat, name="lease-heartbeat", daemon=True
+        )
+        self._heartbeat.start()
+
+    def _beat(self):
+        while not self._stop.wait(self.ttl / 3):
+            try:
+                self.renew()
+            except OSError as e:
+                print_debug(f"Lease heartbeat failed: {e}")
+
+    def stop(self):
+        self._stop.set()
+
+
+_LEASES: LeaseManager | None = None
+
+
+def get_leases() -> LeaseManager:
+    global _LEASES
+    from src.lib.config import cfg
+
+    if _LEASES is None or _LEASES.folder != cfg.lease_dir:
+        if _LEASES:
+            _LEASES.stop()
+        _LEASES = LeaseManager(cfg.lease_dir, cfg.LEASE_TTL)
+    return _LEASES
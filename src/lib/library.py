@@ -0,0 +1,339 @@
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Any, Literal, NamedTuple, TYPE_CHECKING
+
+from src.lib.cleaners import strip_leading_articles
+from src.lib.config import AUDIO_EXTS, cfg
+from src.lib.fs_utils import hash_path_audio_files
+from src.lib.journal import write_durably
+from src.lib.term import print_debug
+
+if TYPE_CHECKING:
+    from src.lib.audiobook import Audiobook
+
+TreeName = Literal["converted", "archive"]
+
+# bump this whenever LibraryEntry changes, so an index written by an older version is rebuilt
+INDEX_VERSION = 1
+
+# books whose durations are within this fraction of each other are probably the same recording
+DURATION_TOLERANCE = 0.01
+
+
+def normalize(s: str) -> str:
+    """Lowercases s and drops leading articles and punctuation, so that e.g. 'The Hobbit!' and
+    'hobbit' match"""
+    return " ".join(re.sub(r"[\W_]+", " ", strip_leading_articles(s).lower()).split())
+
+
+class LibraryEntry(NamedTuple):
+    """A folder in the converted or archive tree that holds audio files"""
+
+    tree: TreeName
+    path: str  # relative to the tree's root
+    mtime: int  # st_mtime_ns of the folder when it was indexed
+    files: tuple[str, ...]  # names of the audio files directly in the folder
+    hash: str  # hash_path_audio_files of the folder
+    source_hash: str = ""  # hash of the inbox book it was converted from, if we converted it
+    title: str = ""  # normalized
+    author: str = ""  # normalized
+    duration: float = 0
+    size: int = 0
+
+    @property
+    def has_m4b(self):
+        return any(f.endswith(".m4b") for f in self.files)
+
+
+def read_m4b_info(f: Path) -> tuple[str, str, float]:
+    """Normalized (title, author, duration) read straight from an m4b's atoms"""
+    from mutagen.mp4 import MP4
+
+    try:
+        m4b = MP4(f)
+    except Exception as e:
+        print_debug(f"Couldn't read {f} for the library index: {e}")
+        return "", "", 0
+    tags = m4b.tags or {}
+
+    def tag(atom: str) -> str:
+        return str(v[0]) if (v := tags.get(atom)) else ""
+
+    title = tag("\xa9alb") or tag("\xa9nam")
+    return normalize(title), normalize(tag("\xa9ART")), float(m4b.info.length or 0)
+
+
+def audio_files_and_dirs(d: Path) -> tuple[list[os.DirEntry], list[Path]]:
+    """The audio files directly in d, and its subfolders (hidden ones are skipped)"""
+    files, dirs = [], []
+    try:
+        with os.scandir(d) as it:
+            for e in it:
+                if e.name.startswith("."):
+                    continue
+                if e.is_dir(follow_symlinks=False):
+                    dirs.append(Path(e.path))
+                elif Path(e.name).suffix in AUDIO_EXTS and e.is_file():
+                    files.append(e)
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+        pass
+    return files, dirs
+
+
+def walk_audio_dirs(root: Path):
+    """Yields every folder under root (including root) that directly contains audio files, along
+    with them"""
+    stack = [root]
+    while stack:
+        files, dirs = audio_files_and_dirs(stack.pop())
+        if files:
+            yield Path(files[0].path).parent, files
+        stack.extend(dirs)
+
+
+def scan_dir(tree: TreeName, root: Path, d: Path, files: list[os.DirEntry]) -> LibraryEntry:
+    title, author, duration = "", "", 0.0
+    if m4b := next((f for f in files if f.name.endswith(".m4b")), None):
+        title, author, duration = read_m4b_info(Path(m4b.path))
+    return LibraryEntry(
+        tree=tree,
+        path=str(d.relative_to(root)),
+        mtime=d.stat().st_mtime_ns,
+        files=tuple(sorted(f.name for f in files)),
+        hash=hash_path_audio_files(d),
+        title=title,
+        author=author,
+        duration=duration,
+        size=sum(f.stat().st_size for f in files),
+    )
+
+
+class LibraryIndex:
+    """An index of the books in the converted and archive folders, saved in the working folder so
+    it survives restarts. It's refreshed once per pass over the inbox, and only folders whose mtime
+    changed since they were indexed are read again. Folders we move books into ourselves are
+    indexed as soon as they're written. Lets us decide whether a book was already converted, find
+    the same book under a different folder name, and pick unique file names without probing the
+    converted and archive folders for every book."""
+
+    def __init__(self, index_file: Path, roots: dict[TreeName, Path]):
+        self.index_file = index_file
+        self.roots = roots
+        self._lock = threading.RLock()
+        self._entries: dict[tuple[TreeName, str], LibraryEntry] = {}
+        self._dirs: set[tuple[TreeName, str]] = set()
+        self._by_hash: dict[str, list[LibraryEntry]] = {}
+        self._by_name: dict[tuple[str, str], list[LibraryEntry]] = {}
+        self._load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _roots_json(self) -> dict[str, str]:
+        return {tree: str(root) for tree, root in self.roots.items()}
+
+    def _load(self):
+        try:
+            data = json.loads(self.index_file.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if data.get("version") != INDEX_VERSION or data.get("roots") != self._roots_json():
+            return
+        try:
+            entries = [LibraryEntry(*e) for e in data.get("entries", [])]
+        except TypeError:
+            return
+        for e in entries:
+            self._entries[(e.tree, e.path)] = e._replace(files=tuple(e.files))
+        self._reindex()
+
+    def save(self):
+        with self._lock:
+            data: dict[str, Any] = {
+                "version": INDEX_VERSION,
+                "roots": self._roots_json(),
+                "entries": list(self._entries.values()),
+            }
+            write_durably(self.index_file, json.dumps(data))
+
+    def _reindex(self):
+        # built aside and swapped in, so lookups from other threads never see a partial index
+        dirs: set[tuple[TreeName, str]] = set()
+        by_hash: dict[str, list[LibraryEntry]] = {}
+        by_name: dict[tuple[str, str], list[LibraryEntry]] = {}
+        for e in self._entries.values():
+            p = Path(e.path)
+            dirs.update((e.tree, str(parent)) for parent in [p, *p.parents])
+            for h in {e.hash, e.source_hash} - {""}:
+                by_hash.setdefault(h, []).append(e)
+            if e.title:
+                by_name.setdefault((e.title, e.author), []).append(e)
+        self._dirs, self._by_hash, self._by_name = dirs, by_hash, by_name
+
+    def _key(self, d: Path) -> tuple[TreeName, str] | None:
+        d = d.resolve()
+        for tree, root in self.roots.items():
+            if d.is_relative_to(root):
+                return tree, str(d.relative_to(root))
+        return None
+
+    def _sync(self, tree: TreeName, d: Path) -> bool:
+        """Indexes every audio folder under d (in tree) whose mtime changed, and forgets the ones
+        that are gone. Returns True if anything changed."""
+        root = self.roots[tree]
+        under = "" if d == root else f"{d.relative_to(root)}{os.sep}"
+        seen: set[tuple[TreeName, str]] = set()
+        changed = False
+        for found, files in walk_audio_dirs(d):
+            k = (tree, str(found.relative_to(root)))
+            seen.add(k)
+            prev = self._entries.get(k)
+            if prev and prev.mtime == found.stat().st_mtime_ns:
+                continue
+            self._entries[k] = self._rescanned(prev, scan_dir(tree, root, found, files))
+            changed = True
+        for k in [
+            k
+            for k in self._entries
+            if k[0] == tree
+            and k not in seen
+            and (k[1] == str(d.relative_to(root)) or k[1].startswith(under))
+        ]:
+            del self._entries[k]
+            changed = True
+        return changed
+
+    @staticmethod
+    def _rescanned(prev: LibraryEntry | None, entry: LibraryEntry) -> LibraryEntry:
+        """Keeps what we knew about a folder's book, as long as its audio files didn't change"""
+        if not prev or prev.hash != entry.hash:
+            return entry
+        return entry._replace(
+            source_hash=prev.source_hash,
+            title=prev.title or entry.title,
+            author=prev.author or entry.author,
+            duration=prev.duration or entry.duration,
+        )
+
+    def refresh(self) -> bool:
+        """Brings the index up to date with the converted and archive folders. Returns True if
+        anything changed."""
+        with self._lock:
+            changed = False
+            for tree, root in self.roots.items():
+                changed = self._sync(tree, root) or changed
+            if changed:
+                self._reindex()
+                self.save()
+            return changed
+
+    def update(self, d: Path, book: "Audiobook | None" = None, source_hash: str = ""):
+        """Indexes d (and its subfolders) again right after we've written to it. If book is given,
+        d is where it was converted to, and its metadata and source hash are recorded with it."""
+        with self._lock:
+            if not (k := self._key(d)):
+                return
+            self._sync(k[0], d.resolve())
+            if book and (entry := self._entries.get(k)):
+                self._entries[k] = entry._replace(
+                    source_hash=source_hash,
+                    title=normalize(book.title) or entry.title,
+                    author=normalize(book.author) or entry.author,
+                    duration=book.stats.duration or entry.duration,
+                )
+            self._reindex()
+            self.save()
+
+    def _exists(self, tree: TreeName, path: str) -> bool:
+        """Forgets folders that were removed since the index was last refreshed"""
+        if (self.roots[tree] / path).is_dir():
+            return True
+        with self._lock:
+            if self._sync(tree, self.roots[tree] / path):
+                self._reindex()
+        return False
+
+    def get(self, d: Path) -> LibraryEntry | None:
+        """The entry for folder d, if it holds audio files"""
+        if (k := self._key(d)) and (entry := self._entries.get(k)):
+            return entry if self._exists(*k) else None
+        return None
+
+    def has(self, d: Path) -> bool:
+        """True if d, or any folder under it, holds audio files"""
+        return bool((k := self._key(d)) and k in self._dirs and self._exists(*k))
+
+    def with_hash(self, h: str, tree: TreeName | None = None) -> list[LibraryEntry]:
+        """Entries whose audio files, or the inbox book they were converted from, hash to h"""
+        return [
+            e
+            for e in self._by_hash.get(h, [])
+            if (tree is None or e.tree == tree) and self._exists(e.tree, e.path)
+        ]
+
+    def with_name(
+        self, title: str, author: str, duration: float = 0
+    ) -> list[LibraryEntry]:
+        """Converted books with the same (normalized) title and author, and if duration is given,
+        about the same duration"""
+        return [
+            e
+            for e in self._by_name.get((normalize(title), normalize(author)), [])
+            if e.tree == "converted"
+            and (
+                not duration
+                or not e.duration
+                or abs(e.duration - duration) <= duration * DURATION_TOLERANCE
+            )
+            and self._exists(e.tree, e.path)
+        ]
+
+    def path_of(self, entry: LibraryEntry) -> Path:
+        return self.roots[entry.tree] / entry.path
+
+    def unique_name(self, d: Path, name: str) -> str:
+        """The first of '<name>', '<stem> (copy)<ext>', '<stem> (copy 1)<ext>'... that isn't
+        taken in folder d"""
+        entry = self.get(d)
+        files = set(entry.files) if entry else set()
+
+        def taken(n: str) -> bool:
+            # the index may be behind on files put there by hand since it was refreshed
+            return n in files or (d / n).exists()
+
+        if not taken(name):
+            return name
+        stem, ext = Path(name).stem, Path(name).suffix
+        i = 0
+        candidate = f"{stem} (copy){ext}"
+        while taken(candidate):
+            i += 1
+            candidate = f"{stem} (copy {i}){ext}"
+        return candidate
+
+
+_LIBRARY: LibraryIndex | None = None
+_LIBRARY_LOCK = threading.Lock()
+
+
+def library_file() -> Path:
+    return cfg.working_dir / "library.json"
+
+
+def get_library() -> LibraryIndex:
+    global _LIBRARY
+    roots: dict[TreeName, Path] = {
+        "converted": cfg.converted_dir.resolve(),
+        "archive": cfg.archive_dir.resolve(),
+    }
+    with _LIBRARY_LOCK:
+        if (
+            _LIBRARY is None
+            or _LIBRARY.roots != roots
+            or _LIBRARY.index_file != library_file()
+        ):
+            _LIBRARY = LibraryIndex(library_file(), roots)
+        return _LIBRARY
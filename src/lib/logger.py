@@ -7,7 +7,13 @@ from columnar import columnar
 
 from src.lib.audiobook import Audiobook
 from src.lib.config import cfg
-from src.lib.formatters import log_date, log_format_elapsed_time, pluralize
+from src.lib.formatters import (
+    format_duration,
+    human_size,
+    log_date,
+    log_format_elapsed_time,
+    pluralize,
+)
 from src.lib.misc import re_group
 from src.lib.term import multiline_is_empty
 
@@ -111,6 +117,8 @@ def log_global_results(
     # Remove blank lines from end of log file
     # log = log.rstrip("\n")
 
+    # probed while the book was being prepared
+    stats = book.stats
     log_data.append(
         [
             log_date(),
@@ -119,9 +127,9 @@ def log_global_results(
             book.bitrate_friendly,
             book.samplerate_friendly,
             f".{(book.orig_file_type or "N/A").replace('.', '')}",
-            f"{book.num_files('inbox')} {pluralize(book.num_files('inbox'), "file")}",
-            book.size("inbox", "human"),
-            book.duration("inbox", "human") or "-",
+            f"{stats.num_files} {pluralize(stats.num_files, "file")}",
+            human_size(stats.size),
+            format_duration(stats.duration, "human") or "-",
             human_elapsed or "",
         ]
     )
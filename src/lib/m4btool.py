@@ -1,3 +1,4 @@
+import uuid
 from typing import Any
 
 from src.lib.audiobook import Audiobook
@@ -20,7 +21,7 @@ from src.lib.term import (
 class M4bTool:
     _cmd: list[Any]
 
-    def __init__(self, book: Audiobook):
+    def __init__(self, book: Audiobook, *, passthrough: bool = False):
         def _(*new_arg: str | tuple[str, Any]):
             if isinstance(new_arg, tuple):
                 self._cmd.extend(new_arg)
@@ -28,7 +29,13 @@ class M4bTool:
                 self._cmd.append(new_arg)
 
         self.book = book
-        self._cmd = cfg._m4b_tool + [
+        self.passthrough = passthrough
+        m4b_tool = list(cfg._m4b_tool)
+        self.container = f"auto-m4b-{uuid.uuid4().hex[:12]}" if cfg.USE_DOCKER else None
+        if self.container:
+            # named, so the watchdog can kill the container and not just the docker client
+            m4b_tool[2:2] = ["--name", self.container]
+        self._cmd = m4b_tool + [
             "merge",
             dockerize_volume(book.merge_dir),
             "-n",
@@ -49,7 +56,7 @@ class M4bTool:
         _("--no-chapter-reindexing")
 
         if (
-            book.orig_file_type in ["m4a", "m4b"] or not book.has_id3_cover
+            self.should_copy or not book.has_id3_cover
         ) and book.cover_art_file:
             _(("--cover", dockerize_volume(book.cover_art_file)))
 
@@ -88,7 +95,7 @@ class M4bTool:
 
     @property
     def should_copy(self):
-        return self.book.orig_file_type in ["m4a", "m4b"]
+        return self.passthrough or self.book.orig_file_type in ["m4a", "m4b"]
 
     def print_msg(self):
         starttime_friendly = friendly_date()
@@ -0,0 +1,121 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, TYPE_CHECKING
+
+from src.lib.config import cfg
+from src.lib.ffmpeg_utils import BookStats
+from src.lib.fs_utils import hash_path_audio_files
+from src.lib.id3_utils import print_book_metadata
+from src.lib.journal import write_durably
+from src.lib.term import PATH_COLOR, print_debug, smart_print
+
+if TYPE_CHECKING:
+    from src.lib.audiobook import Audiobook
+
+# bump this whenever a change to the path/id3 parsers or the scoring would resolve a book's
+# metadata differently, so that metadata saved by an older version is worked out again
+PARSER_VERSION = 1
+
+# everything extract_path_info and extract_metadata resolve for a book
+METADATA_FIELDS = [
+    "fs_author",
+    "fs_title",
+    "fs_year",
+    "fs_narrator",
+    "dir_extra_junk",
+    "file_extra_junk",
+    "orig_file_name",
+    "id3_title",
+    "id3_artist",
+    "id3_albumartist",
+    "id3_album",
+    "id3_sortalbum",
+    "id3_date",
+    "id3_year",
+    "id3_comment",
+    "id3_composer",
+    "has_id3_cover",
+    "title",
+    "artist",
+    "albumartist",
+    "album",
+    "sortalbum",
+    "date",
+    "year",
+    "composer",
+    "narrator",
+    "scores",
+]
+
+
+def metadata_dir() -> Path:
+    return cfg.working_dir / "metadata"
+
+
+def metadata_file(key: str) -> Path:
+    return metadata_dir() / f"{hashlib.md5(key.encode()).hexdigest()}.json"
+
+
+def load_metadata(book: "Audiobook", inbox_hash: str) -> bool:
+    """Restores the book's metadata and stats from its sidecar, if there is one for the same inbox
+    hash and parser version. Returns True if the book was restored."""
+    try:
+        data = json.loads(metadata_file(book.key).read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return False
+    if data.get("hash") != inbox_hash or data.get("version") != PARSER_VERSION:
+        return False
+    try:
+        stats = BookStats(
+            **{k: tuple(v) if isinstance(v, list) else v for k, v in data["stats"].items()}
+        )
+        metadata: dict[str, Any] = data["metadata"]
+        for field in METADATA_FIELDS:
+            setattr(book, field, metadata[field])
+    except (KeyError, TypeError, ValueError) as e:
+        print_debug(f"Ignoring saved metadata for {book.key}: {e}")
+        return False
+    book.stats = stats
+    return True
+
+
+def save_metadata(book: "Audiobook", inbox_hash: str):
+    write_durably(
+        metadata_file(book.key),
+        json.dumps(
+            {
+                "key": book.key,
+                "hash": inbox_hash,
+                "version": PARSER_VERSION,
+                "metadata": {field: getattr(book, field) for field in METADATA_FIELDS},
+                "stats": book.stats._asdict(),
+            },
+            indent=2,
+        ),
+    )
+
+
+def discard_metadata(book: "Audiobook"):
+    metadata_file(book.key).unlink(missing_ok=True)
+
+
+def resolve_metadata(
+    book: "Audiobook", quiet: bool = False, inbox_hash: str | None = None
+) -> "Audiobook":
+    """Extracts the book's path info and metadata, or loads them from the sidecar saved the last
+    time this book was checked, if its audio files haven't changed since"""
+    inbox_hash = inbox_hash or hash_path_audio_files(book.inbox_dir)
+    if load_metadata(book, inbox_hash):
+        if not quiet:
+            smart_print(
+                f"Using saved metadata and quality info for [[{book.basename}]]:",
+                highlight_color=PATH_COLOR,
+            )
+            print_book_metadata(book)
+        return book
+
+    book.extract_path_info(quiet)
+    book.extract_metadata(quiet)
+    save_metadata(book, inbox_hash)
+    return book
@@ -3,9 +3,9 @@ import re
 import string
 from collections.abc import Generator, Iterable
 from dataclasses import dataclass
-from itertools import combinations
+from itertools import pairwise, product
 from pathlib import Path
-from typing import Any, cast, Literal, overload, TYPE_CHECKING, TypeVar
+from typing import Any, cast, Literal, NamedTuple, overload, TYPE_CHECKING, TypeVar
 
 import cachetools
 import cachetools.func
@@ -56,6 +56,14 @@ startswith_num_pattern = re.compile(r"(?P<num>^\d+)")
 multi_disc_pattern = re.compile(r"(?:^|(?<=[\W_-]))(dis[ck]|cd)(\b|\s|[_.-])*#?(\b|\s|[_.-])*(?:\b|[\W_-])*(\d+)", re.I)
 book_series_pattern = re.compile(r"(^\d+|(?:^|(?<=[\W_-]))(bo{0,2}k|vol(?:ume)?|#)(?:\b|[\W_-])*(\d+)|(?<=[\W_-])Series.*/.+)", re.I)
 multi_part_pattern = re.compile(r"(?:^|(?<=[\W_-]))(pa?r?t|ch(?:\.|apter))(?:\b|[\W_-])*(\d+)", re.I)
+# each lookahead finds the first match of its pattern anywhere in the string, just like search(), so
+# one match() at the start of the string tells us which of the three patterns are in it
+name_features_pattern = re.compile(
+    "".join(f"(?:(?=[\\s\\S]*?(?P<{name}>{p.pattern})))?" for name, p in [
+        ("disc", multi_disc_pattern), ("series", book_series_pattern), ("part", multi_part_pattern)
+    ]),
+    re.I,
+)
 # fmt: on
 
 S = TypeVar("S", bound=str | Path)
@@ -65,16 +73,13 @@ S = TypeVar("S", bound=str | Path)
 class romans:
     ones = ["I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX"]
     tens = ["X", "XX", "XXX", "XL", "L", "LX", "LXX", "LXXX", "XC"]
+    # every valid roman numeral from 1 to 99
+    numerals = frozenset(map("".join, product(["", *tens], ["", *ones]))) - {""}
 
     @classmethod
     def is_roman_numeral(cls, s: str) -> bool:
         """Test input against all possible valid roman numerals from 1 to 99"""
-        s = str(s).upper()
-        for ten in cls.tens:
-            for one in cls.ones:
-                if s == ten + one or s == ten or s == one:
-                    return True
-        return False
+        return str(s).upper() in cls.numerals
 
     @classmethod
     def find_all(cls, s: str) -> list[str]:
@@ -132,17 +137,12 @@ def find_greatest_common_string(s: list[str]) -> str:
     if not s:
         return ""
 
-    common_prefixes = set()
-
-    for file1, file2 in combinations(s, 2):
-        prefix = os.path.commonprefix([file1, file2])
-        common_prefixes.add(prefix)
-
-    valid_prefixes = [
-        prefix for prefix in common_prefixes if any(f.startswith(prefix) for f in s)
-    ]
-
-    return max(valid_prefixes, key=len, default="")
+    # the longest prefix shared by any two strings is shared by two neighbours once they're sorted
+    return max(
+        (os.path.commonprefix([s1, s2]) for s1, s2 in pairwise(sorted(s))),
+        key=len,
+        default="",
+    )
 
 
 def contains_partno_or_ch(s: str, s2: str | None = None) -> bool:
@@ -186,11 +186,8 @@ def extract_path_info(book: "Audiobook", quiet: bool = False) -> "Audiobook":
     dir_year = re_group(year_pattern.search(book.basename), "year")
     dir_narrator = parse_narrator(book.basename, "fs")
 
-    # remove suffix/extension from files
-    files = [f.stem for f in Path(book.inbox_dir).iterdir() if f.is_file()]
-
     # Get filename common text
-    orig_file_name = find_greatest_common_string(files)
+    orig_file_name = book.filename_features.common_file_name
 
     orig_file_name = strip_part_number(orig_file_name)
     # TODO: dupe? Probably remove
@@ -265,16 +262,74 @@ def get_romans_dict(*ss: str) -> dict[str, int]:
     return found_roman_numerals
 
 
+class NameFeatures(NamedTuple):
+    multi_disc: bool
+    multi_book_or_series: bool
+    multi_part: bool
+
+
+@cachetools.func.ttl_cache(maxsize=256, ttl=MEMO_TTL)
+def name_features(s: str) -> NameFeatures:
+    """Checks a file or folder name against the multi-disc, series and multi-part patterns in one
+    regex pass"""
+    m = cast(re.Match, name_features_pattern.match(s))
+    disc = m.group("disc") is not None
+    series = not disc and m.group("series") is not None
+    part = not disc and not series and m.group("part") is not None
+    return NameFeatures(disc, series, part)
+
+
+@dataclass(frozen=True)
+class FilenameFeatures:
+    """What the structure and file order checks need to know about a book's file names, gathered
+    from one walk of its folder"""
+
+    path: Path
+    romans: dict[str, int]
+    roman_numerals_affect_order: bool
+    flattening_affects_order: bool
+    common_file_name: str
+
+    @property
+    def num_distinct_romans(self) -> int:
+        """The number of unique roman numerals, ignoring 'I' to avoid false positives"""
+        return len([n for n in self.romans if n != "I"])
+
+    @classmethod
+    def scan(cls, d: Path) -> "FilenameFeatures":
+        from src.lib.fs_utils import filter_ignored, only_audio_files
+
+        entries = isorted(d.rglob("*"))
+        files = [f for f in entries if f.is_file()]
+
+        # files in the same order as before and after stripping roman numerals
+        stems = isorted(f.stem for f in entries)
+        stems_no_roman = romans.strip_from_list(stems)
+
+        # files in the same order as before and after moving them all to the root folder
+        files_flat = [f.name for f in filter_ignored(d / f.name for f in filter_ignored(files))]
+        files_flat_sorted = isorted(list(set(files_flat)))
+
+        return cls(
+            path=d,
+            romans=get_romans_dict(*(str(f) for f in only_audio_files(entries))),
+            roman_numerals_affect_order=stems_no_roman != isorted(stems_no_roman),
+            flattening_affects_order=len(files_flat) != len(files_flat_sorted)
+            or only_audio_files(files_flat_sorted) != only_audio_files(files_flat),
+            common_file_name=find_greatest_common_string(
+                [f.stem for f in files if f.parent == d]
+            ),
+        )
+
+
 def find_paths_with_romans(d: Path) -> dict[str, int]:
     """Makes a dictionary of all the different roman numerals found in the directory"""
-    from src.lib.fs_utils import only_audio_files
-
-    return get_romans_dict(*(str(f) for f in only_audio_files(d.rglob("*"))))
+    return FilenameFeatures.scan(d).romans
 
 
 def count_distinct_romans(d: Path) -> int:
     """Counts the number of unique roman numerals in a directory, ignoring 'I' to avoid false positives"""
-    return len([n for n in find_paths_with_romans(d).keys() if n != "I"])
+    return FilenameFeatures.scan(d).num_distinct_romans
 
 
 def roman_numerals_affect_file_order(d: Path) -> bool:
@@ -286,9 +341,7 @@ def roman_numerals_affect_file_order(d: Path) -> bool:
     Returns:
         bool: True if the files are in the same order, False otherwise
     """
-    files = isorted((Path(f).stem for f in d.rglob("*")))
-    files_no_roman = romans.strip_from_list(files)
-    return files_no_roman != isorted(files_no_roman)
+    return FilenameFeatures.scan(d).roman_numerals_affect_order
 
 
 @overload
@@ -426,20 +479,13 @@ def get_title_partno_score(
     return score > 0, score, contains_only_part
 
 
-@cachetools.func.ttl_cache(maxsize=32, ttl=MEMO_TTL)
 def is_maybe_multi_book_or_series(s: str) -> bool:
-    return not is_maybe_multi_disc(s) and bool(book_series_pattern.search(s))
+    return name_features(s).multi_book_or_series
 
 
-@cachetools.func.ttl_cache(maxsize=32, ttl=MEMO_TTL)
 def is_maybe_multi_disc(s: str) -> bool:
-    return bool(multi_disc_pattern.search(s))
+    return name_features(s).multi_disc
 
 
-@cachetools.func.ttl_cache(maxsize=32, ttl=MEMO_TTL)
 def is_maybe_multi_part(s: str) -> bool:
-    return (
-        not is_maybe_multi_disc(s)
-        and not is_maybe_multi_book_or_series(s)
-        and bool(multi_part_pattern.search(s))
-    )
+    return name_features(s).multi_part
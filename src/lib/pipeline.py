@@ -0,0 +1,166 @@
+import threading
+from queue import Empty, Full, Queue
+from typing import Any, NamedTuple
+
+from tinta import Tinta
+
+from src.lib.audiobook import Audiobook
+from src.lib.inbox_item import InboxItem
+from src.lib.leases import Lease
+from src.lib.term import print_to
+
+
+class BookOutput:
+    """Holds a book's console output until it's the book's turn to print, so that each book's
+    output reads the same as it would if the books were processed one at a time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffer: list[tuple[Tinta, str]] = []
+        self._live = False
+
+    def write(self, t: Tinta, end: str):
+        with self._lock:
+            if self._live:
+                t.print(end=end)
+            else:
+                self._buffer.append((t, end))
+
+    def go_live(self):
+        with self._lock:
+            for t, end in self._buffer:
+                t.print(end=end)
+            self._buffer = []
+            self._live = True
+
+
+class Job(NamedTuple):
+    index: int
+    item: InboxItem
+    book: Audiobook | None = None
+    completed: int = 0
+    elapsedtime: int | bool = False
+    lease: Lease | None = None
+
+
+class BookPipeline:
+    """Runs books through prepare → convert → finalize, each stage on its own thread,
+    so that the next book can be checked, backed up and copied to the working folder while the
+    current one is converting. The hand-off queues are bounded (to one book each by default) so
+    no more than a few books are ever staged in the working folder at once, and only one book
+    converts at a time, so m4b-tool still gets all of CPU_CORES."""
+
+    def __init__(self, maxsize: int = 1):
+        self._to_convert: Queue[Job | None] = Queue(maxsize)
+        self._to_finalize: Queue[Job | None] = Queue(maxsize)
+        self._stop = threading.Event()
+        self._error: BaseException | None = None
+        self._outputs: list[BookOutput] = []
+        self._completed = 0
+        self._leases: list[Lease] = []
+        self._items: list[InboxItem] = []
+        self._lock = threading.Lock()
+
+    def run(self, items: list[InboxItem]) -> int:
+        """Processes the items in order, and returns the number of books that were completed"""
+        if not items:
+            return 0
+        self._items = items
+        self._outputs = [BookOutput() for _ in items]
+        self._outputs[0].go_live()
+
+        workers = [
+            threading.Thread(target=self._stage, args=(fn,), name=f"pipeline-{name}")
+            for name, fn in [
+                ("prepare", lambda: self._prepare(items)),
+                ("convert", self._convert),
+            ]
+        ]
+        for w in workers:
+            w.start()
+        # finalizing prints the "book done" messages, so it runs on the calling thread
+        self._stage(self._finalize)
+        for w in workers:
+            w.join()
+
+        if self._error:
+            # don't lose what the books ahead of the failure printed
+            for output in self._outputs:
+                output.go_live()
+            for lease in self._leases:
+                lease.release()
+            raise self._error
+        return self._completed
+
+    def _stage(self, fn: Any):
+        try:
+            fn()
+        except BaseException as e:
+            with self._lock:
+                self._error = self._error or e
+            self._stop.set()
+
+    def _put(self, q: Queue, job: Job | None):
+        while not self._stop.is_set():
+            try:
+                q.put(job, timeout=0.5)
+                return
+            except Full:
+                continue
+
+    def _get(self, q: Queue) -> Job | None:
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.5)
+            except Empty:
+                continue
+        return None
+
+    def _prepare(self, items: list[InboxItem]):
+        from src.lib.run import claim_book, prepare_book
+
+        try:
+            for i, item in enumerate(items):
+                if self._stop.is_set():
+                    return
+                with print_to(self._outputs[i].write):
+                    if not (lease := claim_book(item)):
+                        self._put(self._to_convert, Job(i, item))
+                        continue
+                    with self._lock:
+                        self._leases.append(lease)
+                    book, completed = prepare_book(item)
+                self._put(self._to_convert, Job(i, item, book, completed, lease=lease))
+        finally:
+            self._put(self._to_convert, None)
+
+    def _convert(self):
+        from src.lib.run import convert_prepared_book, read_ahead
+
+        try:
+            while job := self._get(self._to_convert):
+                if job.book:
+                    # the next book is already being prepared, so warm up the one after it
+                    if job.index + 2 < len(self._items):
+                        read_ahead(self._items[job.index + 2])
+                    with print_to(self._outputs[job.index].write):
+                        job = job._replace(elapsedtime=convert_prepared_book(job.book, job.lease))
+                self._put(self._to_finalize, job)
+        finally:
+            self._put(self._to_finalize, None)
+
+    def _finalize(self):
+        from src.lib.run import after_book, finalize_book
+
+        while job := self._get(self._to_finalize):
+            self._completed += job.completed
+            with print_to(self._outputs[job.index].write):
+                if job.book and job.elapsedtime is not False:
+                    self._completed = finalize_book(
+                        self._completed, job.book, int(job.elapsedtime), job.lease
+                    )
+                after_book(job.item)
+            if job.lease:
+                job.lease.release()
+            if job.index + 1 < len(self._outputs):
+                self._outputs[job.index + 1].go_live()
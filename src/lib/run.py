@@ -1,5 +1,4 @@
 import shutil
-import subprocess
 import time
 from collections.abc import Callable
 from datetime import datetime
@@ -9,8 +8,10 @@ import cachetools
 import cachetools.func
 from tinta import Tinta
 
+from src.lib import aio, io_hints
 from src.lib.audiobook import Audiobook
 from src.lib.config import cfg
+from src.lib.disk_space import DiskSpace, estimate_book_footprint, on_disk
 from src.lib.formatters import (
     human_elapsed_time,
     pluralize,
@@ -20,12 +21,18 @@ from src.lib.fs_utils import *
 from src.lib.fs_utils import _mv_or_cp_dir_contents
 from src.lib.id3_utils import verify_and_update_id3_tags
 from src.lib.inbox_state import InboxItem, InboxState
+from src.lib.journal import BookJournal, discard_journal, mark_stage, resumable_dirs
+from src.lib.leases import get_leases, Lease
+from src.lib.library import get_library
 from src.lib.logger import log_global_results
 from src.lib.m4btool import M4bTool
+from src.lib.metadata_cache import discard_metadata, resolve_metadata
 from src.lib.misc import re_group
-from src.lib.parsers import (
-    roman_numerals_affect_file_order,
+from src.lib.speculative import (
+    discard as discard_speculative_pieces,
+    SpeculativeEncoder,
 )
+from src.lib.staging import Staging
 from src.lib.strings import en
 from src.lib.term import (
     AMBER_COLOR,
@@ -50,6 +57,12 @@ from src.lib.term import (
     wrap_brackets,
 )
 from src.lib.typing import SCAN_TTL
+from src.lib.watchdog import (
+    get_limits,
+    get_watchdog,
+    ProcessCancelled,
+    ProcessStalled,
+)
 
 # glasses 1: ⌐◒-◒
 # glasses 2: ᒡ◯ᴖ◯ᒢ
@@ -83,37 +96,31 @@ def process_already_m4b(book: Audiobook, item: InboxItem):
     smart_print(f"\n{en.BOOK_ALREADY_CONVERTED}\n")
     print_moving_to_converted(book)
 
+    library = get_library()
     if book.structure == "standalone":
         file_name = item.key
-        ext = ensure_dot(book.orig_file_type)
         folder_name = item.path.stem
         target_dir = cfg.converted_dir / folder_name
 
-        unique_target = target_dir / file_name
         (target_dir).mkdir(parents=True, exist_ok=True)
+        unique_name = library.unique_name(target_dir, file_name)
 
-        if unique_target.exists():
+        if unique_name != file_name:
             smart_print(
                 "(A file with the same name already exists, this one will be renamed to prevent data loss)"
             )
 
-            i = 0
-            unique_target = (target_dir / f"{folder_name} (copy)").with_suffix(ext)
-            while unique_target.exists():
-                i += 1
-                unique_target = (target_dir / f"{folder_name} (copy {i})").with_suffix(
-                    ext
-                )
-
-        mv_file_to_dir(item.path, target_dir, new_filename=unique_target.name)
+        mv_file_to_dir(item.path, target_dir, new_filename=unique_name)
 
         for f in find_adjacent_files_with_same_basename(item.path):
             mv_file_to_dir(f, target_dir)
+        library.update(target_dir)
 
     elif book.structure == "single":
         mv_dir_contents(
             book.inbox_dir, book.converted_dir, overwrite_mode="overwrite-silent"
         )
+        library.update(book.converted_dir)
 
     book.set_active_dir("converted")
     verify_and_update_id3_tags(book, "converted")
@@ -230,6 +237,7 @@ def fail_book(book: Audiobook, reason: str = "unknown"):
     if book.key in inbox.failed_books:
         return
     inbox.set_failed(book.key, reason)
+    discard_journal(book)
 
     book.write_log(reason.strip().strip("\n"))
     book.set_active_dir("inbox")
@@ -254,7 +262,12 @@ def backup_ok(book: Audiobook):
     else:
         ln = "Making a backup copy → "
         smart_print(f"{ln}{tint_path(linebreak_path(book.backup_dir, indent=len(ln)))}")
-        cp_dir_contents(book.inbox_dir, book.backup_dir, overwrite_mode="skip-silent")
+        cp_dir_contents(
+            book.inbox_dir,
+            book.backup_dir,
+            overwrite_mode="skip-silent",
+            drop_cache="dst",
+        )
 
         fuzzy = 1000
 
@@ -342,10 +355,11 @@ def backup_ok(book: Audiobook):
     return True
 
 
-def ok_to_overwrite(book: Audiobook):
-    if book.converted_file.is_file():
+def ok_to_overwrite(book: Audiobook, inbox_hash: str = ""):
+    library = get_library()
+    if (converted := library.get(book.converted_dir)) and converted.has_m4b:
         if cfg.OVERWRITE_MODE == "skip":
-            if book.archive_dir.exists():
+            if library.has(book.archive_dir):
                 print_notice(
                     f"Found a copy of this book in {tint_path(cfg.archive_dir)}, it has probably already been converted"
                 )
@@ -353,7 +367,7 @@ def ok_to_overwrite(book: Audiobook):
                     "Skipping this book because OVERWRITE_EXISTING is not enabled"
                 )
                 return False
-            elif book.size("converted", "bytes") > 0:
+            elif converted.size > 0:
                 print_notice(
                     f"Output file already exists and OVERWRITE_EXISTING is not enabled, skipping this book"
                 )
@@ -363,9 +377,37 @@ def ok_to_overwrite(book: Audiobook):
                 "Warning: Output file already exists, it and any other {{.m4b}} files will be overwritten"
             )
 
+    elif inbox_hash and (
+        copies := [
+            library.path_of(e)
+            for e in library.with_hash(inbox_hash)
+            if library.path_of(e) not in (book.converted_dir, book.archive_dir)
+        ]
+    ):
+        # the same files were converted (or archived) before, under a different folder name
+        print_notice(
+            f"Found a copy of this book in {tint_path(copies[0])}, it has probably already been converted"
+        )
+        if cfg.OVERWRITE_MODE == "skip":
+            print_notice(
+                "Skipping this book because OVERWRITE_EXISTING is not enabled"
+            )
+            return False
+
     return True
 
 
+def print_converted_copies(book: Audiobook):
+    """Points out converted books with the same title, author and duration as this one, e.g. if
+    the same book was added again with different file names"""
+    library = get_library()
+    for e in library.with_name(book.title, book.author, book.stats.duration):
+        if (path := library.path_of(e)) != book.converted_dir:
+            print_notice(
+                f"This looks like the same book as {tint_path(path)}, which was already converted"
+            )
+
+
 def check_failed_books():
     inbox = InboxState()
     if not inbox.failed_books:
@@ -398,10 +440,97 @@ def check_failed_books():
         #     print_debug(f"{book_name} hash is the same, keeping it in failed books")
 
 
+def find_duplicate_books(items: list[InboxItem]) -> dict[InboxItem, InboxItem]:
+    """Maps each settled book that's a copy of an earlier book in items (e.g. the same book dropped
+    into the inbox twice under different names) to the book it's a copy of. Only books with the
+    same number of audio files and total size as another book are fingerprinted."""
+    candidates: dict[tuple[int, int], list[InboxItem]] = {}
+    for item in items:
+        if item.is_settled and (layout := item.layout).num_files:
+            candidates.setdefault((layout.num_files, layout.size), []).append(item)
+
+    duplicates: dict[InboxItem, InboxItem] = {}
+    for group in candidates.values():
+        if len(group) < 2:
+            continue
+        firsts: dict[str, InboxItem] = {}
+        for item in group:
+            try:
+                fingerprint = fingerprint_audio_files(item.layout.files)
+            except OSError as e:
+                print_debug(f"Couldn't fingerprint {item.key}: {e}")
+                continue
+            if (first := firsts.setdefault(fingerprint, item)) is not item:
+                duplicates[item] = first
+    return duplicates
+
+
+# the duplicates found in this pass and the fingerprint they matched, by the key of the book
+# they're a copy of
+_DUPLICATES: dict[str, list[tuple[InboxItem, str]]] = {}
+
+
+def set_aside_duplicates(items: list[InboxItem]) -> list[InboxItem]:
+    """Returns items without any duplicate books, so that only the first copy of a book is
+    converted. If OVERWRITE_MODE is skip, duplicates are left in the inbox and marked as failed
+    until they change; otherwise they're left alone until the first copy has been converted, and
+    then archived (or deleted) by archive_duplicates."""
+    _DUPLICATES.clear()
+    if not (duplicates := find_duplicate_books(items)):
+        return items
+    skip = cfg.OVERWRITE_MODE in ("skip", "skip-silent")
+    for dup, first in duplicates.items():
+        if not cfg.OVERWRITE_MODE.endswith("-silent"):
+            print_notice(
+                f"{tint_path(dup.key)} is the same book as {tint_path(first.key)}, only the first one will be converted"
+            )
+        if skip:
+            InboxState().set_failed(dup.key, f"duplicate of {first.key}")
+        elif fingerprint := fingerprint_book(first):
+            _DUPLICATES.setdefault(first.key, []).append((dup, fingerprint))
+    return [item for item in items if item not in duplicates]
+
+
+def fingerprint_book(item: InboxItem) -> str | None:
+    """Fingerprints the book's audio files as they are now, or None if they couldn't be read"""
+    try:
+        return fingerprint_audio_files(get_book_layout(item.path, item.hash).files)
+    except OSError as e:
+        print_debug(f"Couldn't fingerprint {item.key}: {e}")
+        return None
+
+
+def archive_duplicates(book: Audiobook):
+    """Archives (or deletes) the copies of a book that were set aside, now that the book itself
+    has been converted. Copies are archived under '<name> (duplicate)' so they aren't mistaken
+    for the book's own original. A copy that has changed since it was set aside is left in the
+    inbox, so it's converted on its own in the next pass."""
+    for dup, fingerprint in _DUPLICATES.pop(book.key, []):
+        if not (lease := claim_book(dup)):
+            continue
+        try:
+            if not dup.path.exists():
+                continue
+            if not dup.is_settled or fingerprint_book(dup) != fingerprint:
+                print_notice(
+                    f"{tint_path(dup.key)} has changed since it was found to be the same book as {tint_path(book.key)}, leaving it in the inbox"
+                )
+                continue
+            archive_inbox_book(dup.to_audiobook(), duplicate=True)
+        finally:
+            lease.release()
+
+
 def copy_to_working_dir(book: Audiobook):
     # Move from inbox to merge folder
     smart_print("\nCopying files to working folder...", end="")
-    cp_dir(book.inbox_dir, cfg.merge_dir, overwrite_mode="overwrite-silent")
+    book.merge_dir.parent.mkdir(parents=True, exist_ok=True)
+    cp_dir(
+        book.inbox_dir,
+        book.merge_dir.parent,
+        overwrite_mode="overwrite-silent",
+        drop_cache="src",
+    )
     # copy book.cover_art to merge folder
     if book.cover_art_file and not book.cover_art_file.exists():
         cp_file_to_dir(
@@ -498,7 +627,7 @@ def can_process_multi_dir(book: Audiobook):
                         "\nThis folder appears to be a multi-disc book, attempting to flatten it...",
                         end="",
                     )
-                    if flattening_files_in_dir_affects_order(book.inbox_dir):
+                    if book.filename_features.flattening_affects_order:
                         nl(2)
                         print_error(
                             "Flattening this book would affect the file order, cannot proceed"
@@ -542,7 +671,7 @@ def can_process_multi_dir(book: Audiobook):
 
 def can_process_roman_numeral_book(book: Audiobook):
     if book.num_roman_numerals > 1:
-        if roman_numerals_affect_file_order(book.inbox_dir):
+        if book.filename_features.roman_numerals_affect_order:
             print_error(en.ROMAN_ERR)
             help_msg = "Roman numerals do not sort in alphabetical order; please rename them so they sort alphabetically in the correct order"
             smart_print(f"{help_msg}\n")
@@ -593,23 +722,64 @@ def print_book_info(book: "Audiobook"):
     print_list_item(f"Source: {src}")
     print_list_item(f"Output: {dst}")
     print_list_item(f"Format: {book.orig_file_type}")
-    num_files = 1 if book.structure.count("standalone") else book.num_files("inbox")
-    print_list_item(f"Audio files: {num_files}")
-    print_list_item(f"Total size: {book.size('inbox', 'human')}")
+    print_list_item(f"Audio files: {book.stats.num_files}")
+    print_list_item(f"Total size: {human_size(book.stats.size)}")
     if book.cover_art_file:
         print_list_item(f"Cover art: {book.cover_art_file.name}")
 
     nl()
 
 
-def convert_book(book: Audiobook):
+def watch_source(book: Audiobook) -> Callable[[], str | None]:
+    """Returns a cheap check for whether the book changed in the inbox since it was copied to the
+    working folder, which says how it changed if so"""
+    journal = BookJournal.read(book.key)
+    expected = journal.hash if journal else hash_path_audio_files(book.inbox_dir)
+
+    def source_changed() -> str | None:
+        if not book.inbox_dir.exists():
+            return "was removed from the inbox"
+        if hash_path_audio_files(book.inbox_dir) != expected:
+            return "was changed in the inbox"
+        return None
+
+    return source_changed
+
+
+def requeue_book(book: Audiobook, reason: str):
+    """Gives up on the current conversion of a book whose files changed, so that it's converted
+    again (from the new files) once it settles"""
+    print_notice(f"This book {reason} while it was being converted, stopping")
+    discard_journal(book)
+    rm_dirs(
+        [book.build_dir, book.merge_dir], ignore_errors=True, even_if_not_empty=True
+    )
+    if book.inbox_dir.exists():
+        smart_print("It will be converted again once it has finished copying")
+        InboxState().set_needs_retry(book)
+
+
+LEASE_LOST = "was taken over by another instance"
+
+
+def still_held(lease: Lease | None) -> bool:
+    """False if another instance took the book over while we were working on it (e.g. our
+    heartbeat stalled long enough for the lease to expire), in which case the book's converted and
+    inbox folders are theirs to deal with now"""
+    if lease and lease.lost:
+        print_notice(f"This book {LEASE_LOST}, leaving it to them")
+        return False
+    return True
+
+
+def convert_book(book: Audiobook, *, passthrough: bool = False, lease: Lease | None = None):
     starttime = time.time()
-    m4btool = M4bTool(book)
+    m4btool = M4bTool(book, passthrough=passthrough)
 
     err: Literal[False] | str = False
 
-    # if book is m4a or m4b, need to pre-extract cover art
-    if book.orig_file_type in ["m4a", "m4b"]:
+    # if book is m4a or m4b (or was already encoded to m4a), need to pre-extract cover art
+    if m4btool.should_copy:
         book.extract_cover_art()
 
     cmd = m4btool.build_cmd()
@@ -619,7 +789,33 @@ def convert_book(book: Audiobook):
     if cfg.DEBUG:
         print_dark_grey(m4btool.esc_cmd())
 
-    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    duration = book.stats.duration if cfg.CONVERT_TIMEOUT_RATIO > 0 else None
+    source_changed = watch_source(book)
+
+    def cancel_if():
+        return LEASE_LOST if lease and lease.lost else source_changed()
+
+    try:
+        proc = aio.run(
+            cmd,
+            kind="encode",
+            watchdog=get_watchdog(
+                [book.build_dir], duration, cancel_if=cancel_if, container=m4btool.container
+            ),
+            limits=get_limits(in_docker=bool(m4btool.container)),
+        )
+    except ProcessCancelled as e:
+        if e.reason == LEASE_LOST:
+            print_notice(f"This book {e.reason} while it was being converted, stopping")
+        else:
+            requeue_book(book, e.reason)
+        return False
+    except ProcessStalled as e:
+        print_error(f"Error: m4b-tool {e.reason}, it was stopped")
+        fail_book(book, reason=f"m4b-tool {e.reason} and was stopped by the watchdog")
+        log_global_results(book, "FAILED", 0)
+        return False
+
     if proc.stderr:
         book.write_log(proc.stderr.decode())
         nl()
@@ -692,9 +888,13 @@ def convert_book(book: Audiobook):
     #         f"{endtime_log}  {book}  Converted in {log_format_elapsed_time(elapsedtime)}\n"
     #     )
 
+    elapsedtime = int(time.time() - starttime)
+    mark_stage(book, "converted", elapsedtime=elapsedtime)
+
     verify_and_update_id3_tags(book, "build")
+    mark_stage(book, "tagged")
 
-    return int(time.time() - starttime)
+    return elapsedtime
 
 
 def move_desc_file(book: Audiobook):
@@ -752,6 +952,7 @@ def move_converted_book_and_extras(book: Audiobook):
         book.converted_dir,
         only_file_exts=AUDIO_EXTS,
         silent_files=[book.build_file.name],
+        drop_cache="dst",
     )
 
     book.set_active_dir("converted")
@@ -829,17 +1030,23 @@ def cleanup_series_dir(parent: InboxItem | None):
         print_mint(" ✓")
 
 
-def archive_inbox_book(book: Audiobook):
+def archive_inbox_book(book: Audiobook, *, duplicate: bool = False):
+    what = "duplicate" if duplicate else "original"
     if cfg.ON_COMPLETE == "test_do_nothing":
-        print_notice("Test mode: The original folder will not be moved or deleted")
+        print_notice(f"Test mode: The {what} folder will not be moved or deleted")
     else:
         if cfg.ON_COMPLETE == "archive":
-            smart_print("\nArchiving original from inbox...", end="")
+            smart_print(f"\nArchiving {what} from inbox...", end="")
+            archive_dir = book.archive_dir
+            if duplicate:
+                archive_dir = archive_dir.with_name(f"{archive_dir.name} (duplicate)")
             mv_dir_contents(
                 book.inbox_dir,
-                book.archive_dir,
+                archive_dir,
                 overwrite_mode="overwrite-silent",
+                drop_cache="dst",
             )
+            get_library().update(archive_dir)
 
             if book.inbox_dir.exists():
                 print_warning(
@@ -851,7 +1058,7 @@ def archive_inbox_book(book: Audiobook):
                 return
 
         elif cfg.ON_COMPLETE == "delete":
-            smart_print("\nDeleting original from inbox...", end="")
+            smart_print(f"\nDeleting {what} from inbox...", end="")
             can_del = is_ok_to_delete(book.inbox_dir)
             if can_del or cfg.BACKUP:
                 rm_dir(book.inbox_dir, ignore_errors=True, even_if_not_empty=True)
@@ -865,8 +1072,12 @@ def archive_inbox_book(book: Audiobook):
         print_mint(" ✓")
 
 
-def process_book(b: int, item: InboxItem):
+def prepare_book(item: InboxItem) -> tuple[Audiobook | None, int]:
+    """Runs all of a book's checks, backs it up and copies it to the working folder. Returns the
+    book if it is ready to convert (or None if it should be skipped), and the number of books
+    that were completed along the way (already-m4b books are handled here)."""
 
+    b = 0
     inbox = InboxState()
     book = item.to_audiobook()
     print_book_header(item)
@@ -875,12 +1086,18 @@ def process_book(b: int, item: InboxItem):
         print_notice(
             f"This book was removed from the inbox or cannot be accessed, skipping"
         )
-        return b
+        return None, b
 
-    # check if the current dir was modified in the last 1m and skip if so
-    if was_recently_modified(book.inbox_dir):
+    # skip books that are still being copied, they'll be picked up once they settle
+    if not item.is_settled:
         print_notice(en.BOOK_RECENTLY_MODIFIED)
-        return b
+        if (eta := item.settles_in) is None:
+            print_debug(f"Still growing at {human_size(item.growth_rate)}/s")
+        else:
+            print_debug(f"Should settle in {human_elapsed_time(eta)}")
+        return None, b
+
+    item.set_dispatched()
 
     if inbox.should_retry(book):
         nl()
@@ -892,48 +1109,107 @@ def process_book(b: int, item: InboxItem):
     if book.is_a(("single", "standalone"), "m4b"):
         b += process_already_m4b(book, item)
         if item.is_gone:
-            return b
+            archive_duplicates(book)
+            return None, b
     else:
         book, item = move_standalone_into_dir(book, item)
 
     if not has_audio_files(book):
-        return b
+        return None, b
 
     if not can_process_multi_dir(book):
-        return b
+        return None, b
 
     if book.is_maybe_series_parent:
-        return b
+        return None, b
 
     if not can_process_roman_numeral_book(book):
-        return b
+        return None, b
 
     flatten_nested_book(book)
     print_book_info(book)
 
-    if not backup_ok(book):
-        return b
-
-    if not ok_to_overwrite(book):
-        return b
+    footprint = estimate_book_footprint(book)
+    if Staging().place(book.key, footprint.merge, footprint.merge + footprint.build):
+        book.reset_paths()
+        print_debug("Staging this book in RAM")
+    if blocked := DiskSpace().reserve(book.key, footprint.less(on_disk(book))):
+        print_notice(
+            "Not enough free space to convert this book right now, it will be retried once there's room:"
+        )
+        for msg in blocked:
+            print_list_item(msg)
+        Staging().release(book.key)
+        item.clear_dispatched()
+        return None, b
+
+    journal = BookJournal.open(book)
+    if journal.stages:
+        print_notice(
+            f"Resuming this book, it was interrupted after {list(journal.stages)[-1].replace('_', ' ')}"
+        )
 
-    inbox.set_ok(book)
+    if not journal.done("backed_up"):
+        if not backup_ok(book):
+            return None, b
+        journal.mark("backed_up")
 
-    copy_to_working_dir(book)
+    # once it's been moved, the converted file is our own and it's fine to overwrite it
+    if not journal.done("moved") and not ok_to_overwrite(book, journal.hash):
+        return None, b
 
-    book.extract_path_info()
-    book.extract_metadata()
+    inbox.set_ok(book)
 
-    clean_dirs([book.build_dir, book.build_tmp_dir])
+    if journal.done("staged") and book.merge_dir.is_dir():
+        book.set_active_dir("merge")
+    else:
+        copy_to_working_dir(book)
+        journal.mark("staged")
+
+    resolve_metadata(book, inbox_hash=journal.hash)
+    journal.mark("metadata")
+    if not journal.done("moved"):
+        print_converted_copies(book)
+
+    if journal.done("converted") or journal.done("moved"):
+        pass
+    elif journal.done("staged"):
+        # m4b-tool picks up where it left off from the files in its tmpfiles folder
+        clean_dir(book.build_dir, keep=[book.build_tmp_dir])
+    else:
+        clean_dirs([book.build_dir, book.build_tmp_dir])
     rm_all_empty_dirs(cfg.merge_dir)
 
     book.set_active_dir("build")
 
     nl()
 
+    return book, b
+
+
+def convert_prepared_book(book: Audiobook, lease: Lease | None = None):
     # TODO: Only handles single m4b output file, not multiple files.
 
-    if (elapsedtime := convert_book(book)) is False:
+    if (journal := BookJournal.read(book.key)) and journal.done("moved"):
+        return int(journal.get("converted", "elapsedtime", 0))
+    if journal and journal.done("converted") and book.build_file.exists():
+        if not journal.done("tagged"):
+            verify_and_update_id3_tags(book, "build")
+            journal.mark("tagged")
+        return int(journal.get("converted", "elapsedtime", 0))
+
+    passthrough = SpeculativeEncoder.is_enabled() and SpeculativeEncoder().use_pieces(
+        book
+    )
+    return convert_book(book, passthrough=passthrough, lease=lease)
+
+
+def finalize_book(b: int, book: Audiobook, elapsedtime: int, lease: Lease | None = None):
+    journal = BookJournal.read(book.key)
+    moved = bool(journal and journal.done("moved"))
+
+    if not moved and (reason := watch_source(book)()):
+        requeue_book(book, reason)
         return b
 
     book.converted_dir.mkdir(parents=True, exist_ok=True)
@@ -944,20 +1220,85 @@ def process_book(b: int, item: InboxItem):
 
     log_global_results(book, "SUCCESS", elapsedtime)
 
-    book.write_description_txt(book.final_desc_file)
-    if not move_converted_book_and_extras(book):
-        return b
+    if moved:
+        book.set_active_dir("converted")
+    else:
+        book.write_description_txt(book.final_desc_file)
+        if not still_held(lease) or not move_converted_book_and_extras(book):
+            return b
+        mark_stage(book, "moved")
+        get_library().update(book.converted_dir, book, journal.hash if journal else "")
 
+    if not still_held(lease):
+        return b
     archive_inbox_book(book)
+    discard_journal(book)
+    discard_metadata(book)
+    archive_duplicates(book)
 
     print_book_done(b, book, elapsedtime)
     rm_dirs(
         [book.build_dir, book.merge_dir], ignore_errors=True, even_if_not_empty=True
     )
+    discard_speculative_pieces(book.basename)
     b += 1
     return b
 
 
+def claim_book(item: InboxItem) -> Lease | None:
+    """Claims the book for this instance, so that other instances sharing the inbox skip it"""
+    leases = get_leases()
+    if not (lease := leases.claim(item.key)):
+        print_debug(
+            f"Skipping {item.key}, it's being converted by {leases.owner_of(item.key) or 'another instance'}"
+        )
+    return lease
+
+
+def read_ahead(item: InboxItem | None):
+    """Starts reading the next book's files into the page cache while the current one converts"""
+    if item and item.path.exists():
+        io_hints.will_need([item.path], limit=int(cfg.READAHEAD_MB) * 1024 * 1024)
+
+
+def print_io_hint_stats():
+    s = io_hints.stats()
+    if s["willneed_files"] or s["dontneed_files"] or s["writeback_files"]:
+        print_debug(
+            f"Page cache hints: read ahead {human_size(s['willneed_bytes'])} in {pluralize_with_count(s['willneed_files'], 'file')}, "
+            f"dropped {human_size(s['dontneed_bytes'])} in {pluralize_with_count(s['dontneed_files'], 'file')}, "
+            f"started writing back {human_size(s['writeback_bytes'])} in {pluralize_with_count(s['writeback_files'], 'file')}"
+        )
+
+
+def process_book(b: int, item: InboxItem, next_item: InboxItem | None = None):
+    if not (lease := claim_book(item)):
+        return b
+
+    try:
+        book, completed = prepare_book(item)
+        b += completed
+        if not book:
+            return b
+
+        read_ahead(next_item)
+        if (elapsedtime := convert_prepared_book(book, lease)) is False:
+            return b
+
+        return finalize_book(b, book, elapsedtime, lease)
+    finally:
+        lease.release()
+
+
+def after_book(item: InboxItem):
+    DiskSpace().release(item.key)
+    Staging().release(item.key)
+    divider("\n", "\n")
+
+    if item.is_maybe_series_book and item.is_last_book_in_series:
+        cleanup_series_dir(item.series_parent)
+
+
 def process_inbox():
     inbox = InboxState()
 
@@ -989,14 +1330,27 @@ def process_inbox():
 
     inbox.start()
 
-    b = 0
-    for item in inbox.matched_ok_books.values():
-        b = process_book(b, item)
-        divider("\n", "\n")
-
-        if item.is_maybe_series_book and item.is_last_book_in_series:
-            cleanup_series_dir(item.series_parent)
+    # nothing is in flight between loops, so drop anything a crashed loop left reserved
+    DiskSpace().release_all()
+    Staging().release_all()
+    # pick up anything added to or removed from the converted and archive folders since last time
+    get_library().refresh()
+    items = set_aside_duplicates(list(inbox.matched_ok_books.values()))
+    items = DiskSpace().fits_first(items)
+    if cfg.PIPELINE:
+        from src.lib.pipeline import BookPipeline
+
+        b = BookPipeline().run(items)
+    else:
+        b = 0
+        for i, item in enumerate(items):
+            b = process_book(b, item, items[i + 1] if i + 1 < len(items) else None)
+            after_book(item)
 
     print_footer(b)
-    clean_dirs([cfg.merge_dir, cfg.build_dir, cfg.trash_dir])
+    print_io_hint_stats()
+    clean_dirs(
+        [cfg.merge_dir, cfg.build_dir, cfg.trash_dir, *Staging().extra_roots()],
+        keep=resumable_dirs(),
+    )
     inbox.done()
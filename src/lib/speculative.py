@@ -0,0 +1,237 @@
+import json
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from functools import cache
+from pathlib import Path
+from typing import Any, cast, TYPE_CHECKING
+
+from src.lib import aio
+from src.lib.config import cfg
+from src.lib.fs_utils import find_files_in_dir, find_first_audio_file
+from src.lib.misc import singleton
+from src.lib.term import print_debug, smart_print
+from src.lib.watchdog import get_limits, get_watchdog
+
+if TYPE_CHECKING:
+    from src.lib.audiobook import Audiobook
+    from src.lib.inbox_item import InboxItem
+
+# files in these formats are merged with --audio-codec=copy anyway, nothing to gain
+PASSTHROUGH_EXTS = [".m4a", ".m4b"]
+
+Target = tuple[int, int]  # (bitrate, samplerate)
+
+
+def speculative_dir(book_name: str) -> Path:
+    return cfg.working_dir / "speculative" / book_name
+
+
+def manifest_file(book_name: str) -> Path:
+    return speculative_dir(book_name) / "manifest.json"
+
+
+def piece_for(book_name: str, rel_path: str | Path) -> Path:
+    return speculative_dir(book_name) / Path(rel_path).with_suffix(".m4a")
+
+
+def fingerprint(f: Path) -> str:
+    st = f.stat()
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def load_manifest(book_name: str) -> dict[str, Any]:
+    try:
+        return json.loads(manifest_file(book_name).read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(book_name: str, manifest: dict[str, Any]):
+    f = manifest_file(book_name)
+    f.parent.mkdir(parents=True, exist_ok=True)
+    tmp = f.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2))
+    tmp.replace(f)
+
+
+def discard(book_name: str):
+    shutil.rmtree(speculative_dir(book_name), ignore_errors=True)
+
+
+@cache
+def aac_encoder() -> str:
+    """Prefers libfdk_aac (what m4b-tool uses) if this ffmpeg was built with it"""
+    encoders = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-encoders"], capture_output=True
+    ).stdout.decode()
+    return "libfdk_aac" if "libfdk_aac" in encoders else "aac"
+
+
+def encode_piece(src: Path, dst: Path, target: Target):
+    bitrate, samplerate = target
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_suffix(".part.m4a")
+    # fmt: off
+    aio.run(
+        [
+            "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+            "-i", src,
+            "-map", "0:a",
+            "-c:a", aac_encoder(),
+            "-b:a", bitrate,
+            "-ar", samplerate,
+            tmp,
+        ],
+        kind="encode",
+        watchdog=get_watchdog([tmp]),
+        limits=get_limits(),
+    ).check_returncode()
+    # fmt: on
+    tmp.replace(dst)
+
+
+def get_target(path: Path) -> Target:
+    from src.lib.ffmpeg_utils import get_bitrate_py, get_samplerate_py
+
+    sample = find_first_audio_file(path)
+    return get_bitrate_py(sample)[0], get_samplerate_py(sample)
+
+
+@singleton
+class SpeculativeEncoder:
+    """Encodes a book's audio files to aac as soon as each one finishes copying into the inbox,
+    so that by the time the whole book has settled, most of the encoding is already done."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(cfg.CPU_CORES // 2, 1), thread_name_prefix="speculative"
+        )
+        self._jobs: dict[Path, tuple[str, Future]] = {}
+        self._sizes: dict[Path, int] = {}
+
+    @staticmethod
+    def is_enabled():
+        return bool(cfg.SPECULATIVE_ENCODE and shutil.which("ffmpeg"))
+
+    def _is_stable(self, f: Path) -> bool:
+        """A file is stable once its size is unchanged since the last time we looked,
+        and it hasn't been modified within WAIT_TIME"""
+        st = f.stat()
+        with self._lock:
+            prev_size, self._sizes[f] = self._sizes.get(f), st.st_size
+        return prev_size == st.st_size and time.time() - st.st_mtime >= cfg.WAIT_TIME
+
+    def speculate(self, item: "InboxItem"):
+        if not item.is_dir or item.is_gone:
+            return
+        files = find_files_in_dir(item.path, resolve=True, only_file_exts=cfg.AUDIO_EXTS)
+        if not files or any(f.suffix in PASSTHROUGH_EXTS for f in files):
+            return
+        stable = [f for f in files if self._is_stable(f)]
+        if find_first_audio_file(item.path) not in stable:
+            # the target bitrate comes from the first file, so wait until it's complete
+            return
+
+        with self._lock:
+            manifest = load_manifest(item.basename)
+            if not manifest.get("target"):
+                manifest = {"target": get_target(item.path), "files": {}}
+                save_manifest(item.basename, manifest)
+            target = cast(Target, tuple(manifest["target"]))
+
+            for f in stable:
+                rel = str(f.relative_to(item.path))
+                fp = fingerprint(f)
+                entry = manifest["files"].get(rel)
+                if entry and entry["fingerprint"] == fp:
+                    continue
+                if (job := self._jobs.get(f)) and job[0] == fp:
+                    continue
+                job = self._pool.submit(
+                    self._encode, item.basename, item.path, rel, fp, target
+                )
+                self._jobs[f] = (fp, job)
+
+    def _encode(self, book_name: str, root: Path, rel: str, fp: str, target: Target):
+        src = root / rel
+        try:
+            encode_piece(src, piece_for(book_name, rel), target)
+        except Exception as e:
+            print_debug(f"Speculative encode failed for {src}: {e}")
+            return
+        finally:
+            with self._lock:
+                self._jobs.pop(src, None)
+        with self._lock:
+            # the file changed while we were encoding it, it'll be picked up on the next poll
+            if not src.exists() or fingerprint(src) != fp:
+                return
+            manifest = load_manifest(book_name)
+            if not manifest:
+                return
+            manifest["files"][rel] = {"fingerprint": fp}
+            save_manifest(book_name, manifest)
+
+    def wait(self, root: Path):
+        with self._lock:
+            futures = [
+                fut for src, (_fp, fut) in self._jobs.items() if src.is_relative_to(root)
+            ]
+        wait(futures)
+
+    def use_pieces(self, book: "Audiobook") -> bool:
+        """Replaces the book's audio files in the merge folder with its speculatively encoded pieces,
+        re-encoding any file that changed since it was encoded. Returns True if the merge folder now
+        contains only pieces, and the book can be merged without re-encoding."""
+        if not self.is_enabled() or not (manifest := load_manifest(book.basename)):
+            return False
+
+        self.wait(book.inbox_dir)
+        manifest = load_manifest(book.basename)
+        files = find_files_in_dir(
+            book.inbox_dir, resolve=True, only_file_exts=cfg.AUDIO_EXTS
+        )
+        target = (book.bitrate_target, book.samplerate)
+        if not files or tuple(manifest.get("target", ())) != target:
+            discard(book.basename)
+            return False
+        if len({f.with_suffix("") for f in files}) < len(files):
+            # e.g. 01.mp3 and 01.wav would both become 01.m4a
+            return False
+
+        stale = [
+            f
+            for f in files
+            if not (entry := manifest["files"].get(str(f.relative_to(book.inbox_dir))))
+            or entry["fingerprint"] != fingerprint(f)
+            or not piece_for(book.basename, f.relative_to(book.inbox_dir)).exists()
+        ]
+        futures = [
+            self._pool.submit(
+                encode_piece,
+                f,
+                piece_for(book.basename, f.relative_to(book.inbox_dir)),
+                target,
+            )
+            for f in stale
+        ]
+        wait(futures)
+        if any(fut.exception() for fut in futures):
+            print_debug("Couldn't encode all pieces, falling back to a full conversion")
+            return False
+
+        for f in files:
+            rel = f.relative_to(book.inbox_dir)
+            (book.merge_dir / rel).unlink(missing_ok=True)
+            shutil.move(
+                piece_for(book.basename, rel), (book.merge_dir / rel).with_suffix(".m4a")
+            )
+
+        smart_print(
+            f"Reusing {len(files) - len(stale)} of {len(files)} files encoded while this book was copying"
+        )
+        return True
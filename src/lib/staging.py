@@ -0,0 +1,106 @@
+import os
+import shutil
+import threading
+from functools import cache
+from pathlib import Path
+from typing import Literal
+
+from src.lib.config import cfg
+from src.lib.misc import singleton
+
+StagingDir = Literal["merge", "build"]
+
+MB = 1024 * 1024
+
+CONVERTED_BUILD_DIRNAME = ".auto-m4b-build"
+
+
+@cache
+def on_same_device(a: Path, b: Path) -> bool:
+    from src.lib.disk_space import existing_parent
+
+    return os.stat(existing_parent(a)).st_dev == os.stat(existing_parent(b)).st_dev
+
+
+@singleton
+class Staging:
+    """Decides where each book's merge and build folders live. Small books are staged in RAM
+    (a tmpfs like /dev/shm) while there's room in the RAM_STAGING_MB budget, so the only disk I/O
+    they cause is reading the inbox and writing the finished m4b. Everything else, and everything
+    when RAM staging is disabled or m4b-tool runs in docker (which only mounts the working
+    folder), is staged in the working folder as usual.
+
+    If BUILD_NEXT_TO_CONVERTED is set and the working folder is on a different disk than the
+    converted folder, books are built in a hidden folder inside the converted folder instead, so
+    that moving the finished m4b into place is a rename rather than a copy."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._placed: dict[str, int] = {}
+
+    @staticmethod
+    def is_enabled():
+        return bool(cfg.RAM_STAGING_MB > 0 and cfg.ram_staging_dir and not cfg.USE_DOCKER)
+
+    @property
+    def used(self) -> int:
+        return sum(self._placed.values())
+
+    def is_in_ram(self, key: str) -> bool:
+        return key in self._placed
+
+    @staticmethod
+    def builds_next_to_converted():
+        return bool(
+            cfg.BUILD_NEXT_TO_CONVERTED
+            and not cfg.USE_DOCKER
+            and not on_same_device(cfg.build_dir, cfg.converted_dir)
+        )
+
+    def root(self, key: str, name: StagingDir) -> Path:
+        if key in self._placed:
+            return cfg.ram_staging_dir / name  # type: ignore
+        if name == "merge":
+            return cfg.merge_dir
+        if self.builds_next_to_converted():
+            return cfg.converted_dir / CONVERTED_BUILD_DIRNAME
+        return cfg.build_dir
+
+    def extra_roots(self) -> list[Path]:
+        """Staging folders in use besides the working folder's merge and build folders"""
+        roots = []
+        if self.is_enabled():
+            roots += [cfg.ram_staging_dir / "merge", cfg.ram_staging_dir / "build"]  # type: ignore
+        if self.builds_next_to_converted():
+            roots += [cfg.converted_dir / CONVERTED_BUILD_DIRNAME]
+        return roots
+
+    def place(self, key: str, size: int, needed: int) -> bool:
+        """Stages the book in RAM if it's small enough (size) and its merge and build folders
+        (needed) fit in what's left of the budget. Returns True if it was placed in RAM."""
+        if not self.is_enabled():
+            return False
+        ram_dir: Path = cfg.ram_staging_dir  # type: ignore
+        with self._lock:
+            if key in self._placed:
+                return True
+            if size > int(cfg.RAM_STAGING_MAX_BOOK_MB) * MB:
+                return False
+            if self.used + needed > int(cfg.RAM_STAGING_MB) * MB:
+                return False
+            try:
+                ram_dir.mkdir(parents=True, exist_ok=True)
+                if shutil.disk_usage(ram_dir).free < needed:
+                    return False
+            except OSError:
+                return False
+            self._placed[key] = needed
+            return True
+
+    def release(self, key: str):
+        with self._lock:
+            self._placed.pop(key, None)
+
+    def release_all(self):
+        with self._lock:
+            self._placed = {}
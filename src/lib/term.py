@@ -1,5 +1,8 @@
 import os
 import re
+import threading
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Any
 
@@ -15,6 +18,7 @@ LAST_LINE_WAS_EMPTY = False
 LAST_LINE_WAS_ALERT = False
 LAST_LINE_ENDS_WITH_NEWLINE = False
 PRINT_LOG: list[tuple[str, str]] = []
+_PRINT_SINK = threading.local()
 
 DEFAULT_COLOR = 0
 GREY_COLOR = Tinta().inspect(name="grey")
@@ -257,7 +261,22 @@ def smart_print(
 
     PRINT_LOG.append((t.to_str(plaintext=True), end))
 
-    t.print(end=end)
+    if sink := getattr(_PRINT_SINK, "fn", None):
+        sink(t, end)
+    else:
+        t.print(end=end)
+
+
+@contextmanager
+def print_to(sink: Callable[[Tinta, str], None]) -> Iterator[None]:
+    """Sends everything smart_print prints on the current thread to sink instead of the console,
+    e.g. to hold a background thread's output until it's its turn to print."""
+    prev = getattr(_PRINT_SINK, "fn", None)
+    _PRINT_SINK.fn = sink
+    try:
+        yield
+    finally:
+        _PRINT_SINK.fn = prev
 
 
 def nl(num_newlines=1):
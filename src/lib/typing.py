@@ -18,6 +18,9 @@ DurationFmt = Literal["seconds", "human"]
 DirName = Literal[
     "inbox", "converted", "archive", "fix", "backup", "build", "merge", "trash"
 ]
+# which side of a copy or move to drop from the page cache once it's done
+DropCache = Literal["src", "dst", "both"] | None
+JournalStage = Literal["backed_up", "staged", "metadata", "converted", "tagged", "moved"]
 FailedBooksDict = dict[str, float]
 BookHashesDict = dict[str, str]
 BookStructure = Literal[
@@ -0,0 +1,224 @@
+import os
+import shutil
+import signal
+import subprocess
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from src.lib.formatters import human_elapsed_time
+
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+IONICE_CLASSES = {"realtime": 1, "best-effort": 2, "idle": 3}
+
+
+class ProcessStalled(subprocess.SubprocessError):
+    """Raised when the watchdog stops an external tool that hung or ran for too long"""
+
+    def __init__(self, cmd: list[str], reason: str):
+        self.cmd = cmd
+        self.reason = reason
+
+    def __str__(self):
+        return f"{Path(self.cmd[0]).name} {self.reason}"
+
+
+class ProcessCancelled(ProcessStalled):
+    """Raised when the watchdog stops an external tool because its work is no longer wanted,
+    e.g. the book it was converting changed in the inbox"""
+
+
+def _read_stat(pid: int) -> list[str] | None:
+    try:
+        stat = Path(f"/proc/{pid}/stat").read_text()
+    except OSError:
+        return None
+    # the command name is in parens and may contain spaces, so split after it
+    return stat[stat.rfind(")") + 2 :].split()
+
+
+def descendants(pid: int) -> list[int]:
+    """All children of pid, their children, etc. Empty if /proc isn't available."""
+    children: dict[int, list[int]] = {}
+    try:
+        pids = [int(p) for p in os.listdir("/proc") if p.isdigit()]
+    except OSError:
+        return []
+    for p in pids:
+        if (stat := _read_stat(p)) is not None:
+            children.setdefault(int(stat[1]), []).append(p)
+    found, todo = [], [pid]
+    while todo:
+        for child in children.get(todo.pop(), []):
+            found.append(child)
+            todo.append(child)
+    return found
+
+
+def cpu_time(pid: int) -> float | None:
+    """Seconds of CPU used by pid and everything it started, including children that have exited.
+    None if /proc isn't available (e.g. macOS)."""
+    if (stat := _read_stat(pid)) is None:
+        return None
+    # utime, stime, cutime, cstime
+    ticks = sum(int(t) for t in stat[11:15])
+    for child in descendants(pid):
+        if child_stat := _read_stat(child):
+            ticks += sum(int(t) for t in child_stat[11:13])
+    return ticks / CLK_TCK
+
+
+def output_size(paths: list[Path]) -> int:
+    size = 0
+    for p in paths:
+        try:
+            if p.is_file():
+                size += p.stat().st_size
+            elif p.is_dir():
+                size += sum(f.stat().st_size for f in p.rglob("*") if f.is_file())
+        except OSError:
+            # files come and go while the tool works
+            continue
+    return size
+
+
+def kill_tree(pid: int):
+    """Kills pid and everything it started, children first so they aren't re-parented and missed"""
+    for p in [*reversed(descendants(pid)), pid]:
+        try:
+            os.kill(p, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+def kill_container(name: str):
+    """Kills a docker container. Killing the docker client that started it leaves it running."""
+    from src.lib.config import cfg
+
+    try:
+        subprocess.run([cfg.docker_path or "docker", "kill", name], capture_output=True)
+    except OSError:
+        pass
+
+
+class Watchdog:
+    """Keeps an eye on a running tool, and says when to give up on it: if it hasn't used any CPU
+    or written to any of the watched paths within stall_timeout seconds, or if it's been running
+    for longer than timeout seconds. If cancel_if is given, it's called on every check, and the
+    tool is cancelled as soon as it returns a reason.
+
+    If the tool runs in a docker container, the pid is the docker client's, so its CPU use says
+    nothing about the tool's and only output counts as progress. Stopping the tool kills the
+    container as well as the client."""
+
+    def __init__(
+        self,
+        *,
+        stall_timeout: float,
+        timeout: float | None = None,
+        watch: list[Path] = [],
+        interval: float = 5,
+        min_cpu: float = 0.05,
+        cancel_if: Callable[[], str | None] | None = None,
+        container: str | None = None,
+    ):
+        self.stall_timeout = stall_timeout
+        self.timeout = timeout
+        self.watch = watch
+        self.interval = interval
+        # idle tools still poll their children now and then, so a trickle of CPU isn't progress
+        self.min_cpu = min_cpu
+        self.cancel_if = cancel_if
+        self.container = container
+        self.cancelled = False
+        self.started = time.monotonic()
+        self.last_progress = self.started
+        self._cpu: float | None = None
+        self._size = -1
+        self._sampled_at = self.started
+
+    def check(self, pid: int) -> str | None:
+        """Returns why the tool should be stopped, or None if it's still making progress"""
+        if self.cancel_if and (reason := self.cancel_if()):
+            self.cancelled = True
+            return reason
+
+        now = time.monotonic()
+        if self.timeout and now - self.started > self.timeout:
+            return f"was still running after {human_elapsed_time(self.timeout)}"
+
+        cpu, size = None if self.container else cpu_time(pid), output_size(self.watch)
+        cpu_used = (cpu or 0) - (self._cpu if self._cpu is not None else (cpu or 0))
+        if size != self._size or cpu_used >= self.min_cpu * (now - self._sampled_at):
+            self.last_progress = now
+        self._cpu, self._size, self._sampled_at = cpu, size, now
+
+        if now - self.last_progress > self.stall_timeout:
+            return f"made no progress for {human_elapsed_time(self.stall_timeout)}"
+        return None
+
+    def stop(self, pid: int):
+        """Kills the tool and everything it started"""
+        if self.container:
+            kill_container(self.container)
+        kill_tree(pid)
+
+
+class ProcLimits(NamedTuple):
+    """Keeps conversions from starving anything else running on the same machine. max_memory_mb
+    limits the tool's address space; nice and ionice lower its CPU and disk priority.
+
+    The limits are applied by prefixing the command with ionice, nice and prlimit, rather than in
+    a preexec_fn, which isn't safe to use from a process that runs other threads."""
+
+    nice: int = 0
+    max_memory_mb: int = 0
+    ionice: str = ""
+
+    def wrap(self, cmd: list[Any]) -> list[Any]:
+        prefix: list[Any] = []
+        if (cls := IONICE_CLASSES.get(self.ionice)) and shutil.which("ionice"):
+            prefix += ["ionice", "-c", cls]
+        if self.nice and shutil.which("nice"):
+            prefix += ["nice", "-n", self.nice]
+        if self.max_memory_mb and shutil.which("prlimit"):
+            prefix += ["prlimit", f"--as={self.max_memory_mb * 1024 * 1024}"]
+        return [*prefix, *cmd]
+
+
+def get_limits(in_docker: bool = False) -> ProcLimits:
+    """Limits only apply to processes we start. A tool in a docker container is started by the
+    docker daemon, not by the docker client we run, so nothing is limited there."""
+    from src.lib.config import cfg
+
+    if in_docker:
+        return ProcLimits()
+    return ProcLimits(
+        nice=int(cfg.CONVERT_NICE),
+        max_memory_mb=int(cfg.CONVERT_MAX_MEMORY_MB),
+        ionice=cfg.CONVERT_IONICE,
+    )
+
+
+def get_watchdog(
+    watch: list[Path],
+    duration: float | None = None,
+    interval: float = 5,
+    cancel_if: Callable[[], str | None] | None = None,
+    container: str | None = None,
+) -> Watchdog:
+    """A watchdog for a conversion, with a timeout proportional to the audio's duration (if known)"""
+    from src.lib.config import cfg
+
+    timeout = None
+    if duration and cfg.CONVERT_TIMEOUT_RATIO > 0:
+        timeout = max(duration * cfg.CONVERT_TIMEOUT_RATIO, cfg.CONVERT_STALL_TIMEOUT)
+    return Watchdog(
+        stall_timeout=cfg.CONVERT_STALL_TIMEOUT,
+        timeout=timeout,
+        watch=watch,
+        interval=interval,
+        cancel_if=cancel_if,
+        container=container,
+    )
@@ -0,0 +1,52 @@
+import asyncio
+import subprocess
+import time
+
+import pytest
+
+from src.lib import aio
+
+
+def test_run_returns_completed_process():
+    proc = aio.run(["sh", "-c", "echo out; echo err >&2; exit 3"])
+    assert proc.returncode == 3
+    assert proc.stdout == b"out\n"
+    assert proc.stderr == b"err\n"
+    with pytest.raises(subprocess.CalledProcessError):
+        proc.check_returncode()
+
+
+def test_run_timeout_kills_process():
+    start = time.time()
+    with pytest.raises(subprocess.TimeoutExpired):
+        aio.run(["sleep", "5"], timeout=0.2)
+    assert time.time() - start < 2
+
+
+def test_probes_run_concurrently_up_to_limit():
+    limit = aio._limits()["probe"]
+
+    async def sleep_all(n: int):
+        await asyncio.gather(
+            *(aio.run_async(["sleep", "0.3"], kind="probe") for _ in range(n))
+        )
+
+    start = time.time()
+    aio.run_sync(sleep_all(limit))
+    assert time.time() - start < 0.3 * 2
+
+    # one more than the limit has to wait for a free slot
+    start = time.time()
+    aio.run_sync(sleep_all(limit + 1))
+    assert time.time() - start >= 0.3 * 2
+
+
+def test_poll_until():
+    calls = []
+
+    def done():
+        calls.append(1)
+        return len(calls) == 3
+
+    assert aio.poll_until(done, interval=0.01) == 2
+    assert len(calls) == 3
@@ -0,0 +1,119 @@
+import time
+
+import pytest
+
+from src.lib import audiobook as audiobook_module
+from src.lib import ffmpeg_utils
+from src.lib.audiobook import Audiobook
+from src.lib.config import cfg
+from src.lib.staging import Staging
+from src.tests.helpers.pytest_dirs import MOCKED
+
+PATH_PROPS = ["backup_dir", "build_dir", "converted_dir", "archive_dir", "merge_dir"]
+
+
+def test_paths_are_resolved_once(mock_inbox, monkeypatch: pytest.MonkeyPatch):
+    roots = []
+    root = Staging.root
+    monkeypatch.setattr(
+        Staging, "root", lambda self, *a: roots.append(a) or root(self, *a)
+    )
+    book = Audiobook(MOCKED.flat_dir1)
+    first = {p: getattr(book, p) for p in PATH_PROPS}
+    assert len(roots) == 2
+
+    assert {p: getattr(book, p) for p in PATH_PROPS} == first
+    assert len(roots) == 2
+
+    book.set_active_dir("merge")
+    assert {p: getattr(book, p) for p in PATH_PROPS} == first
+    assert len(roots) == 4
+
+
+def test_found_outputs_are_remembered(
+    mock_inbox, tmp_path, monkeypatch: pytest.MonkeyPatch
+):
+    book = Audiobook(MOCKED.flat_dir1)
+    monkeypatch.setattr(type(cfg), "PLEX_FORMAT", False)
+    monkeypatch.setattr(Audiobook, "converted_dir", property(lambda _: tmp_path))
+    assert book.converted_file == tmp_path / f"{book.basename}.m4b"
+
+    (tmp_path / "book.m4b").touch()
+    searches = []
+    find = audiobook_module.find_first_audio_file
+    monkeypatch.setattr(
+        audiobook_module,
+        "find_first_audio_file",
+        lambda *a, **kw: searches.append(a) or find(*a, **kw),
+    )
+    assert book.converted_file == tmp_path / "book.m4b"
+    assert book.converted_file == tmp_path / "book.m4b"
+    assert len(searches) == 1
+
+    book.reset_paths()
+    assert book.converted_file == tmp_path / "book.m4b"
+    assert len(searches) == 2
+
+
+def test_stats_are_probed_once(
+    mock_inbox, tmp_path, monkeypatch: pytest.MonkeyPatch
+):
+    from src.lib.logger import log_global_results
+
+    probes = []
+
+    def fake_probe_all(files):
+        probes.append(files)
+        return [
+            {"format": {"duration": "60.0"}, "streams": [{"bit_rate": "64000"}]}
+            for _ in files
+        ]
+
+    monkeypatch.setattr(ffmpeg_utils.aio, "probe_all", fake_probe_all)
+    monkeypatch.setattr(ffmpeg_utils, "get_bitrate_py", lambda f: (64000, 64000))
+    monkeypatch.setattr(ffmpeg_utils, "get_samplerate_py", lambda f: 44100)
+
+    book = Audiobook(MOCKED.flat_dir1)
+    assert book.stats.num_files == 3
+    assert book.stats.duration == 180
+    assert book.stats.bitrates == (64000, 64000, 64000)
+    assert book.duration("inbox", "human") == "0h:03m:00s"
+    assert book.bitrate_friendly == "64 kb/s"
+    assert book.samplerate_friendly == "44.1 kHz"
+
+    log_file = tmp_path / "auto-m4b.log"
+    log_global_results(book, "SUCCESS", 10, log_file=log_file)
+    assert "3 files" in log_file.read_text()
+    assert len(probes) == 1
+
+
+@pytest.mark.slow
+def test_benchmark_path_access(mock_inbox, monkeypatch: pytest.MonkeyPatch):
+    # roughly how often a book's folders are looked up while it's processed
+    rounds = 2000
+    roots = []
+    root = Staging.root
+    monkeypatch.setattr(
+        Staging, "root", lambda self, *a: roots.append(a) or root(self, *a)
+    )
+    book = Audiobook(MOCKED.flat_dir1)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        book.reset_paths()
+        for p in PATH_PROPS:
+            getattr(book, p)
+    uncached_time = time.perf_counter() - start
+    assert len(roots) == rounds * 2
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for p in PATH_PROPS:
+            getattr(book, p)
+    cached_time = time.perf_counter() - start
+    assert len(roots) == rounds * 2
+
+    print(
+        f"Looked up {len(PATH_PROPS) * rounds} book folders: "
+        f"{uncached_time:.3f}s resolving each time, {cached_time:.3f}s resolved once"
+    )
@@ -0,0 +1,83 @@
+import shutil
+from collections import namedtuple
+
+import pytest
+
+from src.lib import disk_space
+from src.lib.audiobook import Audiobook
+from src.lib.config import cfg
+from src.lib.disk_space import DiskSpace, estimate_footprint, Footprint, on_disk
+
+MB = 1024 * 1024
+Usage = namedtuple("Usage", ["total", "used", "free"])
+
+
+@pytest.fixture(scope="function")
+def disk(monkeypatch: pytest.MonkeyPatch):
+    free = {"bytes": 100 * MB}
+    monkeypatch.setattr(
+        disk_space.shutil,
+        "disk_usage",
+        lambda path: Usage(1000 * MB, 1000 * MB - free["bytes"], free["bytes"]),
+    )
+    monkeypatch.setattr(cfg, "MIN_FREE_SPACE_MB", 0)
+    DiskSpace.destroy()
+    yield free
+    DiskSpace.destroy()
+
+
+def test_estimate_footprint(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(cfg, "BACKUP", True)
+    assert estimate_footprint(10 * MB, 0.5) == Footprint(
+        backup=10 * MB, merge=10 * MB, build=10 * MB, converted=5 * MB
+    )
+    monkeypatch.setattr(cfg, "BACKUP", False)
+    assert estimate_footprint(10 * MB).backup == 0
+
+
+def test_reserve_counts_other_books(disk):
+    ds = DiskSpace()
+    # all working folders are on the same (mocked) disk, so 60MB + 60MB won't fit in 100MB
+    fp = Footprint(merge=30 * MB, build=30 * MB)
+    assert ds.reserve("book1", fp) == []
+    blocked = ds.reserve("book2", fp)
+    assert len(blocked) == 1
+    assert "is needed in" in blocked[0]
+
+    ds.release("book1")
+    assert ds.reserve("book2", fp) == []
+
+
+class Item(namedtuple("Item", ["key", "size"])):
+    def to_audiobook(self):
+        return Audiobook(cfg.inbox_dir / self.key)
+
+
+def test_fits_first_keeps_order(disk):
+    items = [Item("big", 80 * MB), Item("small1", 1 * MB), Item("small2", 2 * MB)]
+    assert [i.key for i in DiskSpace().fits_first(items)] == ["small1", "small2", "big"]  # type: ignore
+
+    disk["bytes"] = 1000 * MB
+    assert [i.key for i in DiskSpace().fits_first(items)] == ["big", "small1", "small2"]  # type: ignore
+
+
+def test_on_disk_is_not_counted_again(disk, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(cfg, "BACKUP", False)
+    book = Audiobook(cfg.inbox_dir / "resumed")
+    book.merge_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        (book.merge_dir / "part_1.mp3").write_bytes(b"a" * 10 * MB)
+        disk["bytes"] = 35 * MB
+        assert on_disk(book) == Footprint(merge=10 * MB)
+
+        # the merge copy is already on disk, only the build and converted book still need room
+        fp = estimate_footprint(10 * MB)
+        assert fp.less(on_disk(book)) == Footprint(build=20 * MB, converted=10 * MB)
+        assert DiskSpace().reserve(book.key, fp)
+        assert DiskSpace().reserve(book.key, fp.less(on_disk(book))) == []
+        DiskSpace().release(book.key)
+
+        items = [Item("big", 15 * MB), Item("resumed", 10 * MB)]
+        assert [i.key for i in DiskSpace().fits_first(items)] == ["resumed", "big"]  # type: ignore
+    finally:
+        shutil.rmtree(book.merge_dir, ignore_errors=True)
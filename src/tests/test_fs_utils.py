@@ -14,6 +14,9 @@ from src.lib.fs_utils import (
     find_cover_art_file,
     find_first_audio_file,
     find_next_audio_file,
+    fingerprint_audio_files,
+    get_book_layout,
+    hash_path_audio_files,
 )
 from src.lib.misc import isorted, re_group
 from src.lib.typing import BookStructure
@@ -79,6 +82,43 @@ def test_find_book_audio_files(
     assert structure == expected_structure
 
 
+def test_book_layout_is_cached_until_files_change(mock_inbox, setup_teardown):
+    book_hash = hash_path_audio_files(MOCKED.multi_disc_dir)
+    layout = get_book_layout(MOCKED.multi_disc_dir, book_hash)
+
+    assert layout.structure == "multi_disc"
+    assert layout.num_files == sum(len(files) for _d, files in layout.file_map)  # type: ignore
+    assert layout.sample_audio1 == find_first_audio_file(MOCKED.multi_disc_dir)
+    assert layout.sample_audio2 == find_next_audio_file(layout.sample_audio1)  # type: ignore
+    assert layout.size == sum(f.stat().st_size for f in layout.files)
+    assert get_book_layout(MOCKED.multi_disc_dir, book_hash) is layout
+
+    # adding an audio file changes the book's hash, so its layout is worked out again
+    extra = next(iter(layout.files)).parent / "extra.mp3"
+    extra.write_text("a" * 1024)
+    new_hash = hash_path_audio_files(MOCKED.multi_disc_dir)
+    assert new_hash != book_hash
+    assert get_book_layout(MOCKED.multi_disc_dir, new_hash).num_files == layout.num_files + 1
+
+
+def test_book_layout_does_not_rehash_known_books(mock_inbox, setup_teardown, monkeypatch):
+    from src.lib import fs_utils
+    from src.lib.inbox_state import InboxState
+
+    InboxState().scan()
+    book = Audiobook(MOCKED.multi_disc_dir)
+    assert book.layout.structure == "multi_disc"
+
+    hashed = []
+    monkeypatch.setattr(
+        fs_utils, "hash_path_audio_files", lambda *a, **kw: hashed.append(a) or ""
+    )
+    for _ in range(3):
+        assert find_book_audio_files(MOCKED.multi_disc_dir)[0] == "multi_disc"
+        assert book.layout.structure == "multi_disc"
+    assert not hashed
+
+
 @pytest.mark.parametrize(
     "name, kwargs, expected",
     [
@@ -478,3 +518,26 @@ def test_find_cover_art_file_ignores_too_small_files(
     )
 
     assert bool(find_cover_art_file(tmp_path)) == is_valid
+
+
+def test_fingerprint_audio_files_ignores_names_but_not_content(tmp_path: Path):
+    def make_book(name: str, contents: list[bytes]) -> Path:
+        d = tmp_path / name
+        d.mkdir()
+        for i, content in enumerate(contents):
+            (d / f"{name} - {i}.mp3").write_bytes(content)
+        return d
+
+    big = random.randbytes(1024 * 1024)
+    book = make_book("book", [big, b"b" * 5000])
+    renamed = make_book("renamed", [big, b"b" * 5000])
+    # same names and sizes as book, but different audio in the middle of the big file
+    changed = big[: len(big) // 2] + bytes(1) + big[len(big) // 2 + 1 :]
+    other = tmp_path / "other"
+    shutil.copytree(book, other)
+    (other / "book - 0.mp3").write_bytes(changed)
+
+    fingerprint = fingerprint_audio_files(sorted(book.iterdir()))
+    assert fingerprint_audio_files(sorted(renamed.iterdir())) == fingerprint
+    assert hash_path_audio_files(other) == hash_path_audio_files(book)
+    assert fingerprint_audio_files(sorted(other.iterdir())) != fingerprint
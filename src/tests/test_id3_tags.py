@@ -1,14 +1,36 @@
+import builtins
+import re
+import shutil
+import time
 from collections.abc import Callable
+from pathlib import Path
+from types import SimpleNamespace
 
 import pytest
 from mutagen.mp3 import HeaderNotFoundError
+from mutagen.mp4 import MP4
 
+from src.lib import id3_utils
 from src.lib.audiobook import Audiobook
-from src.lib.id3_utils import extract_id3_tags, map_kid3_keys, write_id3_tags_mutagen
+from src.lib.id3_utils import (
+    BaseScoreCard,
+    DateScoreCard,
+    diff_m4b_tags,
+    extract_id3_tags,
+    map_kid3_keys,
+    MetadataScore,
+    similarity_matrix,
+    similarity_score,
+    SimilarityScores,
+    TitleScoreCard,
+    update_m4b_tags,
+    write_id3_tags_mutagen,
+)
 from src.lib.misc import increment
 from src.lib.parsers import (
     has_graphic_audio,
 )
+from src.tests.helpers.pytest_dirs import TEST_DIRS
 from src.tests.helpers.pytest_utils import testutils
 
 
@@ -410,3 +432,218 @@ def test_parse_id3_narrator(
 
     book = Audiobook(blank_audiobook.sample_audio1).extract_metadata()
     assert book.narrator == expected_narrator
+
+
+ID3_FIELDS = ["title", "artist", "albumartist", "album", "sortalbum", "date", "comment", "composer"]
+
+SCORING_CASES = [
+    {"comment": "Written by Sarah J. Maas - Performed by Melody Muze as Feyre"},
+    {
+        "artist": "Sarah J. Maas",
+        "albumartist": "Melody Muze",
+        "title": "ACoFaS pt 1",
+        "album": "A Court of Thorns and Roses: A Court of Frost and Starlight",
+    },
+    {"artist": "Melody Muze", "albumartist": "Sarah J. Maas", "comment": ""},
+    {"artist": "James Allen/Andrew Farell (Narrator)", "comment": ""},
+    {"comment": "Read by Nicola Barber; Unabr", "date": "2023-10-22"},
+    {
+        "artist": "H. D. Carlton",
+        "composer": "Teddy Hamilton, Michelle Sparks",
+        "title": "Haunting Adeline",
+        "sortalbum": "Haunting Adeline",
+    },
+    {"artist": "GraphicAudio", "albumartist": "Brandon Sanderson", "title": "01"},
+]
+
+
+def fake_book(tags: dict[str, str]):
+    return SimpleNamespace(
+        basename="Sarah J. Maas - A Court of Frost and Starlight (2018)",
+        sample_audio1=Path("01 - part 1.mp3"),
+        sample_audio2=Path("02 - part 2.mp3"),
+        **{f"id3_{k}": tags.get(k, "") for k in ID3_FIELDS},
+    )
+
+
+def reflected_is_likely(card: BaseScoreCard):
+    """How the best source used to be found, by searching the card's attributes"""
+    rep = re.compile(rf"_(is|contains)_{card._prop}$")
+    scores = [
+        (re.sub(rep, "", p), getattr(card, p), p)
+        for p in dir(card)
+        if not p.startswith("_")
+        and p.endswith(card._prop)
+        and isinstance(getattr(card, p), int)
+    ]
+    if not scores or all(score[1] <= 0 for score in scores):
+        return "unknown", 0, None
+    return max(scores, key=lambda x: x[1])
+
+
+def score_book(tags: dict[str, str]) -> MetadataScore:
+    second = {k: v for k, v in tags.items() if k != "title"}
+    score = MetadataScore(fake_book(tags), second)  # type: ignore
+    score.determine_title()
+    score.determine_author()
+    score.determine_narrator()
+    score.determine_date()
+    return score
+
+
+def test_score_tables():
+    assert DateScoreCard._table == (("date", "date_is_date"), ("fs", "fs_contains_date"))
+    assert [source for source, _ in TitleScoreCard._table] == sorted(TitleScoreCard.props)
+
+
+@pytest.mark.parametrize("tags", SCORING_CASES)
+def test_score_table_matches_reflection(tags: dict[str, str]):
+    score = score_book(tags)
+    for card in (score.title, score.author, score.narrator, score.date):
+        assert card._is_likely == reflected_is_likely(card)
+        card.reset()
+        assert all(getattr(card, attr) == 0 for _source, attr in card._table)
+
+
+@pytest.mark.slow
+def test_benchmark_score_table(monkeypatch: pytest.MonkeyPatch):
+    rounds = 200
+    scores = [score_book(tags) for tags in SCORING_CASES]
+    cards = [c for s in scores for c in (s.title, s.author, s.narrator, s.date)]
+
+    # searching a card's attributes is what the table saves, so count the searches
+    searches: list[object] = []
+    real_dir = builtins.dir
+    monkeypatch.setattr(builtins, "dir", lambda o: searches.append(o) or real_dir(o))
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for card in cards:
+            reflected_is_likely(card)
+    reflected_time = time.perf_counter() - start
+    assert len(searches) == rounds * len(cards)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for card in cards:
+            card._is_likely
+    table_time = time.perf_counter() - start
+    assert len(searches) == rounds * len(cards)
+
+    print(
+        f"Picked the best source for {len(cards) * rounds} score cards: "
+        f"{reflected_time:.3f}s by reflection, {table_time:.3f}s from the table"
+    )
+
+
+SIMILARITY_STRINGS = [
+    "",
+    "a court of frost and starlight",
+    "sarah j. maas - a court of frost and starlight (2018)/01 - part 1.mp3",
+    "acofas pt 1",
+    "sarah j. maas",
+    "melody muze",
+    "Sarah J. Maas",
+    "01",
+    "brandon sanderson",
+]
+
+
+def test_similarity_matrix_matches_similarity_score():
+    matrix = similarity_matrix(SIMILARITY_STRINGS, SIMILARITY_STRINGS[::-1])
+    assert matrix.shape == (len(SIMILARITY_STRINGS), len(SIMILARITY_STRINGS))
+    for i, s1 in enumerate(SIMILARITY_STRINGS):
+        for j, s2 in enumerate(SIMILARITY_STRINGS[::-1]):
+            assert matrix[i, j] == similarity_score(s1, s2), (s1, s2)
+
+
+def test_similarity_scores_lookup():
+    pairs = [(s1, s2) for s1 in SIMILARITY_STRINGS for s2 in SIMILARITY_STRINGS]
+    # enough pairs to be scored in one batch, and few enough to be scored one at a time
+    for sim in (SimilarityScores(pairs), SimilarityScores(pairs[-3:])):
+        assert [sim(s1, s2) for s1, s2 in pairs] == [
+            similarity_score(s1, s2) for s1, s2 in pairs
+        ]
+
+    # pairs without a query, or without a choice, aren't scored up front
+    sim = SimilarityScores([*pairs, ("01", None), (None, "01")])
+    assert len(sim) == len(pairs) - len(SIMILARITY_STRINGS)
+    assert ("", "01") not in sim
+    # but they're still scored if they're compared anyway
+    assert ("james allen", "01") not in sim
+    assert sim("james allen", "01") == similarity_score("james allen", "01")
+    assert len(SimilarityScores([])) == 0
+
+
+@pytest.mark.slow
+def test_benchmark_similarity_scores(monkeypatch: pytest.MonkeyPatch):
+    rounds = 50
+    scored: list[tuple[str, str]] = []
+    score = id3_utils.similarity_score
+    monkeypatch.setattr(
+        id3_utils, "similarity_score", lambda s1, s2: scored.append((s1, s2)) or score(s1, s2)
+    )
+    # whether each comparison the scorecards make was scored up front
+    looked_up: list[bool] = []
+    lookup = SimilarityScores.__call__
+    monkeypatch.setattr(
+        SimilarityScores,
+        "__call__",
+        lambda self, s1, s2: looked_up.append((s1, s2) in self) or lookup(self, s1, s2),
+    )
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for tags in SCORING_CASES:
+            score_book(tags)
+    batched_time = time.perf_counter() - start
+    assert looked_up and all(looked_up)
+
+    # how the pairs used to be scored, one comparison at a time
+    monkeypatch.setattr(
+        SimilarityScores, "__init__", lambda self, pairs: setattr(self, "_scores", {})
+    )
+    scored.clear()
+    looked_up.clear()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for tags in SCORING_CASES:
+            score_book(tags)
+    pairwise_time = time.perf_counter() - start
+    assert not any(looked_up)
+    assert len(scored) == len(looked_up)
+
+    print(
+        f"Scored {len(SCORING_CASES) * rounds} books: {pairwise_time:.3f}s one comparison at a "
+        f"time, {batched_time:.3f}s with each book's pairs scored up front"
+    )
+
+
+def test_update_m4b_tags_writes_only_changed_atoms(tmp_path: Path):
+    m4b = tmp_path / "book.m4b"
+    shutil.copy(TEST_DIRS.fixtures / "basic_no_cover__standalone_m4b.m4b", m4b)
+    cover = tmp_path / "cover.jpg"
+    cover.write_bytes(b"\xff\xd8\xff\xe0")
+    book = SimpleNamespace(
+        title="Album",
+        author="Author",
+        narrator="Narrator",
+        date="1970",
+        comment="comment",
+        artist="Author",
+        albumartist="Author",
+        album="Album",
+        composer="Narrator",
+        track_num=(1, 1),
+    )
+
+    updates = update_m4b_tags(m4b, book, cover)  # type: ignore
+    assert [(u.atom, u.current, u.expected) for u in updates] == [
+        ("\xa9wrt", "Author", "Narrator"),
+        ("covr", None, "cover.jpg"),
+    ]
+    f = MP4(m4b)
+    assert f["\xa9wrt"] == ["Narrator"]
+    assert bytes(f["covr"][0]) == cover.read_bytes()
+    assert f["\xa9nrt"] == ["Author"]  # untouched
+    assert diff_m4b_tags(f, book, cover) == []  # type: ignore
@@ -1,8 +1,18 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
 import pytest
 
 from src.lib.audiobook import Audiobook
 from src.lib.fs_utils import hash_path_audio_files
+from src.lib.hasher import Hasher
+from src.lib.inbox_item import InboxItem
 from src.lib.inbox_state import InboxState
+from src.tests.helpers.pytest_dirs import MOCKED
+from src.tests.helpers.pytest_utils import testutils
 
 
 class TestInboxState:
@@ -49,3 +59,180 @@ class TestInboxState:
         # books = Chanur_Series[1:]
         key1 = "Chanur Series/01 - Pride Of Chanur"
         assert reset_inbox_state.get(key1).series_parent == series._inbox_item
+
+    def test_concurrent_status_transitions(
+        self,
+        mock_inbox,
+        reset_inbox_state: InboxState,
+    ):
+        inbox = reset_inbox_state
+        keys = [d.name for d in MOCKED.flat_dirs]
+        num_items = len(inbox)
+        errors: list[Exception] = []
+
+        def hammer(i: int):
+            try:
+                for n in range(40):
+                    key = keys[(i + n) % len(keys)]
+                    match n % 4:
+                        case 0:
+                            inbox.set_failed(key, f"failed by thread {i}")
+                        case 1:
+                            inbox.set_needs_retry(key)
+                        case 2:
+                            inbox.set_ok(key)
+                        case _:
+                            assert inbox.get(key)
+                    # iterate while other threads are mutating
+                    inbox.failed_books
+                    inbox.matched_ok_books
+                    list(inbox)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=hammer, args=(i,)) for i in range(16)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert not errors
+        assert len(inbox) == num_items
+        for key in keys:
+            item = inbox.get(key)
+            assert item
+            assert item.status in ["ok", "needs_retry", "failed"]
+        # the env mirror of failed books must match the final state exactly
+        assert set(json.loads(os.environ["FAILED_BOOKS"])) == set(inbox.failed_books)
+
+    def test_hasher_scan_is_thread_safe(self, mock_inbox):
+        hasher = Hasher(MOCKED.flat_dir1)
+
+        def scan():
+            for _ in range(20):
+                hasher.scan()
+
+        threads = [threading.Thread(target=scan) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for i in range(5):
+            testutils.make_mock_file(MOCKED.flat_dir1 / f"mock_book_1 - extra_{i}.mp3")
+        for t in threads:
+            t.join()
+        hasher.scan()
+
+        hashes = [h for h, _ in hasher._hashes]
+        assert hashes[0] == hash_path_audio_files(MOCKED.flat_dir1)
+        # a hash is never recorded twice in a row
+        assert all(a != b for a, b in zip(hashes, hashes[1:]))
+
+    def test_get_item_by_hash_or_path_does_not_rehash(
+        self,
+        mock_inbox,
+        reset_inbox_state: InboxState,
+        monkeypatch: pytest.MonkeyPatch,
+    ):
+        inbox = reset_inbox_state
+        item = inbox.get(MOCKED.flat_dir1.name)
+        assert item
+        curr_hash = item._curr_hash
+
+        def fail(*args, **kwargs):
+            raise AssertionError("get() should not hash anything on disk")
+
+        monkeypatch.setattr("src.lib.inbox_item.hash_path_audio_files", fail)
+        assert inbox.get(curr_hash) is item
+        assert inbox.get(MOCKED.flat_dir1) is item
+        assert inbox.get(str(MOCKED.flat_dir1)) is item
+        assert inbox.get("not-a-real-hash") is None
+
+    def test_hash_index_follows_item_changes(
+        self, mock_inbox, reset_inbox_state: InboxState
+    ):
+        inbox = reset_inbox_state
+        item = inbox.get(MOCKED.flat_dir1.name)
+        assert item
+        old_hash = item._curr_hash
+
+        testutils.make_mock_file(MOCKED.flat_dir1 / "mock_book_1 - extra.mp3")
+        new_hash = item.hash
+        assert new_hash != old_hash
+        assert inbox.get(new_hash) is item
+        assert inbox.get(old_hash) is None
+
+        item.set_gone()
+        assert inbox.get(new_hash) is None
+        assert inbox.get(MOCKED.flat_dir1.name) is item
+
+        inbox.rm(item.key)
+        assert inbox.get(MOCKED.flat_dir1) is None
+
+    def test_scan_only_builds_items_for_new_paths(
+        self,
+        mock_inbox,
+        reset_inbox_state: InboxState,
+        monkeypatch: pytest.MonkeyPatch,
+    ):
+        inbox = reset_inbox_state
+        num_items = len(inbox)
+        built: list[InboxItem] = []
+
+        class CountingInboxItem(InboxItem):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                built.append(self)
+
+        monkeypatch.setattr("src.lib.inbox_state.InboxItem", CountingInboxItem)
+
+        inbox._last_scan = 0
+        inbox.scan()
+        assert not built
+
+        testutils.make_mock_file(Path("mock_book_new") / "mock_book_new.mp3")
+        inbox._last_scan = 0
+        inbox.scan()
+        assert [item.key for item in built] == ["mock_book_new"]
+        assert len(inbox) == num_items + 1
+        # size is computed lazily, and only once
+        assert built[0]._size is None
+        assert built[0].size == 1024 * 5
+
+    def test_books_settle_independently(
+        self, mock_inbox, reset_inbox_state: InboxState, reset_match_filter
+    ):
+        inbox = reset_inbox_state
+        inbox.set_match_filter(None)
+        long_ago = time.time() - 3600
+        for f in MOCKED.flat_dir1.rglob("*"):
+            os.utime(f, (long_ago, long_ago))
+        os.utime(MOCKED.flat_dir1, (long_ago, long_ago))
+
+        inbox.poll_books()
+        settled = inbox.get(MOCKED.flat_dir1.name)
+        uploading = inbox.get(MOCKED.flat_dir2.name)
+        assert settled and uploading
+
+        # simulate a book that is still being copied with preserved (old) mtimes
+        for f in MOCKED.flat_dir2.rglob("*"):
+            os.utime(f, (long_ago, long_ago))
+        os.utime(MOCKED.flat_dir2, (long_ago, long_ago))
+        big_file = MOCKED.flat_dir2 / "mock_book_2 - part_1.mp3"
+        testutils.make_mock_file(big_file, size=1024 * 50)
+        os.utime(big_file, (long_ago, long_ago))
+        inbox.poll_books()
+
+        assert settled.is_settled
+        assert not uploading.is_settled
+        assert uploading.growth_rate > 0
+        assert uploading.settles_in is None
+        assert MOCKED.flat_dir1.name in inbox.ready_books
+        assert MOCKED.flat_dir2.name in inbox.settling_books
+
+        # once dispatched, a book isn't ready again until it changes
+        settled.set_dispatched()
+        assert MOCKED.flat_dir1.name not in inbox.ready_books
+
+        # the upload finishes, and the book settles on the next poll
+        inbox.poll_books()
+        assert uploading.is_settled
+        assert MOCKED.flat_dir2.name in inbox.ready_books
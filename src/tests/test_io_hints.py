@@ -0,0 +1,59 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from src.lib import io_hints
+from src.lib.config import cfg
+from src.lib.fs_utils import cp_dir_contents
+
+pytestmark = pytest.mark.skipif(not io_hints.HAS_FADVISE, reason="needs posix_fadvise")
+
+
+@pytest.fixture(scope="function")
+def book_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(cfg, "IO_HINTS", True)
+    io_hints.reset_stats()
+    src = tmp_path / "src"
+    src.mkdir()
+    for i in range(3):
+        (src / f"part_{i}.mp3").write_bytes(os.urandom(1024))
+    yield src
+    io_hints.reset_stats()
+
+
+def test_will_need_counts_hinted_files(book_dir: Path):
+    io_hints.will_need([book_dir])
+    assert io_hints.stats()["willneed_files"] == 3
+    assert io_hints.stats()["willneed_bytes"] == 3 * 1024
+
+
+def test_will_need_stops_at_limit(book_dir: Path):
+    io_hints.will_need([book_dir], limit=1024)
+    assert io_hints.stats()["willneed_files"] == 1
+
+
+def test_copy_drops_requested_side(book_dir: Path, tmp_path: Path):
+    dst = tmp_path / "dst"
+    dst.mkdir()
+    cp_dir_contents(book_dir, dst, drop_cache="dst")
+    # just written, so their dirty pages are only written back, not counted as dropped
+    assert io_hints.stats()["writeback_files"] == 3
+    assert io_hints.stats()["dontneed_files"] == 0
+    assert len(list(dst.iterdir())) == 3
+
+
+def test_copy_drops_source(book_dir: Path, tmp_path: Path):
+    dst = tmp_path / "dst"
+    dst.mkdir()
+    cp_dir_contents(book_dir, dst, drop_cache="src")
+    assert io_hints.stats()["dontneed_files"] == 3
+    assert io_hints.stats()["dontneed_bytes"] == 3 * 1024
+    assert io_hints.stats()["writeback_files"] == 0
+
+
+def test_disabled(book_dir: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(cfg, "IO_HINTS", False)
+    io_hints.will_need([book_dir])
+    io_hints.dont_need([book_dir])
+    assert not any(io_hints.stats().values())
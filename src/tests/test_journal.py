@@ -0,0 +1,102 @@
+from pathlib import Path
+
+import pytest
+
+from src.lib.audiobook import Audiobook
+from src.lib.config import cfg
+from src.lib.fs_utils import clean_dir
+from src.lib.journal import (
+    BookJournal,
+    discard_journal,
+    journal_file,
+    mark_stage,
+    resumable_dirs,
+)
+from src.lib.leases import LeaseManager
+from src.tests.helpers.pytest_dirs import MOCKED
+
+
+@pytest.fixture(scope="function")
+def book(mock_inbox):
+    book = Audiobook(MOCKED.flat_dir1)
+    discard_journal(book)
+    yield book
+    discard_journal(book)
+
+
+def test_journal_survives_reopen(book: Audiobook):
+    journal = BookJournal.open(book)
+    assert not journal.stages
+    journal.mark("backed_up")
+    journal.mark("staged")
+    mark_stage(book, "converted", elapsedtime=42)
+
+    journal = BookJournal.open(book)
+    assert journal.done("backed_up") and journal.done("staged")
+    assert not journal.done("moved")
+    assert journal.get("converted", "elapsedtime") == 42
+    assert not journal_file(book.key).with_suffix(".tmp").exists()
+
+
+def test_journal_restarts_if_book_changed(book: Audiobook):
+    BookJournal.open(book).mark("staged")
+    assert resumable_dirs() == [book.merge_dir, book.build_dir]
+
+    extra = MOCKED.flat_dir1 / "mock_book_1 - part_4.mp3"
+    extra.write_text("a" * 1024)
+    try:
+        assert resumable_dirs() == []
+        # the stale journal is removed
+        assert not journal_file(book.key).exists()
+        assert not BookJournal.open(book).stages
+    finally:
+        extra.unlink()
+
+
+def test_books_held_by_other_instances_are_kept(
+    book: Audiobook, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(cfg, "lease_dir", tmp_path)
+    other = LeaseManager(tmp_path, 60)
+    lease = other.claim(book.key)
+    assert lease
+    BookJournal.open(book).mark("staged")
+
+    extra = MOCKED.flat_dir1 / "mock_book_1 - part_4.mp3"
+    extra.write_text("a" * 1024)
+    try:
+        # no longer resumable, but the other instance is still working on it
+        assert resumable_dirs() == [book.merge_dir, book.build_dir]
+        assert journal_file(book.key).exists()
+
+        lease.release()
+        assert resumable_dirs() == []
+        assert not journal_file(book.key).exists()
+    finally:
+        extra.unlink()
+        other.stop()
+
+
+def test_mark_stage_without_journal_is_noop(book: Audiobook):
+    mark_stage(book, "converted", elapsedtime=1)
+    assert not journal_file(book.key).exists()
+
+
+def test_clean_dir_keeps_resumable_paths(tmp_path: Path):
+    keep = tmp_path / "book" / "book-tmpfiles"
+    keep.mkdir(parents=True)
+    (keep / "001.m4a").write_text("a")
+    (tmp_path / "book" / "book.m4b").write_text("a")
+    (tmp_path / "other").mkdir()
+    (tmp_path / "other" / "file.mp3").write_text("a")
+
+    clean_dir(tmp_path, keep=[keep])
+
+    assert sorted(p.relative_to(tmp_path) for p in tmp_path.rglob("*")) == [
+        Path("book"),
+        Path("book/book-tmpfiles"),
+        Path("book/book-tmpfiles/001.m4a"),
+    ]
+
+    clean_dir(tmp_path)
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,101 @@
+import multiprocessing as mp
+import os
+import threading
+import time
+from pathlib import Path
+
+from src.lib.leases import LeaseManager
+
+KEYS = [f"book {i}" for i in range(20)]
+
+
+def claim_all(folder: Path, ttl: float, results: "mp.Queue[tuple[str, str]]"):
+    leases = LeaseManager(folder, ttl)
+    for key in KEYS:
+        if leases.claim(key):
+            results.put((key, leases.owner))
+
+
+def claim_and_crash(folder: Path, ttl: float):
+    LeaseManager(folder, ttl).claim("crashed book")
+    # die without releasing or heartbeating
+    os._exit(0)
+
+
+def test_each_book_is_claimed_by_exactly_one_process(tmp_path: Path):
+    ctx = mp.get_context("fork")
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(target=claim_all, args=(tmp_path, 60, results)) for _ in range(6)
+    ]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+    claims: dict[str, list[str]] = {}
+    while not results.empty():
+        key, owner = results.get()
+        claims.setdefault(key, []).append(owner)
+    assert sorted(claims) == sorted(KEYS)
+    assert all(len(owners) == 1 for owners in claims.values())
+
+
+def test_crashed_owners_lease_is_reclaimed_after_it_expires(tmp_path: Path):
+    ctx = mp.get_context("fork")
+    p = ctx.Process(target=claim_and_crash, args=(tmp_path, 0.5))
+    p.start()
+    p.join()
+
+    leases = LeaseManager(tmp_path, 0.5)
+    assert leases.owner_of("crashed book")
+    assert not leases.claim("crashed book")
+
+    time.sleep(0.6)
+    lease = leases.claim("crashed book")
+    assert lease
+    assert leases.owner_of("crashed book") == leases.owner
+
+    lease.release()
+    assert leases.owner_of("crashed book") is None
+
+
+def test_heartbeat_keeps_lease_alive(tmp_path: Path):
+    a = LeaseManager(tmp_path, 0.3)
+    b = LeaseManager(tmp_path, 0.3)
+    lease = a.claim("book")
+    assert lease
+
+    time.sleep(0.8)
+    assert not b.claim("book")
+    assert not lease.lost
+
+    # once a stops heartbeating, b can take over, and a finds out its lease was lost
+    a.stop()
+    time.sleep(0.5)
+    assert b.claim("book")
+    a.renew()
+    assert lease.lost
+    lease.release()
+    assert b.owner_of("book") == b.owner
+
+
+def test_lease_briefly_missing_during_a_steal_is_not_lost(tmp_path: Path):
+    a = LeaseManager(tmp_path, 60)
+    lease = a.claim("book")
+    assert lease and lease.path
+
+    # another instance moves the lease aside to check it, then puts it back as it hasn't expired
+    aside = tmp_path / ".aside"
+    os.rename(lease.path, aside)
+    threading.Timer(0.15, os.rename, args=(aside, lease.path)).start()
+    a.renew()
+    assert not lease.lost
+    assert a.owner_of("book") == a.owner
+    a.stop()
+
+
+def test_disabled_leases_always_claim():
+    leases = LeaseManager(None, 60)
+    assert leases.claim("book")
+    assert LeaseManager(None, 60).claim("book")
@@ -0,0 +1,105 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+from src.lib import library as library_module
+from src.lib.fs_utils import hash_path_audio_files
+from src.lib.library import LibraryIndex, normalize
+from src.tests.helpers.pytest_dirs import TEST_DIRS
+
+
+@pytest.fixture(scope="function")
+def roots(tmp_path: Path):
+    roots = {"converted": tmp_path / "converted", "archive": tmp_path / "archive"}
+    for root in roots.values():
+        root.mkdir()
+    return roots
+
+
+def make_book(d: Path, *names: str, size: int = 1024):
+    d.mkdir(parents=True, exist_ok=True)
+    for name in names:
+        (d / name).write_bytes(b"a" * size)
+    return d
+
+
+def test_normalize():
+    assert normalize("The Hobbit!") == normalize("hobbit") == "hobbit"
+    assert normalize("J.R.R. Tolkien") == "j r r tolkien"
+
+
+def test_refresh_only_rescans_changed_dirs(
+    tmp_path: Path, roots, monkeypatch: pytest.MonkeyPatch
+):
+    scanned = []
+    scan_dir = library_module.scan_dir
+    monkeypatch.setattr(
+        library_module,
+        "scan_dir",
+        lambda tree, root, d, files: scanned.append(d.name) or scan_dir(tree, root, d, files),
+    )
+    make_book(roots["archive"] / "Book 1", "01.mp3", "02.mp3")
+    make_book(roots["archive"] / "Series" / "Book 2" / "Disc 1", "01.mp3")
+    make_book(roots["archive"] / "Series" / "Book 2" / "Disc 2", "01.mp3")
+    index = LibraryIndex(tmp_path / "library.json", roots)
+
+    assert index.refresh()
+    assert sorted(scanned) == ["Book 1", "Disc 1", "Disc 2"]
+    assert index.has(roots["archive"] / "Series" / "Book 2")
+    assert not index.has(roots["archive"] / "Book 3")
+    assert index.get(roots["archive"] / "Book 1").files == ("01.mp3", "02.mp3")  # type: ignore
+
+    # loaded from disk, nothing changed
+    scanned.clear()
+    index = LibraryIndex(tmp_path / "library.json", roots)
+    assert len(index) == 3
+    assert not index.refresh()
+    assert not scanned
+
+    make_book(roots["archive"] / "Book 1", "03.mp3")
+    shutil.rmtree(roots["archive"] / "Series" / "Book 2" / "Disc 2")
+    assert index.refresh()
+    assert scanned == ["Book 1"]
+    assert len(index) == 2
+
+
+def test_finds_same_book_under_another_name(tmp_path: Path, roots):
+    archived = make_book(roots["archive"] / "Author - Book", "01.mp3", "02.mp3")
+    inbox_book = make_book(tmp_path / "inbox" / "Book (2019)", "01.mp3", "02.mp3")
+    index = LibraryIndex(tmp_path / "library.json", roots)
+    index.refresh()
+
+    [entry] = index.with_hash(hash_path_audio_files(inbox_book))
+    assert index.path_of(entry) == archived
+    assert not index.with_hash(hash_path_audio_files(inbox_book), "converted")
+
+    shutil.rmtree(archived)
+    assert not index.with_hash(hash_path_audio_files(inbox_book))
+    assert len(index) == 0
+
+
+def test_indexes_converted_m4b_tags(tmp_path: Path, roots):
+    book = roots["converted"] / "Book"
+    book.mkdir()
+    shutil.copy(TEST_DIRS.fixtures / "basic_no_cover__standalone_m4b.m4b", book / "Book.m4b")
+    index = LibraryIndex(tmp_path / "library.json", roots)
+    index.update(book)
+
+    entry = index.get(book)
+    assert entry and entry.has_m4b and entry.size > 0
+    assert index.with_name("The Album", "author", entry.duration * 1.005) == [entry]
+    assert not index.with_name("The Album", "author", entry.duration * 1.1)
+    assert not index.with_name("Album", "Someone Else")
+
+
+def test_unique_name(tmp_path: Path, roots):
+    d = make_book(roots["converted"] / "book", "book.m4b", "book (copy).m4b")
+    index = LibraryIndex(tmp_path / "library.json", roots)
+    index.refresh()
+
+    assert index.unique_name(d, "other.m4b") == "other.m4b"
+    assert index.unique_name(d, "book.m4b") == "book (copy 1).m4b"
+    # put there since the index was refreshed
+    (d / "book (copy 1).m4b").write_bytes(b"a")
+    assert index.unique_name(d, "book.m4b") == "book (copy 2).m4b"
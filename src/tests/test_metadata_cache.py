@@ -0,0 +1,66 @@
+import pytest
+
+from src.lib import metadata_cache
+from src.lib.audiobook import Audiobook
+from src.lib.ffmpeg_utils import BookStats
+from src.lib.metadata_cache import (
+    discard_metadata,
+    metadata_file,
+    resolve_metadata,
+)
+from src.tests.helpers.pytest_dirs import MOCKED
+
+STATS = BookStats(3, 3072, (60.0, 60.0, 60.5), (64000, 64000, 64000), (64000, 64000), 44100)
+
+
+@pytest.fixture(scope="function")
+def extracted(mock_inbox, monkeypatch: pytest.MonkeyPatch):
+    calls = []
+
+    def extract_metadata(book: Audiobook, quiet: bool = False):
+        calls.append(book.key)
+        book.title = "Mock Book"
+        book.artist = "Mock Author"
+        book.year = None
+        book.scores = {"title": {"title_is_title": 2}}
+        book.stats = STATS
+        return book
+
+    monkeypatch.setattr(Audiobook, "extract_metadata", extract_metadata)
+    discard_metadata(Audiobook(MOCKED.flat_dir1))
+    yield calls
+    discard_metadata(Audiobook(MOCKED.flat_dir1))
+
+
+def test_metadata_is_loaded_for_unchanged_book(extracted: list[str]):
+    resolve_metadata(Audiobook(MOCKED.flat_dir1), quiet=True)
+    assert len(extracted) == 1
+    assert metadata_file(Audiobook(MOCKED.flat_dir1).key).exists()
+
+    book = resolve_metadata(Audiobook(MOCKED.flat_dir1), quiet=True)
+    assert len(extracted) == 1
+    assert (book.title, book.author, book.year) == ("Mock Book", "Mock Author", None)
+    assert book.fs_title == Audiobook(MOCKED.flat_dir1).extract_path_info(True).fs_title
+    assert book.scores == {"title": {"title_is_title": 2}}
+    assert book.stats == STATS
+
+
+def test_metadata_is_extracted_again_if_parser_version_changes(
+    extracted: list[str], monkeypatch: pytest.MonkeyPatch
+):
+    resolve_metadata(Audiobook(MOCKED.flat_dir1), quiet=True)
+    monkeypatch.setattr(metadata_cache, "PARSER_VERSION", metadata_cache.PARSER_VERSION + 1)
+    resolve_metadata(Audiobook(MOCKED.flat_dir1), quiet=True)
+    assert len(extracted) == 2
+
+
+def test_metadata_is_extracted_again_if_book_changed(extracted: list[str]):
+    resolve_metadata(Audiobook(MOCKED.flat_dir1), quiet=True)
+
+    extra = MOCKED.flat_dir1 / "mock_book_1 - part_4.mp3"
+    extra.write_text("a" * 1024)
+    try:
+        resolve_metadata(Audiobook(MOCKED.flat_dir1), quiet=True)
+        assert len(extracted) == 2
+    finally:
+        extra.unlink()
@@ -7,6 +7,7 @@ from src.lib.ffmpeg_utils import get_bitrate_py, is_variable_bitrate
 from src.lib.formatters import human_bitrate
 from src.lib.parsers import (
     extract_path_info,
+    find_greatest_common_string,
     romans,
 )
 from src.tests.helpers.pytest_statics import PART_ROMANS, ROTK_ROMANS
@@ -108,6 +109,35 @@ def test_roman_numerals_affect_file_order(
     assert roman_numerals_affect_file_order(d) == expected
 
 
+def test_filename_features(tmp_path: Path):
+
+    from src.lib.parsers import count_distinct_romans, FilenameFeatures
+
+    d = testutils.make_tmp_files(tmp_path, PART_ROMANS)
+    features = FilenameFeatures.scan(d)
+
+    assert features.roman_numerals_affect_order
+    assert features.num_distinct_romans == count_distinct_romans(d)
+    assert features.common_file_name == find_greatest_common_string(
+        [f.stem for f in d.iterdir() if f.is_file()]
+    )
+
+
+@pytest.mark.parametrize(
+    "test_case, expected",
+    [
+        ("", ""),
+        ("abc", ""),
+        ("ab1 ab2 cd1".split(), "ab"),
+        (["Book - Part 01", "Book - Part 02", "Book - Part 10"], "Book - Part 0"),
+        (["Book - Part 01", "Other", "Book - Part 01"], "Book - Part 01"),
+    ],
+)
+def test_find_greatest_common_string(test_case, expected):
+
+    assert find_greatest_common_string(list(test_case)) == expected
+
+
 @pytest.mark.parametrize(
     "test_case, expected",
     [
@@ -364,6 +394,32 @@ def test_is_maybe_multi_book_or_series(test_case, expected):
     assert is_maybe_multi_book_or_series(test_case.upper()) == expected
 
 
+@pytest.mark.parametrize(
+    "test_case",
+    [
+        "The Hobbit - Disc 1",
+        "Book 1 - Disc 2",
+        "Part 3",
+        "Vol. 2 - Chapter 4",
+        "Series/The Land Alliances",
+        "The Fellowship of the Ring",
+    ],
+)
+def test_name_features_match_patterns(test_case):
+
+    from src.lib.parsers import (
+        book_series_pattern,
+        multi_disc_pattern,
+        multi_part_pattern,
+        name_features,
+    )
+
+    disc = bool(multi_disc_pattern.search(test_case))
+    series = not disc and bool(book_series_pattern.search(test_case))
+    part = not disc and not series and bool(multi_part_pattern.search(test_case))
+    assert name_features(test_case) == (disc, series, part)
+
+
 @pytest.mark.parametrize(
     "s1, s2, expected",
     [
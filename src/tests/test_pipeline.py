@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+from tinta import Tinta
+
+from src.lib import run
+from src.lib.inbox_item import InboxItem
+from src.lib.pipeline import BookPipeline
+from src.lib.term import smart_print
+
+
+class FakeItem(InboxItem):
+    def __init__(self, key: str):
+        self.key = key
+
+
+@pytest.fixture(scope="function")
+def fake_stages(monkeypatch: pytest.MonkeyPatch):
+    events: list[str] = []
+    lock = threading.Lock()
+
+    def log(e: str):
+        with lock:
+            events.append(e)
+        smart_print(e)
+
+    def prepare_book(item):
+        log(f"prepare {item.key}")
+        return (None, 0) if item.key == "skip" else (item.key, 0)
+
+    def convert_prepared_book(book, lease=None):
+        log(f"convert {book} start")
+        time.sleep(0.2)
+        log(f"convert {book} end")
+        return 1
+
+    def finalize_book(b, book, elapsedtime, lease=None):
+        log(f"finalize {book}")
+        return b + 1
+
+    def after_book(item):
+        log(f"done {item.key}")
+
+    for fn in [prepare_book, convert_prepared_book, finalize_book, after_book]:
+        monkeypatch.setattr(run, fn.__name__, fn)
+
+    return events
+
+
+def test_pipeline_overlaps_stages(fake_stages: list[str]):
+    items = [FakeItem(k) for k in ["a", "skip", "b", "c"]]
+    assert BookPipeline().run(items) == 3
+
+    # the next book is prepared while the current one is still converting
+    assert fake_stages.index("prepare b") < fake_stages.index("convert a end")
+    assert fake_stages.index("prepare c") < fake_stages.index("convert b end")
+
+
+def test_pipeline_keeps_output_in_book_order(
+    fake_stages: list[str], monkeypatch: pytest.MonkeyPatch
+):
+    printed: list[str] = []
+    monkeypatch.setattr(
+        Tinta, "print", lambda t, *a, **kw: printed.append(t.to_str(plaintext=True))
+    )
+    items = [FakeItem(k) for k in ["a", "skip", "b"]]
+    BookPipeline().run(items)
+
+    assert printed == [
+        "prepare a",
+        "convert a start",
+        "convert a end",
+        "finalize a",
+        "done a",
+        "prepare skip",
+        "done skip",
+        "prepare b",
+        "convert b start",
+        "convert b end",
+        "finalize b",
+        "done b",
+    ]
+
+
+def test_pipeline_reraises_stage_errors(
+    fake_stages: list[str], monkeypatch: pytest.MonkeyPatch
+):
+    def convert_prepared_book(book, lease=None):
+        raise RuntimeError(f"failed to convert {book}")
+
+    monkeypatch.setattr(run, "convert_prepared_book", convert_prepared_book)
+
+    with pytest.raises(RuntimeError, match="failed to convert a"):
+        BookPipeline().run([FakeItem(k) for k in ["a", "b", "c"]])
@@ -1,8 +1,22 @@
 import shutil
 
+import pytest
+
 from src.lib.audiobook import Audiobook
+from src.lib.config import cfg
 from src.lib.fs_utils import get_audio_size
-from src.lib.run import copy_to_working_dir
+from src.lib.inbox_item import InboxItem
+from src.lib.inbox_state import InboxState
+from src.lib.journal import discard_journal
+from src.lib.run import (
+    archive_duplicates,
+    copy_to_working_dir,
+    find_duplicate_books,
+    requeue_book,
+    set_aside_duplicates,
+    watch_source,
+)
+from src.tests.helpers.pytest_dirs import MOCKED
 
 
 def test_copy_to_working_dir(house_on_the_cliff__flat_mp3: Audiobook):
@@ -18,3 +32,97 @@ def test_copy_to_working_dir(house_on_the_cliff__flat_mp3: Audiobook):
     merge_cover = house_on_the_cliff__flat_mp3.merge_dir / "houseonthecliff_2307.jpg"
     assert merge_cover.exists()
     assert house_on_the_cliff__flat_mp3.cover_art_file == merge_cover
+
+
+def test_watch_source_notices_changes(mock_inbox):
+    book = Audiobook(MOCKED.flat_dir1)
+    discard_journal(book)
+    source_changed = watch_source(book)
+    assert source_changed() is None
+
+    extra = MOCKED.flat_dir1 / "mock_book_1 - part_4.mp3"
+    extra.write_text("a" * 1024)
+    try:
+        assert source_changed() == "was changed in the inbox"
+    finally:
+        extra.unlink()
+    assert source_changed() is None
+
+
+def test_requeue_book_cleans_up_working_dirs(mock_inbox):
+    book = Audiobook(MOCKED.flat_dir1)
+    for d in [book.build_dir, book.merge_dir]:
+        d.mkdir(parents=True, exist_ok=True)
+        (d / "part.mp3").write_text("a" * 1024)
+    try:
+        requeue_book(book, "was changed in the inbox")
+        assert not book.build_dir.exists()
+        assert not book.merge_dir.exists()
+    finally:
+        InboxState().set_ok(book)
+
+
+@pytest.fixture(scope="function")
+def settled(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(InboxItem, "is_settled", property(lambda self: True))
+
+
+def test_find_duplicate_books(mock_inbox, settled):
+    # the mocked flat books all have the same 3 files, apart from their names
+    items = [InboxItem(d) for d in MOCKED.flat_dirs]
+    (MOCKED.flat_dir3 / "mock_book_3 - part_1.mp3").write_text("b" * 1024 * 5)
+
+    duplicates = find_duplicate_books(items)
+    assert {d.key: f.key for d, f in duplicates.items()} == {
+        items[1].key: items[0].key,
+        items[3].key: items[0].key,
+    }
+
+
+def test_duplicates_are_skipped(mock_inbox, settled, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(type(cfg), "OVERWRITE_MODE", "skip")
+    items = [InboxItem(d) for d in MOCKED.flat_dirs[:2]]
+    try:
+        assert set_aside_duplicates(items) == items[:1]
+        assert InboxState().did_fail(items[1].key)
+        assert MOCKED.flat_dir2.exists()
+    finally:
+        InboxState().clear_failed()
+
+
+def test_duplicates_are_archived_after_the_first_copy(
+    mock_inbox, settled, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(type(cfg), "OVERWRITE_MODE", "overwrite")
+    monkeypatch.setattr(type(cfg), "ON_COMPLETE", "archive")
+    items = [InboxItem(d) for d in MOCKED.flat_dirs[:2]]
+    archived = cfg.archive_dir.resolve() / f"{items[1].key} (duplicate)"
+    try:
+        assert set_aside_duplicates(items) == items[:1]
+        assert not InboxState().did_fail(items[1].key)
+        assert MOCKED.flat_dir2.exists()
+
+        archive_duplicates(items[0].to_audiobook())
+        assert not MOCKED.flat_dir2.exists()
+        assert len(list(archived.glob("*.mp3"))) == 3
+    finally:
+        shutil.rmtree(archived, ignore_errors=True)
+
+
+def test_changed_duplicates_are_left_in_the_inbox(
+    mock_inbox, settled, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(type(cfg), "OVERWRITE_MODE", "overwrite")
+    monkeypatch.setattr(type(cfg), "ON_COMPLETE", "archive")
+    items = [InboxItem(d) for d in MOCKED.flat_dirs[:2]]
+    archived = cfg.archive_dir.resolve() / f"{items[1].key} (duplicate)"
+    try:
+        assert set_aside_duplicates(items) == items[:1]
+
+        # the copy is replaced with a different book after it was set aside
+        (MOCKED.flat_dir2 / "mock_book_2 - part_1.mp3").write_text("b" * 1024 * 5)
+        archive_duplicates(items[0].to_audiobook())
+        assert MOCKED.flat_dir2.exists()
+        assert not archived.exists()
+    finally:
+        shutil.rmtree(archived, ignore_errors=True)
@@ -0,0 +1,112 @@
+import os
+import shutil
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from src.lib import speculative
+from src.lib.inbox_item import InboxItem
+from src.lib.speculative import (
+    discard,
+    load_manifest,
+    speculative_dir,
+    SpeculativeEncoder,
+)
+from src.tests.helpers.pytest_dirs import MOCKED
+
+TARGET = (64000, 44100)
+
+
+@pytest.fixture(scope="function")
+def encoder(mock_inbox, monkeypatch: pytest.MonkeyPatch):
+    encoded: list[Path] = []
+
+    def fake_encode_piece(src: Path, dst: Path, target):
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy(src, dst)
+        encoded.append(src)
+
+    monkeypatch.setattr(speculative, "encode_piece", fake_encode_piece)
+    monkeypatch.setattr(speculative, "get_target", lambda path: TARGET)
+    monkeypatch.setattr(SpeculativeEncoder, "is_enabled", staticmethod(lambda: True))
+    SpeculativeEncoder._instance = None
+    discard(MOCKED.flat_dir1.name)
+
+    long_ago = time.time() - 3600
+    for f in MOCKED.flat_dir1.rglob("*"):
+        os.utime(f, (long_ago, long_ago))
+
+    yield SpeculativeEncoder(), encoded
+
+    discard(MOCKED.flat_dir1.name)
+    SpeculativeEncoder._instance = None
+
+
+def test_speculate_only_encodes_stable_files(encoder):
+    enc, encoded = encoder
+    item = InboxItem(MOCKED.flat_dir1)
+
+    # first look at a file only records its size
+    enc.speculate(item)
+    enc.wait(item.path)
+    assert not encoded
+
+    enc.speculate(item)
+    enc.wait(item.path)
+    assert len(encoded) == 3
+    assert len(load_manifest(item.basename)["files"]) == 3
+
+    # already encoded files aren't submitted again
+    enc.speculate(item)
+    enc.wait(item.path)
+    assert len(encoded) == 3
+
+
+def test_use_pieces_only_reencodes_changed_files(encoder, tmp_path: Path):
+    enc, encoded = encoder
+    item = InboxItem(MOCKED.flat_dir1)
+    enc.speculate(item)
+    enc.speculate(item)
+    enc.wait(item.path)
+    encoded.clear()
+
+    changed = MOCKED.flat_dir1 / "mock_book_1 - part_2.mp3"
+    changed.write_text("b" * 1024)
+
+    merge_dir = tmp_path / item.basename
+    shutil.copytree(item.path, merge_dir)
+    book = SimpleNamespace(
+        basename=item.basename,
+        inbox_dir=item.path,
+        merge_dir=merge_dir,
+        bitrate_target=TARGET[0],
+        samplerate=TARGET[1],
+    )
+
+    assert enc.use_pieces(book)  # type: ignore
+    assert encoded == [changed]
+    assert sorted(f.name for f in merge_dir.iterdir()) == [
+        f"mock_book_1 - part_{i}.m4a" for i in range(1, 4)
+    ]
+    # pieces are moved, not copied, into the merge folder
+    assert not list(speculative_dir(item.basename).rglob("*.m4a"))
+
+
+def test_use_pieces_falls_back_if_target_changed(encoder, tmp_path: Path):
+    enc, _encoded = encoder
+    item = InboxItem(MOCKED.flat_dir1)
+    enc.speculate(item)
+    enc.speculate(item)
+    enc.wait(item.path)
+
+    book = SimpleNamespace(
+        basename=item.basename,
+        inbox_dir=item.path,
+        merge_dir=tmp_path,
+        bitrate_target=128000,
+        samplerate=TARGET[1],
+    )
+    assert not enc.use_pieces(book)  # type: ignore
+    assert not speculative_dir(item.basename).exists()
@@ -0,0 +1,62 @@
+from pathlib import Path
+
+import pytest
+
+from src.lib import staging as staging_module
+from src.lib.audiobook import Audiobook
+from src.lib.config import cfg
+from src.lib.staging import CONVERTED_BUILD_DIRNAME, MB, Staging
+from src.tests.helpers.pytest_dirs import MOCKED
+
+
+@pytest.fixture(scope="function")
+def staging(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(cfg, "RAM_STAGING_MB", 10)
+    monkeypatch.setattr(cfg, "RAM_STAGING_MAX_BOOK_MB", 4)
+    monkeypatch.setattr(type(cfg), "ram_staging_dir", tmp_path / "ram")
+    monkeypatch.setattr(type(cfg), "USE_DOCKER", False)
+    Staging.destroy()
+    yield Staging()
+    Staging.destroy()
+
+
+def test_place_respects_book_size_and_budget(staging: Staging):
+    assert not staging.place("too big", 5 * MB, 5 * MB)
+    assert staging.place("book1", 3 * MB, 6 * MB)
+    assert not staging.place("book2", 3 * MB, 6 * MB)
+    staging.release("book1")
+    assert staging.place("book2", 3 * MB, 6 * MB)
+
+
+def test_disabled_without_budget(staging: Staging, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(cfg, "RAM_STAGING_MB", 0)
+    assert not staging.place("book1", 1 * MB, 1 * MB)
+    assert staging.extra_roots() == []
+
+
+def test_book_dirs_follow_placement(staging: Staging, mock_inbox):
+    book = Audiobook(MOCKED.flat_dir1)
+    assert book.merge_dir.parent == cfg.merge_dir.resolve()
+
+    assert staging.place(book.key, 1 * MB, 2 * MB)
+    book.reset_paths()
+    assert book.merge_dir == cfg.ram_staging_dir / "merge" / book.basename  # type: ignore
+    assert book.build_dir.is_relative_to(cfg.ram_staging_dir / "build")  # type: ignore
+
+    staging.release(book.key)
+    book.reset_paths()
+    assert book.build_dir.parent == cfg.build_dir.resolve()
+
+
+def test_builds_next_to_converted_across_devices(
+    staging: Staging, mock_inbox, monkeypatch: pytest.MonkeyPatch
+):
+    book = Audiobook(MOCKED.flat_dir1)
+    monkeypatch.setattr(cfg, "BUILD_NEXT_TO_CONVERTED", True)
+    assert book.build_dir.parent == cfg.build_dir.resolve()
+
+    monkeypatch.setattr(staging_module, "on_same_device", lambda a, b: False)
+    book.reset_paths()
+    assert book.build_dir.parent == (cfg.converted_dir / CONVERTED_BUILD_DIRNAME).resolve()
+    assert book.merge_dir.parent == cfg.merge_dir.resolve()
+    assert cfg.converted_dir / CONVERTED_BUILD_DIRNAME in staging.extra_roots()
@@ -0,0 +1,102 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from src.lib import aio, watchdog
+from src.lib.watchdog import (
+    cpu_time,
+    ProcessCancelled,
+    ProcessStalled,
+    ProcLimits,
+    Watchdog,
+)
+
+
+def test_kills_silent_process():
+    start = time.time()
+    with pytest.raises(ProcessStalled) as e:
+        aio.run(["sleep", "30"], watchdog=Watchdog(stall_timeout=0.5, interval=0.1))
+    assert "made no progress" in e.value.reason
+    assert time.time() - start < 5
+
+
+def test_kills_process_tree(tmp_path: Path):
+    # the shell's children would otherwise be orphaned and keep running
+    pids = tmp_path / "pids"
+    script = f"sleep 30 & echo $! >> {pids}; sleep 30 & echo $! >> {pids}; wait"
+    with pytest.raises(ProcessStalled):
+        aio.run(["sh", "-c", script], watchdog=Watchdog(stall_timeout=0.5, interval=0.1))
+    for pid in pids.read_text().split():
+        stat = Path(f"/proc/{pid}/stat")
+        assert not stat.exists() or ") Z " in stat.read_text()
+
+
+def test_kills_busy_process_after_timeout():
+    with pytest.raises(ProcessStalled) as e:
+        aio.run(
+            [sys.executable, "-c", "while True: pass"],
+            watchdog=Watchdog(stall_timeout=30, timeout=1, interval=0.1),
+        )
+    assert "still running" in e.value.reason
+
+
+def test_lets_process_that_writes_output_finish(tmp_path: Path):
+    out = tmp_path / "out.txt"
+    script = f"import time\nfor _ in range(10):\n    open({str(out)!r}, 'a').write('x')\n    time.sleep(0.1)"
+    proc = aio.run(
+        [sys.executable, "-c", script],
+        watchdog=Watchdog(stall_timeout=0.5, interval=0.1, watch=[out], min_cpu=1),
+    )
+    assert proc.returncode == 0
+    assert out.read_text() == "x" * 10
+
+
+def test_cpu_time_counts_busy_process():
+    assert cpu_time(999_999_999) is None
+    before = cpu_time(os.getpid())
+    t = time.time()
+    while time.time() - t < 0.3:
+        pass
+    assert cpu_time(os.getpid()) - before >= 0.1  # type: ignore
+
+
+def test_limits_apply_nice():
+    proc = aio.run(
+        [sys.executable, "-c", "import os; print(os.nice(0))"],
+        limits=ProcLimits(nice=5),
+    )
+    assert int(proc.stdout.decode().strip()) >= 5
+
+
+def test_limits_apply_max_memory():
+    proc = aio.run(
+        [sys.executable, "-c", "import resource; print(resource.getrlimit(resource.RLIMIT_AS)[0])"],
+        limits=ProcLimits(max_memory_mb=1024),
+    )
+    assert int(proc.stdout.decode().strip()) == 1024 * 1024 * 1024
+
+
+def test_cancels_when_asked():
+    wanted = [None, None, "is no longer wanted"]
+    with pytest.raises(ProcessCancelled) as e:
+        aio.run(
+            [sys.executable, "-c", "while True: pass"],
+            watchdog=Watchdog(stall_timeout=30, interval=0.1, cancel_if=lambda: wanted.pop(0)),
+        )
+    assert e.value.reason == "is no longer wanted"
+
+
+def test_stops_docker_container(monkeypatch: pytest.MonkeyPatch):
+    # the pid is the docker client's, so its CPU use isn't progress, and the container is killed
+    killed: list[str] = []
+    monkeypatch.setattr(watchdog, "kill_container", killed.append)
+    with pytest.raises(ProcessStalled) as e:
+        aio.run(
+            [sys.executable, "-c", "while True: pass"],
+            watchdog=Watchdog(stall_timeout=0.5, interval=0.1, container="auto-m4b-test"),
+        )
+    assert "made no progress" in e.value.reason
+    assert killed == ["auto-m4b-test"]